@@ -1,19 +1,39 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import openpyxl
 import os
+import sqlite3
+import argparse
+import bisect
+import functools
+import hashlib
+import html
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
 from datetime import datetime
+from types import MappingProxyType
+from streamlit.delta_generator import DeltaGenerator
+import itertools
 import json
+import logging
+import logging.handlers
+import math
+import re
 
-# Page configuration
-st.set_page_config(
-    page_title="Workflow Management System",
-    page_icon="📋",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-# Custom CSS for professional styling
-st.markdown("""
+# pandas 3 always copies on write: a shallow copy then shares data until either side is changed
+COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3
+
+# Custom CSS for professional styling, injected on every run of the app
+APP_CSS = """
 <style>
     .main-header {
         background: linear-gradient(90deg, #1f4e79, #2e5984);
@@ -73,202 +93,3057 @@ st.markdown("""
         margin: 0.5rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+REQUIRED_SHEETS = ['Records', 'Users', 'Steps']
+SHEET_NAMES = REQUIRED_SHEETS + ['Workflow_Status']
+RECORD_COLUMNS = ['Unique_ID', 'Client_Group', 'Legal_Entity', 'Solution', 'Created_Date', 'Created_By']
+STATUS_COLUMNS = [
+    'Unique_ID', 'Step_ID', 'Status', 'Assigned_To', 'Completed_By',
+    'Completed_Date', 'Comments', 'Attachment_Path'
+]
+STATUS_KEY = ['Unique_ID', 'Step_ID']
+STATUS_VALUES = ['Not Started', 'In Progress', 'Completed']
+WORKFLOW_CONFIG_FILE = "workflow_config.json"
+DEFAULT_TEMPLATE = "Standard"
+# Actions a role can be granted on a step, as bits of a PermissionMatrix
+STEP_ACTIONS = {'update': 1, 'comment': 2, 'attach': 4}
+# Action a role needs on a step to change each workflow status column
+COLUMN_ACTIONS = {'Status': 'update', 'Assigned_To': 'update', 'Completed_By': 'update',
+                  'Completed_Date': 'update', 'Comments': 'comment', 'Attachment_Path': 'attach'}
+# Role hierarchy used when the workflow configuration has no "roles" section
+DEFAULT_ROLES = {'Lead': {'inherits': ['Manager'], 'admin': True}, 'Manager': {'admin': True}}
+RECORD_PAGE_SIZES = [10, 25, 50, 100]
+DEFAULT_RECORD_PAGE_SIZE = 25
+
+class PermissionMatrix:
+    """Role x step x action permissions compiled into a bitmask matrix
+    
+    matrix[row, column] holds the STEP_ACTIONS bits a role may take on a step, with role
+    inheritance already resolved, so every check is two dict lookups and an array read. The
+    last row is for roles the configuration does not know: they get unrestricted actions only.
+    """
+    
+    def __init__(self, steps, roles):
+        roles = {role: dict(settings or {}) for role, settings in roles.items()}
+        for step in steps:
+            for allowed in step['Action_Roles'].values():
+                for role in allowed:
+                    roles.setdefault(role, {})
+        inherited = {role: self.inherited_roles(role, roles) for role in roles}
+        
+        self.roles = tuple(roles)
+        self.role_rows = {role: row for row, role in enumerate(self.roles)}
+        self.admin_roles = frozenset(role for role in self.roles
+                                     if any(roles[parent].get('admin') for parent in inherited[role]))
+        self.step_ids = np.array(sorted(step['Step_ID'] for step in steps), dtype='int64')
+        self.step_columns = {step_id: column for column, step_id in enumerate(self.step_ids.tolist())}
+        
+        self.matrix = np.zeros((len(self.roles) + 1, len(self.step_ids)), dtype=np.uint8)
+        for step in steps:
+            column = self.step_columns[step['Step_ID']]
+            for action, bit in STEP_ACTIONS.items():
+                allowed = step['Action_Roles'].get(action)
+                if not allowed:
+                    self.matrix[:, column] |= bit
+                    continue
+                for role in self.roles:
+                    if inherited[role] & allowed:
+                        self.matrix[self.role_rows[role], column] |= bit
+        self.matrix.setflags(write=False)
+        # Plain-int copy for single checks, which numpy scalar indexing would slow down
+        self.rows = tuple(tuple(row) for row in self.matrix.tolist())
+    
+    @staticmethod
+    def inherited_roles(role, roles):
+        """role plus every role it inherits from, directly or indirectly"""
+        found, pending = set(), [(role, ())]
+        while pending:
+            current, path = pending.pop()
+            if current in path:
+                raise ValueError(f"Role inheritance cycle: {' -> '.join(path + (current,))}")
+            found.add(current)
+            pending.extend((parent, path + (current,)) for parent in roles.get(current, {}).get('inherits', []))
+        return frozenset(found)
+    
+    def row(self, role):
+        return self.role_rows.get(role, len(self.roles))
+    
+    def allows(self, role, step_id, action):
+        """Whether role may take action ('update', 'comment' or 'attach') on a step"""
+        column = self.step_columns.get(step_id)
+        return column is not None and bool(self.rows[self.row(role)][column] & STEP_ACTIONS[action])
+    
+    def is_admin(self, role):
+        return role in self.admin_roles
+    
+    def step_mask(self, role, step_ids, action):
+        """Vectorized allows: a boolean array over an array of step ids"""
+        step_ids = np.asarray(step_ids, dtype='int64')
+        if not len(self.step_ids):
+            return np.zeros(len(step_ids), dtype=bool)
+        columns = np.minimum(np.searchsorted(self.step_ids, step_ids), len(self.step_ids) - 1)
+        granted = (self.matrix[self.row(role)][columns] & STEP_ACTIONS[action]) != 0
+        return granted & (self.step_ids[columns] == step_ids)
+
+class WorkflowDefinition:
+    """Immutable, compiled workflow: a step catalog and named templates drawn from it
+    
+    Each step is a read-only mapping with the Steps sheet columns plus Action_Roles, the roles
+    each restricted action is limited to, and Allowed_Roles, those of the 'update' action (empty
+    for anyone). Header grouping, template step lists, the templates offered per Solution and the
+    PermissionMatrix are worked out once, when the definition is built.
+    """
+    
+    def __init__(self, steps, templates=None, solution_templates=None, default_template=None, roles=None):
+        compiled = []
+        for step in steps:
+            action_roles = {action: frozenset(allowed) for action, allowed in step.get('Action_Roles', {}).items()}
+            unknown = set(action_roles) - set(STEP_ACTIONS)
+            if unknown:
+                raise ValueError(f"Step {step['Step_ID']} restricts unknown actions: {sorted(unknown)}")
+            action_roles.setdefault('update', frozenset(step['Allowed_Roles']))
+            compiled.append(MappingProxyType(dict(step, Allowed_Roles=action_roles['update'],
+                                                  Action_Roles=MappingProxyType(action_roles))))
+        self.steps = tuple(compiled)
+        self.step_by_id = MappingProxyType({step['Step_ID']: step for step in self.steps})
+        if len(self.step_by_id) != len(self.steps):
+            raise ValueError("Workflow steps must have unique ids")
+        
+        groups = {}
+        for step in self.steps:
+            groups.setdefault(step['Header'], []).append(step)
+        self.header_groups = tuple((header, tuple(group)) for header, group in groups.items())
+        
+        templates = templates or {DEFAULT_TEMPLATE: [step['Step_ID'] for step in self.steps]}
+        for name, step_ids in templates.items():
+            unknown = set(step_ids) - set(self.step_by_id)
+            if unknown:
+                raise ValueError(f"Workflow template {name!r} uses unknown steps: {sorted(unknown)}")
+        self.templates = MappingProxyType({name: tuple(step_ids) for name, step_ids in templates.items()})
+        self.default_template = default_template or next(iter(self.templates))
+        
+        solution_templates = dict(solution_templates or {})
+        for solution, names in solution_templates.items():
+            unknown = [name for name in names if name not in self.templates]
+            if unknown or not names:
+                raise ValueError(f"Solution {solution!r} has unknown or no workflow templates: {unknown}")
+        if self.default_template not in self.templates:
+            raise ValueError(f"Unknown default workflow template {self.default_template!r}")
+        self.solution_templates = MappingProxyType(
+            {solution: tuple(names) for solution, names in solution_templates.items()})
+        # Solutions without their own list may use any template, the default first
+        self.all_templates = (self.default_template,) + tuple(
+            name for name in self.templates if name != self.default_template)
+        self.permissions = PermissionMatrix(self.steps, roles if roles is not None else DEFAULT_ROLES)
+    
+    @classmethod
+    def from_config(cls, config):
+        """Compile the parsed contents of workflow_config.json"""
+        steps = [{
+            'Step_ID': int(step['id']),
+            'Header': step.get('header', step['name']),
+            'Step_Name': step.get('description', step['name']),
+            # The first restricted role is the one shown on the step card
+            'Required_Role': (step.get('restricted_roles') or ['Any'])[0],
+            'Allowed_Roles': step.get('restricted_roles', []),
+            'Action_Roles': step.get('action_roles', {}),
+            'Attachment_Required': bool(step.get('attachment_allowed', False)),
+            'Optional': bool(step.get('optional', False)),
+        } for step in config['workflow_steps']]
+        return cls(steps, config.get('templates'), config.get('solution_templates'),
+                   config.get('default_template'), config.get('roles'))
+    
+    @classmethod
+    def from_steps_table(cls, steps):
+        """Compile a Steps sheet into a single-template definition with the default roles"""
+        return cls([dict(step, Allowed_Roles=() if step['Required_Role'] == 'Any' else (step['Required_Role'],))
+                    for step in steps.to_dict('records')])
+    
+    # The definition never changes with the data, so it survives every write
+    
+    def on_records_added(self, frames, new_records, new_status):
+        pass
+    
+    def on_steps_updated(self, frames, updates):
+        pass
+    
+    def templates_for(self, solution):
+        """Names of the templates a record of this Solution can use, the preferred one first"""
+        return self.solution_templates.get(solution, self.all_templates)
+    
+    def grouped_steps(self, step_ids):
+        """[(header, [step, ...])] in catalog order, limited to the given step ids"""
+        groups = []
+        for header, steps in self.header_groups:
+            selected = [step for step in steps if step['Step_ID'] in step_ids]
+            if selected:
+                groups.append((header, selected))
+        return groups
+    
+    def steps_table(self):
+        """The step catalog as a Steps sheet"""
+        columns = ['Step_ID', 'Header', 'Step_Name', 'Required_Role', 'Attachment_Required', 'Optional']
+        return pd.DataFrame([[step[column] for column in columns] for step in self.steps], columns=columns)
+
+def workflow_config_path(data_file):
+    """workflow_config.json in the directory of the data file"""
+    return os.path.join(os.path.dirname(os.path.abspath(data_file)), WORKFLOW_CONFIG_FILE)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def compile_workflow_config(path, stamp):
+    """WorkflowDefinition of a config file, compiled once per file version (stamp)"""
+    with open(path, encoding='utf-8') as handle:
+        return WorkflowDefinition.from_config(json.load(handle))
+
+def load_workflow_config(path):
+    """Compiled WorkflowDefinition of the config file at path, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    return compile_workflow_config(os.path.abspath(path), file_stamp(path))
+
+def build_workflow_from_steps(frames):
+    return WorkflowDefinition.from_steps_table(frames[2])
+
+def default_tables(workflow=None):
+    """Return the (records, users, steps, workflow_status) tables for a new data store
+    
+    The steps come from workflow when given, otherwise from the built-in defaults.
+    """
+    # Create default data structure
+    workflow_data = pd.DataFrame(columns=RECORD_COLUMNS)
+    
+    users_data = pd.DataFrame({
+        'Username': ['admin', 'john.doe', 'jane.smith', 'bob.wilson'],
+        'Role': ['Lead', 'Developer', 'Manager', 'Business'],
+        'Email': ['admin@company.com', 'john@company.com', 'jane@company.com', 'bob@company.com']
+    })
+    
+    # Default workflow steps
+    workflow_steps = pd.DataFrame({
+        'Step_ID': list(range(1, 14)),
+        'Header': ['Initiation', 'Kickoff', 'Development', 'Development', 'Development', 
+                  'Review', 'Testing', 'Testing', 'Documentation', 'Documentation', 
+                  'Delivery', 'Methodology', 'Presentation'],
+        'Step_Name': [
+            'Identification call with ET along with impact and savings on the engagement, project code',
+            'Data received and communication of objectives to be built',
+            'Development of analytical solution',
+            'Draft output shared with ET',
+            'Output confirmed by ET',
+            'Workflow walkthrough with Lead',
+            'Testing of the workflow',
+            'Review and approval of testing document',
+            'Preparation of know your analytical solution documentation',
+            'Review of the documentation',
+            'Rolling out the email of Analytics and documentation',
+            'Methodology Approval',
+            'Visualization of results and presentation'
+        ],
+        'Required_Role': ['Any', 'Any', 'Any', 'Any', 'Any', 'Lead', 'Any', 'Any', 'Any', 
+                         'Manager', 'Manager', 'Lead', 'Any'],
+        'Attachment_Required': [False, False, False, False, True, False, False, False, False, 
+                              False, False, True, False],
+        'Optional': [False, False, False, False, False, False, False, False, False, 
+                   False, False, False, True]
+    })
+    
+    if workflow is not None:
+        workflow_steps = workflow.steps_table()
+    
+    # Create empty workflow status sheet
+    workflow_status = pd.DataFrame(columns=STATUS_COLUMNS)
+    
+    return workflow_data, users_data, workflow_steps, workflow_status
+
+def fsync_directory(directory):
+    """Flush renames and removals in directory to disk (not possible, nor needed, on Windows)"""
+    if fcntl is None:
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def replacing_file(path):
+    """Yield a temporary path beside path that is renamed over path once the block completes
+    
+    The new contents and then the rename are fsynced before returning, so once the block
+    exits the new file survives a crash.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=directory)
+    os.close(fd)
+    try:
+        yield temp_path
+        with open(temp_path, 'rb+') as handle:
+            os.fsync(handle.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_directory(directory)
+
+def write_workbook(path, records, users, steps, workflow_status):
+    """Write the four tables to an Excel workbook, one sheet each
+    
+    The workbook is written to a temporary file and renamed over path, so readers that do not
+    take the write lock see either the old or the new workbook, never a partial one.
+    """
+    start = time.perf_counter()
+    with replacing_file(path) as temp_path:
+        with pd.ExcelWriter(temp_path, engine='openpyxl') as writer:
+            for sheet_name, frame in zip(SHEET_NAMES, (records, users, steps, workflow_status)):
+                frame.to_excel(writer, sheet_name=sheet_name, index=False)
+    record_io('workbook write', os.path.getsize(path), len(records) + len(workflow_status),
+              time.perf_counter() - start)
+
+def read_workbook_file(path):
+    """Read the four tables from an Excel workbook in one parse, using empty tables for absent sheets"""
+    start = time.perf_counter()
+    with pd.ExcelFile(path) as xls:
+        sheets = pd.read_excel(xls, sheet_name=[name for name in SHEET_NAMES if name in xls.sheet_names])
+    record_io('workbook read', os.path.getsize(path), sum(len(sheet) for sheet in sheets.values()),
+              time.perf_counter() - start)
+    defaults = default_tables()
+    records, users, steps, workflow_status = (sheets.get(name, default.iloc[0:0])
+                                              for name, default in zip(SHEET_NAMES, defaults))
+    return records, users, steps, typed_workflow_status(workflow_status)
+
+# Workflow_Status columns held as categoricals in memory: each repeats a handful of values
+STATUS_CATEGORY_COLUMNS = ['Status', 'Assigned_To']
+
+def blank_to_na(values):
+    """values with empty strings replaced by missing values"""
+    if values.dtype.kind in 'biufcmM':
+        return values
+    return values.mask(values == '')
+
+def typed_workflow_status(workflow_status):
+    """Workflow status frame in the in-memory schema
+    
+    Unique_ID and Step_ID become nullable Int64, Status and Assigned_To categorical (Status
+    with the STATUS_VALUES categories first) and Completed_Date datetime64; blank cells become
+    missing values and Completed_Date cells that are not dates are dropped. Columns already in
+    the schema are left untouched, so applying it again is cheap.
+    """
+    workflow_status = workflow_status.copy(deep=False)
+    for column in STATUS_KEY:
+        if workflow_status[column].dtype != 'Int64':
+            workflow_status[column] = pd.to_numeric(blank_to_na(workflow_status[column])).astype('Int64')
+    for column in STATUS_CATEGORY_COLUMNS:
+        if not isinstance(workflow_status[column].dtype, pd.CategoricalDtype):
+            values = workflow_status[column].astype('category')
+            leading = STATUS_VALUES if column == 'Status' else []
+            found = sorted((value for value in values.cat.categories if value != '' and value not in leading), key=str)
+            # Categories left out (the blank one) become missing values
+            workflow_status[column] = values.cat.set_categories(leading + found)
+    if workflow_status['Completed_Date'].dtype != 'datetime64[us]':
+        # ISO8601 accepts the varying precision of stored timestamps (with or without microseconds);
+        # microseconds are the precision of datetime.now(), so any completion time can be stored
+        workflow_status['Completed_Date'] = pd.to_datetime(workflow_status['Completed_Date'], errors='coerce',
+                                                           format='ISO8601').dt.as_unit('us')
+    return workflow_status
+
+def append_status_rows(workflow_status, new_status):
+    """Concatenate typed workflow status frames, merging the categories of categorical columns"""
+    workflow_status = typed_workflow_status(workflow_status)
+    if new_status.empty:
+        return workflow_status
+    new_status = typed_workflow_status(new_status)
+    for column in STATUS_CATEGORY_COLUMNS:
+        categories = workflow_status[column].cat.categories
+        added = new_status[column].cat.categories.difference(categories)
+        if len(added):
+            workflow_status[column] = workflow_status[column].cat.add_categories(list(added))
+            categories = workflow_status[column].cat.categories
+        new_status[column] = new_status[column].cat.set_categories(categories)
+    return pd.concat([workflow_status, new_status], ignore_index=True)
+
+def concat_row_chunks(chunks):
+    """(new records, new status rows) of a list of such pairs, the status rows typed
+    
+    Empty frames are left out, so they cannot turn the dtypes of the others into object.
+    """
+    records = [chunk[0] for chunk in chunks if len(chunk[0])]
+    statuses = [chunk[1] for chunk in chunks if len(chunk[1])]
+    new_records = pd.concat(records, ignore_index=True) if records else pd.DataFrame(columns=RECORD_COLUMNS)
+    new_status = pd.concat(statuses, ignore_index=True) if statuses else pd.DataFrame(columns=STATUS_COLUMNS)
+    return new_records, typed_workflow_status(new_status)
+
+def status_column_values(column, values):
+    """Cast values being written into a workflow status column to the column's dtype
+    
+    Missing categories are added to categorical columns in place of falling back to object.
+    """
+    dtype = column.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        values = [None if isinstance(value, str) and value == '' else value for value in values]
+        added = [value for value in dict.fromkeys(values) if not pd.isna(value) and value not in dtype.categories]
+        return (column.cat.add_categories(added) if added else column), values
+    if dtype.kind == 'M':
+        return column, pd.to_datetime(values, errors='coerce', format='ISO8601').as_unit('us').tolist()
+    if dtype != object:
+        # Sheets read back as float (all blank) columns must accept any cell value
+        return column.astype(object), values
+    return column, values
+
+def status_positions(workflow_status, keys, index=None):
+    """(update number, row position) pairs of the rows matching each (Unique_ID, Step_ID) key
+    
+    With a StatusIndex for the frame each key is a dict lookup; without one, all keys are
+    matched against the key columns in a single join.
+    """
+    if index is not None:
+        positions = [index.position(*key) for key in keys]
+        return [(number, position) for number, position in enumerate(positions) if position is not None]
+    if len(keys) == 1:
+        rows = (workflow_status['Unique_ID'] == keys[0][0]) & (workflow_status['Step_ID'] == keys[0][1])
+        return [(0, position) for position in np.flatnonzero(rows.to_numpy()).tolist()]
+    matches = pd.DataFrame(keys, columns=STATUS_KEY).reset_index(names='number').merge(
+        workflow_status[STATUS_KEY].reset_index(drop=True).reset_index(names='position'), on=STATUS_KEY)
+    return list(zip(matches['number'].tolist(), matches['position'].tolist()))
+
+def check_status_updates(updates):
+    """Raise ValueError unless each update names one step by integer key and sets only status columns
+    
+    Backends call this before persisting anything, so a bad update never reaches the journal.
+    """
+    for update in updates:
+        for column in STATUS_KEY:
+            value = update.get(column)
+            if isinstance(value, bool) or not isinstance(value, (int, np.integer)):
+                raise ValueError(f"Step update needs an integer {column}, got {value!r}")
+        unknown = set(update) - set(STATUS_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown workflow status columns: {sorted(unknown)}")
+
+def apply_status_updates(workflow_status, updates, index=None):
+    """Apply row-level updates, each a dict keyed on Unique_ID and Step_ID, to a workflow status frame
+    
+    Rows are located once for the whole batch (see status_positions) and each changed column
+    is then written in a single positional assignment; a later update of the same row wins.
+    """
+    keys = [(update['Unique_ID'], update['Step_ID']) for update in updates]
+    columns = {}
+    for number, position in sorted(status_positions(workflow_status, keys, index)):
+        for column, value in updates[number].items():
+            if column not in STATUS_KEY:
+                columns.setdefault(column, {})[position] = value
+    for column, values in columns.items():
+        cast_column, cast_values = status_column_values(workflow_status[column], list(values.values()))
+        if cast_column.dtype != workflow_status[column].dtype:
+            workflow_status[column] = cast_column
+        # A live reference to the column would make the assignment below copy it (copy-on-write)
+        del cast_column
+        location = workflow_status.columns.get_loc(column)
+        if len(values) == 1:
+            # Scalar assignment skips the list validation, the common single step update
+            workflow_status.iat[next(iter(values)), location] = cast_values[0]
+        else:
+            workflow_status.iloc[list(values), location] = cast_values
+    return workflow_status
+
+class StatusIndex:
+    """Row positions of a workflow status frame keyed on (Unique_ID, Step_ID)
+    
+    Built in one pass over the key columns; record and step lookups are then dict lookups.
+    """
+    
+    def __init__(self, workflow_status):
+        self.record_positions = {}
+        self.size = 0
+        if not workflow_status.empty:
+            self.add_rows(workflow_status)
+    
+    def add_rows(self, new_status):
+        """Index status rows appended after the rows already indexed"""
+        keys = zip(new_status['Unique_ID'].tolist(), new_status['Step_ID'].tolist())
+        for position, (unique_id, step_id) in enumerate(keys, start=self.size):
+            self.record_positions.setdefault(unique_id, {})[step_id] = position
+        self.size += len(new_status)
+    
+    def on_records_added(self, frames, new_records, new_status):
+        self.add_rows(new_status)
+    
+    def on_steps_updated(self, frames, updates):
+        # Updates change cell values, never row positions
+        pass
+    
+    def position(self, unique_id, step_id):
+        """Row position of one step of one record, or None if it has no status row"""
+        return self.record_positions.get(unique_id, {}).get(step_id)
+    
+    def step_rows(self, workflow_status, unique_id):
+        """Return {Step_ID: status row as a dict} for one record of the indexed frame"""
+        positions = self.record_positions.get(unique_id, {})
+        rows = workflow_status.iloc[list(positions.values())].to_dict('records')
+        return dict(zip(positions.keys(), rows))
+
+def file_stamp(path):
+    """Return the (mtime, size, inode) stamp identifying the current contents of path"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+def table_version(frame):
+    """Digest of a table's columns and values, to tell whether it changed since it was read"""
+    digest = hashlib.sha256(repr(list(frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class StaleDataError(Exception):
+    """Raised when a write is based on data another user has changed since it was loaded"""
+
+class FileLock:
+    """Exclusive inter-process lock held on a sidecar .lock file
+    
+    Reentrant within one instance, so a locked method may call other locked methods.
+    """
+    
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._handle = None
+    
+    @staticmethod
+    def _try_lock(handle):
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    
+    @staticmethod
+    def _unlock(handle):
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for the write lock on {self.path}")
+        if self._depth == 0:
+            handle = open(self.path, 'a+b')
+            while True:
+                try:
+                    self._try_lock(handle)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        handle.close()
+                        self._thread_lock.release()
+                        raise TimeoutError(f"Timed out waiting for the write lock on {self.path}")
+                    time.sleep(0.01)
+            self._handle = handle
+        self._depth += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock(self._handle)
+            self._handle.close()
+            self._handle = None
+        self._thread_lock.release()
+
+def private_copy(frame):
+    """A copy of frame whose changes never reach frame: shallow under copy-on-write, deep before it"""
+    return frame.copy(deep=not COPY_ON_WRITE)
+
+class WorkbookCache:
+    """Process-wide cache of loaded tables keyed on the data file path and its version
+    
+    Structures derived from the tables (indexes, summaries) are memoized on the same entry,
+    so they are built once per data version and shared by every session. The cache lock is
+    only held to look entries up and store them: loads and builds run under a lock of their
+    own key, so one cold build never blocks lookups of other paths or structures.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._builds = {}
+    
+    def _build_lock(self, key):
+        """Lock serializing the build of one key; the caller holds the cache lock"""
+        return self._builds.setdefault(key, threading.Lock())
+    
+    def get(self, path, version, loader):
+        """Return cached tables for path, calling loader only when the version has changed
+        
+        Concurrent callers for the same version wait for one load instead of repeating it.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            build_lock = self._build_lock((path, version)) if entry is None or entry['version'] != version else None
+        if build_lock is not None:
+            with build_lock:
+                with self._lock:
+                    entry = self._entries.get(path)
+                if entry is None or entry['version'] != version:
+                    try:
+                        loaded = {'version': version, 'frames': tuple(loader()), 'derived': {}}
+                        with self._lock:
+                            # A write installed meanwhile is newer than what was loaded; keep it
+                            if self._entries.get(path) is entry:
+                                self._entries[path] = loaded
+                    finally:
+                        with self._lock:
+                            self._builds.pop((path, version), None)
+                    entry = loaded
+        # Callers may change what they get, so the cached frames are only handed out as copies
+        return tuple(private_copy(frame) for frame in entry['frames'])
+    
+    def derived(self, path, version, name, builder, frames):
+        """Return builder(frames) memoized on the entry for this version
+        
+        If the cached entry has already moved on to another version the result is built for the
+        caller's frames without being cached.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry['version'] != version:
+                entry = None
+            elif name in entry['derived']:
+                return entry['derived'][name]
+            else:
+                build_lock = self._build_lock((path, version, name))
+        if entry is None:
+            return builder(frames)
+        with build_lock:
+            with self._lock:
+                if name in entry['derived']:
+                    return entry['derived'][name]
+            try:
+                structure = builder(entry['frames'])
+                with self._lock:
+                    return entry['derived'].setdefault(name, structure)
+            finally:
+                with self._lock:
+                    self._builds.pop((path, version, name), None)
+    
+    def peek(self, path, version):
+        """Return (frames, derived) cached for exactly this version, or None"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is None or entry['version'] != version:
+                return None
+            return entry['frames'], dict(entry['derived'])
+    
+    def latest(self, path):
+        """Return (version, frames, derived) of whatever version is cached for path, or None"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is None:
+                return None
+            return entry['version'], entry['frames'], dict(entry['derived'])
+    
+    def install(self, path, version, frames, derived=None):
+        """Cache tables this process has just written under their new version"""
+        frames = tuple(private_copy(frame) for frame in frames)
+        with self._lock:
+            self._entries[os.path.abspath(path)] = {'version': version, 'frames': frames,
+                                                    'derived': dict(derived or {})}
+    
+    def invalidate(self, path):
+        """Drop the cached tables for path after a write"""
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+@st.cache_resource(show_spinner=False)
+def get_workbook_cache():
+    """Single WorkbookCache shared by every session and rerun in this server process"""
+    return WorkbookCache()
+
+def build_status_index(frames):
+    return StatusIndex(frames[3])
+
+def insort_unique(values, value):
+    """Insert value into the sorted list values unless it is already present"""
+    position = bisect.bisect_left(values, value)
+    if position == len(values) or values[position] != value:
+        values.insert(position, value)
+
+class FacetIndex:
+    """Nested mapping Client_Group -> Legal_Entity -> Solution -> sorted [Unique_ID]
+    
+    Alongside the tree it keeps the sorted option lists of the cascading record filters and
+    each record's row position. Records added by this process update it in place.
+    """
+    
+    def __init__(self, records):
+        self.tree = {}
+        self.clients, self.entities, self.solutions = [], [], []
+        self.entities_by_client = {}
+        self.solutions_by_client = {}
+        self.solutions_by_entity = {}
+        self.solutions_by_client_entity = {}
+        self.positions = {}
+        self.size = 0
+        if not records.empty:
+            self.add_records(records)
+    
+    def add_records(self, records):
+        """Index records appended after the records already indexed"""
+        columns = [records[column].tolist() for column in ['Unique_ID', 'Client_Group', 'Legal_Entity', 'Solution']]
+        for unique_id, client, entity, solution in zip(*columns):
+            self.positions[unique_id] = self.size
+            self.size += 1
+            if pd.isna(client) or pd.isna(entity) or pd.isna(solution):
+                continue
+            solutions = self.tree.setdefault(client, {}).setdefault(entity, {})
+            if solution not in solutions:
+                solutions[solution] = []
+                insort_unique(self.clients, client)
+                insort_unique(self.entities, entity)
+                insort_unique(self.solutions, solution)
+                insort_unique(self.entities_by_client.setdefault(client, []), entity)
+                insort_unique(self.solutions_by_client.setdefault(client, []), solution)
+                insort_unique(self.solutions_by_entity.setdefault(entity, []), solution)
+                insort_unique(self.solutions_by_client_entity.setdefault((client, entity), []), solution)
+            bisect.insort(solutions[solution], unique_id)
+    
+    def on_records_added(self, frames, new_records, new_status):
+        self.add_records(new_records)
+    
+    def on_steps_updated(self, frames, updates):
+        pass
+    
+    def match(self, client=None, entity=None, solution=None):
+        """Sorted Unique_IDs of records matching every given facet value"""
+        unique_ids = []
+        for client_key in ([client] if client else self.clients):
+            entities = self.tree.get(client_key, {})
+            for entity_key in ([entity] if entity else list(entities)):
+                solutions = entities.get(entity_key, {})
+                for solution_key in ([solution] if solution else list(solutions)):
+                    unique_ids.extend(solutions.get(solution_key, ()))
+        return sorted(unique_ids)
+
+def build_facet_index(frames):
+    return FacetIndex(frames[0])
+
+# Record fields indexed as words; Unique_IDs are matched by number instead
+SEARCH_RECORD_COLUMNS = ['Client_Group', 'Legal_Entity', 'Solution']
+# A word in a record field counts this many times as much as the same word in a step comment
+SEARCH_RECORD_WEIGHT = 2
+# Share of an exact match's score given to a word that only starts with the query term
+SEARCH_PREFIX_WEIGHT = 0.5
+SEARCH_TOKEN = re.compile(r"\w+")
+
+def search_tokens(text):
+    """Lowercased words of text; empty for missing values"""
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return []
+    return SEARCH_TOKEN.findall(str(text).lower())
+
+def count_words(texts, positions, size):
+    """{word: (record positions, occurrence counts)} of the words in texts
+    
+    positions gives the record row position (below size) of each text. Each distinct text is
+    tokenized once; the (word, record) pairs are counted in one vectorized pass.
+    """
+    codes, distinct = pd.factorize(pd.Series(texts, dtype=object))
+    positions = np.asarray(positions, dtype='int64')
+    present = (codes >= 0) & (positions >= 0)
+    codes, positions = codes[present], positions[present]
+    distinct_words = [search_tokens(text) for text in distinct]
+    lengths = np.array([len(words) for words in distinct_words], dtype='int64')
+    word_codes, vocabulary = pd.factorize(pd.Series([word for words in distinct_words for word in words], dtype=object))
+    if not len(vocabulary):
+        return {}
+    # Expand each text to its words: the word_codes slice of its distinct text, per occurrence
+    starts = np.cumsum(lengths) - lengths
+    text_lengths = lengths[codes]
+    offsets = np.arange(text_lengths.sum()) - np.repeat(np.cumsum(text_lengths) - text_lengths, text_lengths)
+    pairs, counts = np.unique(word_codes[np.repeat(starts[codes], text_lengths) + offsets] * size
+                              + np.repeat(positions, text_lengths), return_counts=True)
+    words, positions = np.divmod(pairs, size)
+    bounds = np.flatnonzero(np.diff(words)) + 1
+    return {vocabulary[word_positions_start]: (word_positions, word_counts.astype('float64'))
+            for word_positions_start, word_positions, word_counts in zip(words[np.concatenate([[0], bounds])],
+                                                                         np.split(positions, bounds),
+                                                                         np.split(counts, bounds))}
+
+class SearchIndex:
+    """Inverted index over record fields and step comments
+    
+    Each word maps to the sorted row positions of the records containing it and their weights
+    (occurrences, with record fields counting SEARCH_RECORD_WEIGHT times). Every query term
+    matches the words it is a prefix of, found by bisecting the sorted vocabulary, and the
+    Unique_IDs it is a prefix of. Records added and comments saved by this process update
+    just the words they touch.
+    """
+    
+    def __init__(self, records, workflow_status, index):
+        self.index = index
+        self.unique_ids = np.array(records['Unique_ID'].tolist(), dtype='int64')
+        self.positions = dict(zip(self.unique_ids.tolist(), range(len(self.unique_ids))))
+        self.postings = {}
+        self.vocabulary = []
+        # Comments as indexed, by workflow status row position, to retract when they change
+        self.comments = workflow_status['Comments'].to_numpy()
+        self.changed_comments = {}
+        
+        changes = self.record_words(records, 0)
+        comments = workflow_status['Comments']
+        has_comment = (comments.notna() & (comments.astype(str) != '')).to_numpy()
+        record_positions = pd.Index(self.unique_ids).get_indexer(workflow_status['Unique_ID'][has_comment])
+        for word, part in count_words(comments[has_comment], record_positions, len(self.unique_ids)).items():
+            changes.setdefault(word, []).append(part)
+        self.apply(changes)
+    
+    def record_words(self, records, offset):
+        """{word: [(positions, weights)]} for records placed at row positions from offset"""
+        changes = {}
+        size = offset + len(records)
+        positions = np.arange(offset, size)
+        for column in SEARCH_RECORD_COLUMNS:
+            for word, (word_positions, counts) in count_words(records[column], positions, size).items():
+                changes.setdefault(word, []).append((word_positions, counts * SEARCH_RECORD_WEIGHT))
+        return changes
+    
+    def apply(self, changes):
+        """Add weight changes {word: [(positions, weights)]} to the postings"""
+        for word, parts in changes.items():
+            positions = np.concatenate([part_positions for part_positions, _ in parts])
+            weights = np.concatenate([np.broadcast_to(np.asarray(part_weights, dtype='float64'), len(part_positions))
+                                      for part_positions, part_weights in parts])
+            positions, inverse = np.unique(positions, return_inverse=True)
+            weights = np.bincount(inverse, weights, minlength=len(positions))
+            
+            old_positions, old_weights = self.postings.get(word, (positions[:0], weights[:0]))
+            at = np.searchsorted(old_positions, positions)
+            found = at < len(old_positions)
+            found[found] = old_positions[at[found]] == positions[found]
+            merged = old_weights.copy()
+            merged[at[found]] += weights[found]
+            merged_positions = np.insert(old_positions, at[~found], positions[~found])
+            merged = np.insert(merged, at[~found], weights[~found])
+            kept = merged > 0
+            if kept.all():
+                self.postings[word] = (merged_positions, merged)
+            elif kept.any():
+                self.postings[word] = (merged_positions[kept], merged[kept])
+            elif word in self.postings:
+                del self.postings[word]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+            if word in self.postings and not old_positions.size:
+                bisect.insort(self.vocabulary, word)
+    
+    def on_records_added(self, frames, new_records, new_status):
+        offset = len(self.unique_ids)
+        new_ids = np.array(new_records['Unique_ID'].tolist(), dtype='int64')
+        self.unique_ids = np.concatenate([self.unique_ids, new_ids])
+        self.positions.update(zip(new_ids.tolist(), range(offset, len(self.unique_ids))))
+        self.apply(self.record_words(new_records, offset))
+        comments = new_status['Comments']
+        has_comment = comments.notna() & (comments.astype(str) != '')
+        if has_comment.any():
+            self.on_steps_updated(frames, new_status.loc[has_comment, ['Unique_ID', 'Step_ID', 'Comments']].to_dict('records'))
+    
+    def comment_at(self, position):
+        """Comment indexed for the workflow status row at position"""
+        if position in self.changed_comments:
+            return self.changed_comments[position]
+        return self.comments[position] if position < len(self.comments) else None
+    
+    def on_steps_updated(self, frames, updates):
+        changes = {}
+        for update in updates:
+            record_position = self.positions.get(update['Unique_ID'])
+            position = self.index.position(update['Unique_ID'], update['Step_ID'])
+            if 'Comments' not in update or record_position is None or position is None:
+                continue
+            for comment, sign in [(self.comment_at(position), -1), (update['Comments'], 1)]:
+                for word in search_tokens(comment):
+                    changes.setdefault(word, []).append(([record_position], sign))
+            self.changed_comments[position] = update['Comments']
+        self.apply(changes)
+    
+    def term_scores(self, term):
+        """Score of every record for one query term; zero where it does not match"""
+        scores = np.zeros(len(self.unique_ids))
+        position = bisect.bisect_left(self.vocabulary, term)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(term):
+            word = self.vocabulary[position]
+            positions, weights = self.postings[word]
+            # Rarer words count for more (inverse document frequency)
+            weight = math.log(1 + len(self.unique_ids) / len(positions))
+            if word != term:
+                weight *= SEARCH_PREFIX_WEIGHT
+            scores[positions] += weights * weight
+            position += 1
+        if term.isascii() and term.isdigit() and len(self.unique_ids):
+            # Unique_IDs are scored as record-field words found in a single record
+            weight = SEARCH_RECORD_WEIGHT * math.log(1 + len(self.unique_ids))
+            value = int(term)
+            if str(value) == term:
+                scores[self.unique_ids == value] += weight
+                if value:
+                    largest = int(self.unique_ids.max())
+                    scale = 10
+                    while value * scale <= largest:
+                        scores[(self.unique_ids >= value * scale)
+                               & (self.unique_ids < (value + 1) * scale)] += weight * SEARCH_PREFIX_WEIGHT
+                        scale *= 10
+        return scores
+    
+    def search(self, query, limit=None):
+        """Unique_IDs of the records matching every term of query, best match first"""
+        terms = list(dict.fromkeys(search_tokens(query)))
+        if not terms:
+            return []
+        total = np.zeros(len(self.unique_ids))
+        matched = np.ones(len(self.unique_ids), dtype=bool)
+        for term in terms:
+            scores = self.term_scores(term)
+            matched &= scores > 0
+            total += scores
+        positions = np.flatnonzero(matched)
+        order = np.lexsort((self.unique_ids[positions], -total[positions]))
+        ranked = self.unique_ids[positions[order]].tolist()
+        return ranked if limit is None else ranked[:limit]
+
+def status_rows(workflow_status):
+    """Key, Status and Completed_Date columns of a workflow status frame in canonical form
+    
+    Status becomes a categorical over STATUS_VALUES; unknown or empty statuses count as
+    Not Started, as in workflow_page.
+    """
+    return pd.DataFrame({
+        'Unique_ID': workflow_status['Unique_ID'].to_numpy(),
+        'Step_ID': workflow_status['Step_ID'].to_numpy(),
+        'Status': pd.Categorical(workflow_status['Status'], categories=STATUS_VALUES).fillna('Not Started'),
+        'Completed_Date': pd.to_datetime(workflow_status['Completed_Date'], errors='coerce').to_numpy(),
+    })
+
+def count_statuses(rows, key):
+    """Count status_rows per key value and status in one groupby, with a Total column"""
+    counts = rows.groupby([key, 'Status'], observed=True).size().unstack('Status', fill_value=0)
+    counts = counts.reindex(columns=STATUS_VALUES, fill_value=0)
+    counts.columns = list(STATUS_VALUES)
+    counts['Total'] = counts.sum(axis=1)
+    return counts
+
+class WorkflowDashboard:
+    """Portfolio progress tables computed across every record
+    
+    Each table comes from a single groupby over the whole workflow status, so the cost does
+    not depend on how many records there are beyond the size of that pass.
+    """
+    
+    def __init__(self, records, steps, workflow_status):
+        rows = status_rows(workflow_status)
+        rows['Assigned_To'] = workflow_status['Assigned_To'].astype(object).fillna('').astype(str).replace('', 'Unassigned').to_numpy()
+        is_open = rows['Status'] != 'Completed'
+        
+        by_record = count_statuses(rows, 'Unique_ID')
+        by_record['Completion %'] = (100 * by_record['Completed'] / by_record['Total']).round(1)
+        record_info = records.drop_duplicates('Unique_ID').set_index('Unique_ID')[
+            ['Client_Group', 'Legal_Entity', 'Solution']]
+        self.records = record_info.join(by_record, how='inner')
+        
+        by_step = count_statuses(rows, 'Step_ID')
+        by_step['Open'] = by_step['Total'] - by_step['Completed']
+        step_names = steps.drop_duplicates('Step_ID').set_index('Step_ID')['Step_Name']
+        by_step.insert(0, 'Step_Name', step_names.reindex(by_step.index))
+        self.bottlenecks = by_step.sort_values('Open', ascending=False, kind='stable')
+        
+        by_assignee = count_statuses(rows[is_open], 'Assigned_To')[['Not Started', 'In Progress', 'Total']]
+        self.assignees = by_assignee.rename(columns={'Total': 'Open'}).sort_values('Open', ascending=False, kind='stable')
+        
+        rollup = self.records.assign(Open=self.records['Total'] - self.records['Completed'],
+                                     Done=self.records['Completion %'] == 100)
+        self.client_groups = rollup.groupby('Client_Group').agg(**{
+            'Records': ('Total', 'size'),
+            'Completed Records': ('Done', 'sum'),
+            'Open Steps': ('Open', 'sum'),
+            'Average Completion %': ('Completion %', 'mean'),
+        }).round({'Average Completion %': 1})
+        
+        self.total_records = len(self.records)
+        self.completed_records = int((self.records['Completion %'] == 100).sum())
+        self.open_steps = int(is_open.sum())
+        self.completion = round(100 * (1 - self.open_steps / len(rows)), 1) if len(rows) else 0.0
+
+def build_dashboard(frames):
+    records, _, steps, workflow_status = frames
+    return WorkflowDashboard(records, steps, workflow_status)
+
+def summarize_status(workflow_status):
+    """{Unique_ID: summary} for every record in workflow_status, in one groupby pass
+    
+    A summary holds the Not Started, In Progress and Completed step counts, Last_Update (the
+    latest Completed_Date) and Current_Step (the first step not yet completed, or None).
+    """
+    if workflow_status.empty:
+        return {}
+    rows = status_rows(workflow_status)
+    counts = count_statuses(rows, 'Unique_ID')
+    columns = {status: counts[status].tolist() for status in STATUS_VALUES}
+    last_update = rows.groupby('Unique_ID')['Completed_Date'].max().reindex(counts.index)
+    columns['Last_Update'] = last_update.astype(object).where(last_update.notna(), None).tolist()
+    current_step = rows[rows['Status'] != 'Completed'].groupby('Unique_ID')['Step_ID'].min().reindex(counts.index)
+    columns['Current_Step'] = [None if pd.isna(step_id) else int(step_id) for step_id in current_step.tolist()]
+    # Built from column lists: DataFrame.to_dict('index') is several times slower at this size
+    return {unique_id: dict(zip(columns, values))
+            for unique_id, values in zip(counts.index.tolist(), zip(*columns.values()))}
+
+class StatusSummary:
+    """Materialized per-record step summaries, see summarize_status
+    
+    Kept up to date on every write by re-summarizing only the records the write touched, whose
+    rows are found through the StatusIndex; reads are dict lookups and never scan the table.
+    """
+    
+    def __init__(self, workflow_status, index):
+        self.index = index
+        self.records = summarize_status(workflow_status)
+    
+    def on_records_added(self, frames, new_records, new_status):
+        # A record's rows can arrive over several appends (a chunked import), so its whole set is summarized
+        positions = [position for unique_id in new_status['Unique_ID'].unique().tolist()
+                     for position in self.index.record_positions.get(unique_id, {}).values()]
+        self.records.update(summarize_status(frames[3].iloc[positions]))
+    
+    def on_steps_updated(self, frames, updates):
+        workflow_status = frames[3]
+        for unique_id in {update['Unique_ID'] for update in updates}:
+            positions = list(self.index.record_positions.get(unique_id, {}).values())
+            self.records.update(summarize_status(workflow_status.iloc[positions]))
+    
+    def get(self, unique_id):
+        """Summary of one record, or None if it has no status rows"""
+        return self.records.get(unique_id)
+    
+    def mismatches(self, workflow_status):
+        """Unique_IDs whose stored summary differs from one rebuilt from workflow_status"""
+        expected = summarize_status(workflow_status)
+        return sorted(unique_id for unique_id in set(expected) | set(self.records)
+                      if expected.get(unique_id) != self.records.get(unique_id))
+    
+    def rebuild(self, workflow_status):
+        self.records = summarize_status(workflow_status)
+
+class AssigneeIndex:
+    """Open steps per assignee: Assigned_To -> {row position in the workflow status}
+    
+    Only steps that are assigned and not Completed are indexed. Writes re-index just the rows
+    they touch, found through the StatusIndex, so listing someone's tasks costs O(their tasks).
+    """
+    
+    def __init__(self, workflow_status, index):
+        self.index = index
+        self.tasks = {}
+        # Indexed assignee of every row position (None if not indexed), to find the entry to
+        # drop when a step changes
+        self.assignee_at = []
+        self.add_rows(workflow_status)
+    
+    @staticmethod
+    def open_assignee(status, assigned_to):
+        """The assignee to index a step under, or None if it is completed or unassigned"""
+        if status == 'Completed' or pd.isna(assigned_to) or assigned_to == '':
+            return None
+        return assigned_to
+    
+    def add_rows(self, workflow_status):
+        """Index status rows appended after the rows already indexed"""
+        assigned_to = workflow_status['Assigned_To']
+        is_open = ((workflow_status['Status'] != 'Completed') & assigned_to.notna() & (assigned_to != '')).to_numpy()
+        positions = np.flatnonzero(is_open) + len(self.assignee_at)
+        self.assignee_at.extend(assigned_to.astype(object).where(is_open, None).tolist())
+        for assignee, group in workflow_status[is_open].groupby('Assigned_To', sort=False).indices.items():
+            self.tasks.setdefault(assignee, set()).update(positions[group].tolist())
+    
+    def on_records_added(self, frames, new_records, new_status):
+        self.add_rows(new_status)
+    
+    def on_steps_updated(self, frames, updates):
+        workflow_status = frames[3]
+        columns = [workflow_status.columns.get_loc(column) for column in ['Status', 'Assigned_To']]
+        for key in {(update['Unique_ID'], update['Step_ID']) for update in updates}:
+            position = self.index.position(*key)
+            if position is None:
+                continue
+            previous = self.assignee_at[position]
+            if previous is not None:
+                self.tasks[previous].discard(position)
+                if not self.tasks[previous]:
+                    del self.tasks[previous]
+            assignee = self.open_assignee(*(workflow_status.iat[position, column] for column in columns))
+            self.assignee_at[position] = assignee
+            if assignee is not None:
+                self.tasks.setdefault(assignee, set()).add(position)
+    
+    def get(self, assigned_to):
+        """Sorted workflow status row positions of the open steps assigned to assigned_to"""
+        return sorted(self.tasks.get(assigned_to, ()))
+
+logger = logging.getLogger(__name__)
+
+# Logging levels of the notice levels WorkflowManager reports, named after the st.* calls that show them
+NOTICE_LEVELS = {'error': logging.ERROR, 'warning': logging.WARNING, 'info': logging.INFO, 'success': logging.INFO}
+
+def log_notice(level, message):
+    """Default WorkflowManager notify: report the notice through the module logger"""
+    logger.log(NOTICE_LEVELS[level], message)
+
+# Opt-in per-rerun instrumentation: WORKFLOW_METRICS=1 turns it on for every session, a path in
+# WORKFLOW_METRICS_LOG also appends each rerun as a JSON line to that rotating log
+METRICS_ENV = 'WORKFLOW_METRICS'
+METRICS_LOG_ENV = 'WORKFLOW_METRICS_LOG'
+METRICS_LOG_BYTES = 5 * 1024 * 1024
+METRICS_LOG_BACKUPS = 5
+# Instrumented reruns kept per session for the Admin Console
+METRICS_HISTORY = 20
+
+class RerunMetrics:
+    """Measurements of one run of the app script while instrumentation is enabled
+    
+    WorkflowManager calls are timed by instrument_calls, storage reads and writes are counted by
+    record_io and element calls by count_elements. They find the metrics of the running
+    rerun through active_metrics, which is None (and costs one lookup) when it is disabled.
+    """
+    
+    def __init__(self):
+        self.started = datetime.now()
+        # Method name -> [calls, seconds], including calls nested in other calls
+        self.calls = {}
+        # I/O kind (e.g. "workbook read") -> {count, bytes, rows, seconds}
+        self.io = {}
+        # Table name -> {rows, columns, bytes} as loaded
+        self.frames = {}
+        self.elements = 0
+        # Nesting of the WorkflowManager call in progress; only outermost calls add to manager_seconds
+        self.depth = 0
+        self.manager_seconds = 0.0
+        self.seconds = None
+        self.page = None
+        self.user = None
+        self.outcome = None
+    
+    def add_call(self, name, seconds):
+        entry = self.calls.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        if self.depth == 0:
+            self.manager_seconds += seconds
+    
+    def add_io(self, kind, nbytes=None, rows=None, seconds=None):
+        entry = self.io.setdefault(kind, {'count': 0, 'bytes': 0, 'rows': 0, 'seconds': 0.0})
+        entry['count'] += 1
+        entry['bytes'] += nbytes or 0
+        entry['rows'] += rows or 0
+        entry['seconds'] += seconds or 0.0
+    
+    def add_frames(self, names, frames):
+        for name, frame in zip(names, frames):
+            self.frames[name] = {'rows': len(frame), 'columns': len(frame.columns),
+                                 'bytes': int(frame.memory_usage(deep=False).sum())}
+    
+    def io_totals(self, direction):
+        """(count, bytes) of the reads or writes of this rerun"""
+        entries = [entry for kind, entry in self.io.items() if kind.endswith(' ' + direction)]
+        return sum(entry['count'] for entry in entries), sum(entry['bytes'] for entry in entries)
+    
+    def as_dict(self):
+        reads, bytes_read = self.io_totals('read')
+        writes, bytes_written = self.io_totals('write')
+        return {
+            'started': self.started.isoformat(timespec='milliseconds'), 'page': self.page, 'user': self.user,
+            'outcome': self.outcome, 'seconds': self.seconds, 'manager_seconds': self.manager_seconds,
+            'elements': self.elements, 'reads': reads, 'bytes_read': bytes_read, 'writes': writes,
+            'bytes_written': bytes_written,
+            'calls': {name: {'count': count, 'seconds': seconds} for name, (count, seconds) in self.calls.items()},
+            'io': self.io, 'frames': self.frames,
+        }
+
+# The RerunMetrics of the rerun running on each thread; Streamlit runs every session's script on its own thread
+_active_metrics = threading.local()
+
+def active_metrics():
+    return getattr(_active_metrics, 'rerun', None)
+
+def record_io(kind, nbytes=None, rows=None, seconds=None):
+    """Count a storage read or write (kind ends in " read" or " write") against the running rerun"""
+    metrics = active_metrics()
+    if metrics is not None:
+        metrics.add_io(kind, nbytes, rows, seconds)
+
+def instrumented(method):
+    """Wrap a method so its calls are timed into the running rerun's RerunMetrics"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        metrics = active_metrics()
+        if metrics is None:
+            return method(*args, **kwargs)
+        metrics.depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.depth -= 1
+            metrics.add_call(method.__name__, time.perf_counter() - start)
+    return wrapper
+
+def instrument_calls(cls):
+    """Class decorator applying instrumented to every public method of cls"""
+    for name, value in list(vars(cls).items()):
+        if not name.startswith('_') and callable(value):
+            setattr(cls, name, instrumented(value))
+    return cls
+
+# Streamlit element functions the app calls, counted into RerunMetrics.elements
+ELEMENT_FUNCTIONS = [
+    'markdown', 'caption', 'header', 'subheader', 'info', 'success', 'warning', 'error', 'metric',
+    'dataframe', 'data_editor', 'bar_chart', 'columns', 'tabs', 'expander', 'button', 'download_button',
+    'toggle', 'checkbox', 'radio', 'selectbox', 'multiselect', 'text_input', 'text_area', 'number_input',
+    'file_uploader',
+]
+
+def counted_element(function):
+    """Wrap a Streamlit element function so its calls are counted into the running rerun's RerunMetrics"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = active_metrics()
+        if metrics is not None:
+            metrics.elements += 1
+        return function(*args, **kwargs)
+    wrapper.counts_elements = True
+    return wrapper
+
+def count_elements():
+    """Count calls of ELEMENT_FUNCTIONS from now on in this process; calling it again does nothing
+    
+    Wraps the public st.<name> functions and the DeltaGenerator methods behind containers
+    such as columns and the sidebar. Uninstrumented reruns pay one thread-local lookup per call.
+    """
+    for name in ELEMENT_FUNCTIONS:
+        for owner in (DeltaGenerator, st):
+            function = getattr(owner, name)
+            if not getattr(function, 'counts_elements', False):
+                setattr(owner, name, counted_element(function))
+
+# Seconds the compactor waits after a step update so bursts of updates share one workbook rewrite
+JOURNAL_COMPACT_DELAY = 2.0
+# Seconds between checks for journals left behind by other processes or failed compactions
+JOURNAL_COMPACT_INTERVAL = 60.0
+
+class StepJournal:
+    """Append-only JSON-lines journal of step updates and new rows not yet folded into the workbook
+    
+    Step updates are entries keyed on Unique_ID and Step_ID; new Records and Workflow_Status
+    rows are whole rows tagged with their table under APPEND. The journal has its own lock,
+    so appends never wait for a workbook rewrite. A rewrite first detaches the journal
+    (renames it to path.compacting), folds those entries in and then discards them, while
+    new appends start a fresh journal; reads replay the detached entries before the live
+    ones. Entries are idempotent column assignments, so replaying one that already reached
+    the workbook (e.g. after a crash before the discard) changes nothing, and replayed rows
+    are skipped if their key is already present.
+    """
+    
+    APPEND = '_append'
+    DATETIME_COLUMNS = {'Completed_Date', 'Created_Date'}
+    
+    def __init__(self, path):
+        self.path = path
+        self.detached_path = path + '.compacting'
+        self.lock = FileLock(path + '.lock')
+    
+    def size(self):
+        """Bytes in the detached and live journals; detaching leaves it unchanged"""
+        size = 0
+        for path in (self.detached_path, self.path):
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return size
+    
+    def detached_size(self):
+        try:
+            return os.path.getsize(self.detached_path)
+        except FileNotFoundError:
+            return 0
+    
+    @staticmethod
+    def encode(update):
+        entry = {}
+        for column, value in update.items():
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif hasattr(value, 'item'):
+                # Unwrap numpy scalars into plain Python values
+                value = value.item()
+            entry[column] = value
+        return entry
+    
+    def decode(self, entry):
+        for column in self.DATETIME_COLUMNS.intersection(entry):
+            if entry[column]:
+                entry[column] = pd.Timestamp(entry[column])
+        return entry
+    
+    def append(self, updates):
+        """Durably append updates and return the number of bytes written"""
+        lines = ''.join(json.dumps(self.encode(update)) + '\n' for update in updates)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(lines)
+                handle.flush()
+                os.fsync(handle.fileno())
+        # json.dumps escapes non-ASCII, so characters are bytes
+        record_io('journal write', len(lines), len(updates))
+        return len(lines)
+    
+    def append_rows(self, new_records, new_status):
+        """Durably append new Records and Workflow_Status rows and return the number of bytes written"""
+        entries = []
+        for table, frame in (('Records', new_records), ('Workflow_Status', new_status)):
+            rows = frame.astype(object).where(frame.notna(), None).to_dict('records')
+            entries.extend(dict(row, **{self.APPEND: table}) for row in rows)
+        return self.append(entries) if entries else 0
+    
+    @classmethod
+    def split(cls, entries):
+        """Return (new records, new status rows, step updates) of entries, the rows as typed frames"""
+        rows = {'Records': [], 'Workflow_Status': []}
+        updates = []
+        for entry in entries:
+            table = entry.get(cls.APPEND)
+            if table is None:
+                updates.append(entry)
+            else:
+                rows[table].append({column: value for column, value in entry.items() if column != cls.APPEND})
+        new_records = pd.DataFrame(rows['Records'], columns=RECORD_COLUMNS)
+        new_records['Unique_ID'] = new_records['Unique_ID'].astype('int64')
+        new_records['Created_Date'] = pd.to_datetime(new_records['Created_Date'])
+        return new_records, typed_workflow_status(pd.DataFrame(rows['Workflow_Status'], columns=STATUS_COLUMNS)), updates
+    
+    def read(self, start=0):
+        """Return (updates, journal size), skipping any line torn by an interrupted append
+        
+        Only entries from byte start on are read; offsets run through the detached entries
+        into the live ones, so a size returned earlier still marks the same point until a
+        rewrite discards the detached entries.
+        """
+        chunks = []
+        offset = 0
+        with self.lock:
+            for path in (self.detached_path, self.path):
+                try:
+                    with open(path, 'rb') as handle:
+                        size = os.fstat(handle.fileno()).st_size
+                        if offset + size > start:
+                            handle.seek(max(start - offset, 0))
+                            chunks.append(handle.read())
+                        offset += size
+                except FileNotFoundError:
+                    pass
+        data = b''.join(chunks)
+        updates = []
+        for line in data.splitlines():
+            try:
+                updates.append(self.decode(json.loads(line)))
+            except ValueError:
+                continue
+        record_io('journal read', len(data), len(updates))
+        return updates, max(offset, start)
+    
+    def detach(self):
+        """Move the live entries aside for a workbook rewrite; the caller holds the storage write lock"""
+        with self.lock:
+            if not os.path.exists(self.path):
+                return
+            if os.path.exists(self.detached_path):
+                # Left by a rewrite that failed: keep the entries in order behind it
+                with open(self.path, 'rb') as source, open(self.detached_path, 'ab') as target:
+                    target.write(source.read())
+                    target.flush()
+                    os.fsync(target.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.detached_path)
+            fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+    
+    def discard_detached(self):
+        """Remove the detached entries once a rewrite including them is on disk"""
+        with self.lock:
+            if os.path.exists(self.detached_path):
+                os.remove(self.detached_path)
+                fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+
+def replay_journal(tables, entries, derived=None, index=None):
+    """Return (tables, derived) with journal entries applied to the four tables
+    
+    Journaled rows whose key tables already hold are skipped; the rest are appended before
+    the step updates are applied. Derived structures are carried forward as a write of the
+    same rows and updates would carry them; otherwise index may speed up the row lookups.
+    """
+    new_records, new_status, updates = StepJournal.split(entries)
+    records, users, steps, workflow_status = tables
+    if derived is not None:
+        index = derived.get('status_index')
+    new_records = new_records[~new_records['Unique_ID'].isin(records['Unique_ID'])].reset_index(drop=True)
+    if len(new_status):
+        keys = list(zip(new_status['Unique_ID'].tolist(), new_status['Step_ID'].tolist()))
+        present = [number for number, _ in status_positions(workflow_status, keys, index)]
+        new_status = new_status.drop(index=present).reset_index(drop=True)
+    if len(new_records) or len(new_status):
+        if len(new_records):
+            records = pd.concat([records, new_records], ignore_index=True)
+        workflow_status = append_status_rows(workflow_status, new_status)
+        tables = records, users, steps, workflow_status
+        if derived is not None:
+            derived = StorageBackend.carried_forward((tables, derived), tables, 'on_records_added',
+                                                     new_records, new_status)
+            index = derived.get('status_index')
+        else:
+            # The index does not cover the appended rows
+            index = None
+    if updates:
+        tables = records, users, steps, apply_status_updates(private_copy(workflow_status), updates, index)
+        if derived is not None:
+            derived = StorageBackend.carried_forward((tables, derived), tables, 'on_steps_updated', updates)
+    return tables, derived
+
+class JournalCompactor:
+    """Background thread that folds a workbook's step journal into the workbook"""
+    
+    def __init__(self, data_file):
+        self.storage = ExcelStorage(data_file, get_workbook_cache())
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"journal-compactor-{os.path.basename(data_file)}",
+                                       daemon=True)
+        self.thread.start()
+    
+    def notify(self):
+        self.wake.set()
+    
+    def run(self):
+        while True:
+            if self.wake.wait(timeout=JOURNAL_COMPACT_INTERVAL):
+                time.sleep(JOURNAL_COMPACT_DELAY)
+                self.wake.clear()
+            if not os.path.exists(self.storage.data_file):
+                # Removed (e.g. a temporary workbook); compact again if it is recreated
+                continue
+            try:
+                self.storage.compact()
+            except TimeoutError as e:
+                # A long rewrite elsewhere holds the workbook; appends are unaffected, so retry soon
+                logger.warning("Compacting the step journal into %s postponed: %s", self.storage.data_file, e)
+                self.wake.set()
+            except Exception:
+                # The journal is kept, so nothing is lost; the next wake-up retries. A workbook
+                # removed while it was being compacted is skipped as above.
+                if os.path.exists(self.storage.data_file):
+                    logger.exception("Compacting the step journal into %s failed", self.storage.data_file)
+
+@st.cache_resource(show_spinner=False)
+def get_journal_compactor(data_file):
+    """One compactor thread per workbook in this server process"""
+    return JournalCompactor(data_file)
+
+class StorageBackend:
+    """Interface WorkflowManager uses to read and persist the four workflow tables
+    
+    Backends implement version, load, save_all, replace_table, update_status, append_rows and
+    import_rows. load must record the version it served in loaded_version and the matching
+    data_version, which stale-write checks compare, in loaded_data_version. Writes run under
+    self.lock, an inter-process FileLock held only for the write itself; reads never take it.
+    Step updates are serialized by update_lock, which backends may keep apart from the write lock.
+    """
+    
+    cache_path = None
+    loaded_version = None
+    loaded_data_version = None
+    lock = None
+    
+    @property
+    def update_lock(self):
+        return self.lock
+    
+    def data_version(self):
+        """Version that moves only when the data changes; this default is version()"""
+        return self.version()
+    
+    def check_version(self, expected_version):
+        """Raise StaleDataError if the stored data no longer matches expected_version, a data_version"""
+        if expected_version is not None and self.data_version() != expected_version:
+            raise StaleDataError("The data was changed by another user since it was loaded")
+    
+    def derived(self, name, builder, frames):
+        """Return builder(frames) memoized in the shared cache for the last loaded version"""
+        return self.cache.derived(self.cache_path, self.loaded_version, name, builder, frames)
+    
+    def iter_tables(self, chunk_rows):
+        """Yield (sheet name, frame) chunks of at most chunk_rows rows of the four tables
+        
+        Tables come in SHEET_NAMES order, all from one version of the data, and each yields at
+        least one (possibly empty) frame. This default slices the loaded tables; backends
+        override it to stream from storage without loading everything.
+        """
+        for sheet_name, frame in zip(SHEET_NAMES, self.load()):
+            for start in range(0, max(len(frame), 1), chunk_rows):
+                yield sheet_name, frame.iloc[start:start + chunk_rows]
+    
+    def step_states(self, keys):
+        """{(Unique_ID, Step_ID): (Status, Assigned_To)} of the keys that have a status row, blanks as None
+        
+        This default looks the keys up in the loaded tables through the status index.
+        """
+        frames = self.load()
+        index = self.derived('status_index', build_status_index, frames)
+        workflow_status = frames[3]
+        locations = [workflow_status.columns.get_loc(column) for column in ['Status', 'Assigned_To']]
+        states = {}
+        for key in keys:
+            position = index.position(*key)
+            if position is not None:
+                states[key] = tuple(None if pd.isna(value) or value == '' else value
+                                    for value in (workflow_status.iat[position, location] for location in locations))
+        return states
+    
+    def next_unique_id(self):
+        """Unique_ID for the next new record, from 1000 up; the caller holds the update lock
+        
+        Taken from the cached tables while they are current, so only a cold cache loads.
+        """
+        cached = self.cached_tables()
+        records = cached[0][0] if cached is not None else self.load()[0]
+        return 1000 if records.empty else int(records['Unique_ID'].max()) + 1
+    
+    # Writes made by this process move the shared cache forward instead of invalidating it.
+    # Derived structures implementing the write's event handler (on_records_added,
+    # on_steps_updated) are updated in place; the rest are rebuilt on demand. Handlers get
+    # the tables just written followed by the write's own arguments.
+    
+    def cached_tables(self):
+        """(frames, derived) cached for the current stored version, or None; caller holds the lock"""
+        return self.cache.peek(self.cache_path, self.version())
+    
+    @staticmethod
+    def updated_tables(cached, updates):
+        """Cached tables with step updates applied to a copy of the workflow status"""
+        (records, users, steps, workflow_status), derived = cached
+        return records, users, steps, apply_status_updates(private_copy(workflow_status), updates,
+                                                           derived.get('status_index'))
+    
+    @staticmethod
+    def carried_forward(cached, frames, event=None, *args):
+        """Derived structures of cached that handle event, updated for frames
+        
+        With no event the data is unchanged (e.g. compaction) and every structure is kept.
+        """
+        derived = {}
+        for name, structure in (cached[1].items() if cached is not None else ()):
+            handler = getattr(structure, event, None) if event else None
+            if event is None or handler is not None:
+                if handler is not None:
+                    handler(frames, *args)
+                derived[name] = structure
+        return derived
+    
+    def advance_cache(self, cached, frames, event=None, *args):
+        """Cache frames under the version just written, carrying derived structures forward; caller holds the lock"""
+        self.cache.install(self.cache_path, self.version(), frames, self.carried_forward(cached, frames, event, *args))
+
+class ExcelStorage(StorageBackend):
+    """Storage backend keeping all four tables in one Excel workbook
+    
+    Step updates and new rows are appended to a StepJournal beside the workbook under the
+    journal's own lock and acknowledged as soon as they are on disk; load overlays the journal
+    on the workbook and a JournalCompactor thread later folds it in. Other writes rewrite the
+    whole workbook under self.lock, folding in the journal entries detached when they started.
+    """
+    
+    def __init__(self, data_file, cache):
+        self.data_file = self.cache_path = data_file
+        self.cache = cache
+        self.lock = FileLock(data_file + '.lock')
+        self.journal = StepJournal(data_file + '.journal')
+        self.version_file = data_file + '.version'
+        # Only create the file here; sheet validation happens on the single parse in load
+        if not os.path.exists(self.data_file):
+            self.create_default_workbook()
+    
+    @property
+    def update_lock(self):
+        return self.journal.lock
+    
+    def open_workbook(self):
+        """Open the Excel file once, recreating it if it is unreadable or missing required sheets"""
+        if os.path.exists(self.data_file):
+            try:
+                xls = pd.ExcelFile(self.data_file)
+            except Exception as e:
+                logger.error("Error reading Excel file %s: %s. Recreating file...", self.data_file, e)
+            else:
+                missing_sheets = [sheet for sheet in REQUIRED_SHEETS if sheet not in xls.sheet_names]
+                if not missing_sheets:
+                    return xls
+                xls.close()
+                logger.warning("Missing sheets in Excel file %s: %s. Recreating file...",
+                               self.data_file, missing_sheets)
+        
+        self.create_default_workbook()
+        return pd.ExcelFile(self.data_file)
+    
+    def create_default_workbook(self):
+        """Write a new Excel file with default users, steps and empty record sheets"""
+        try:
+            with self.lock:
+                write_workbook(self.data_file,
+                               *default_tables(load_workflow_config(workflow_config_path(self.data_file))))
+                with self.journal.lock:
+                    self.record_write()
+            self.cache.invalidate(self.data_file)
+            logger.info("Excel file %s created with all required sheets", self.data_file)
+        except Exception:
+            logger.exception("Failed to create Excel file %s", self.data_file)
+            raise
+    
+    def read_workbook(self):
+        """Parse the Excel file once and return all four sheets from that single parse"""
+        start = time.perf_counter()
+        with self.open_workbook() as xls:
+            sheets = pd.read_excel(xls, sheet_name=[name for name in SHEET_NAMES if name in xls.sheet_names])
+        record_io('workbook read', os.path.getsize(self.data_file), sum(len(sheet) for sheet in sheets.values()),
+                  time.perf_counter() - start)
+        
+        records, users, steps = (sheets[name] for name in REQUIRED_SHEETS)
+        workflow_status = sheets.get('Workflow_Status')
+        if workflow_status is None:
+            # Create empty workflow status DataFrame if sheet doesn't exist and save it
+            workflow_status = pd.DataFrame(columns=STATUS_COLUMNS)
+            with self.lock:
+                write_workbook(self.data_file, records, users, steps, workflow_status)
+        
+        return records, users, steps, typed_workflow_status(workflow_status)
+    
+    def version(self):
+        with self.journal.lock:
+            return file_stamp(self.data_file), self.journal.size()
+    
+    # The data version is a generation counter bumped by every rewrite that changes the data,
+    # plus the journal bytes written since: those still in the journal and those compaction has
+    # folded into the workbook. Compaction therefore leaves it unchanged, so whole-table saves
+    # loaded before a compaction are not rejected as stale. It is kept in a sidecar file along
+    # with the stamp of the workbook it describes.
+    
+    def read_version_file(self):
+        try:
+            with open(self.version_file, encoding='utf-8') as handle:
+                return json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return {'generation': 0, 'folded': 0, 'stamp': None}
+    
+    def data_version(self):
+        """(generation, journal bytes written since), read under the journal lock
+        
+        A workbook whose stamp is not the one recorded was changed outside this app; its
+        stamp is added, so saves loaded before that change are rejected.
+        """
+        with self.journal.lock:
+            recorded = self.read_version_file()
+            version = (recorded['generation'], recorded['folded'] + self.journal.size())
+            stamp = list(file_stamp(self.data_file))
+            return version if recorded['stamp'] in (None, stamp) else version + (tuple(stamp),)
+    
+    def record_write(self, compacting=False):
+        """Record a rewrite just renamed into place; the caller holds the journal lock
+        
+        Compaction adds the detached bytes it folded in, so call it before discarding them;
+        any other rewrite starts a new generation.
+        """
+        recorded = self.read_version_file()
+        if compacting:
+            recorded['folded'] += self.journal.detached_size()
+        else:
+            recorded = {'generation': recorded['generation'] + 1, 'folded': 0}
+        recorded['stamp'] = list(file_stamp(self.data_file))
+        with replacing_file(self.version_file) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as handle:
+                json.dump(recorded, handle)
+    
+    def read_journal(self):
+        """Return (journal entries, version) read under the journal lock
+        
+        A rewrite only discards the entries it folded in under that lock, so the workbook
+        stamped here holds at most those entries on top of what the journal replays.
+        """
+        with self.journal.lock:
+            entries, journal_size = self.journal.read()
+            return entries, (file_stamp(self.data_file), journal_size)
+    
+    def load(self):
+        """Return the tables, reading only journal entries the shared cache does not hold yet
+        
+        A cached version of the same workbook is brought up to date by replaying just the
+        entries appended since, carrying its derived structures forward; an up-to-date one
+        is served without touching the journal.
+        """
+        if not os.path.exists(self.data_file):
+            self.create_default_workbook()
+        with self.journal.lock:
+            version = self.version()
+            data_version = self.data_version()
+            base = self.cache.latest(self.data_file)
+            if base is not None and (base[0][0] != version[0] or base[0][1] > version[1]):
+                base = None
+            entries = []
+            if base is None or base[0] != version:
+                entries, _ = self.journal.read(base[0][1] if base is not None else 0)
+        self.loaded_version, self.loaded_data_version = version, data_version
+        return self.cache.get(self.data_file, version, lambda: self.caught_up(version, base, entries))
+    
+    def caught_up(self, version, base, entries):
+        """Tables of version: base, a cached (version, frames, derived), with the later entries replayed"""
+        if base is None:
+            return self.overlay_journal(version[0], entries)
+        tables, derived = replay_journal(base[1], entries, base[2])
+        # Installed here so the carried-forward structures stay with the tables
+        self.cache.install(self.data_file, version, tables, derived)
+        return tables
+    
+    def overlay_journal(self, stamp, entries):
+        """Return the workbook tables (cached per workbook stamp) with the journal replayed"""
+        workbook_key = self.data_file + '#workbook'
+        tables = self.cache.get(workbook_key, stamp, self.read_workbook)
+        if not entries:
+            return tables
+        index = self.cache.derived(workbook_key, stamp, 'status_index', build_status_index, tables)
+        return replay_journal(tables, entries, index=index)[0]
+    
+    def iter_tables(self, chunk_rows):
+        entries, version = self.read_journal()
+        new_records, new_status, updates = StepJournal.split(entries)
+        # Journaled rows are few and soon compacted, so they are served from the loaded tables
+        if len(new_records) or len(new_status) or self.cache.peek(self.data_file, version) is not None:
+            yield from super().iter_tables(chunk_rows)
+            return
+        # Stream the workbook in read-only mode, overlaying the journal chunk by chunk
+        workbook = openpyxl.load_workbook(self.data_file, read_only=True, data_only=True)
+        try:
+            for sheet_name, default in zip(SHEET_NAMES, default_tables()):
+                empty = True
+                if sheet_name in workbook.sheetnames:
+                    for chunk in sheet_chunks(workbook[sheet_name], chunk_rows):
+                        chunk = chunk.reset_index(drop=True)
+                        if sheet_name == 'Workflow_Status':
+                            chunk = typed_workflow_status(chunk)
+                            if updates:
+                                chunk = apply_status_updates(chunk, updates)
+                        empty = False
+                        yield sheet_name, chunk
+                if empty:
+                    yield sheet_name, default.iloc[0:0]
+        finally:
+            workbook.close()
+    
+    # Every rewrite detaches the journal before reading anything it writes back, so entries
+    # appended while it runs stay in the live journal and are replayed over the new workbook.
+    
+    def write_tables(self, tables, cached=None, event=None, *args, compacting=False):
+        """Write tables over the workbook, then discard the detached journal entries they include
+        
+        The shared cache moves to the new version: derived structures of cached are carried
+        forward as in advance_cache, and entries journaled since the detach are replayed.
+        Caller holds the lock and detached the journal before loading what tables came from;
+        compacting marks a rewrite that only folds those entries in.
+        """
+        try:
+            # write_workbook fsyncs the workbook and its rename, so a crash after it cannot
+            # lose detached entries that are not yet in the workbook on disk
+            write_workbook(self.data_file, *tables)
+        except BaseException:
+            self.cache.invalidate(self.data_file)
+            self.cache.invalidate(self.data_file + '#workbook')
+            raise
+        # Cache what was just written so the next load does not reparse the workbook
+        self.cache.install(self.data_file + '#workbook', file_stamp(self.data_file), tables)
+        with self.journal.lock:
+            self.record_write(compacting)
+            self.journal.discard_detached()
+            entries, version = self.read_journal()
+            tables, derived = replay_journal(tables, entries, self.carried_forward(cached, tables, event, *args))
+            self.cache.install(self.data_file, version, tables, derived)
+    
+    def save_all(self, records, users, steps, workflow_status, expected_version=None):
+        with self.lock:
+            self.journal.detach()
+            self.check_version(expected_version)
+            self.write_tables((records, users, steps, typed_workflow_status(workflow_status)))
+    
+    def compact(self):
+        """Fold the journal into the workbook via temp file + rename, then discard it"""
+        with self.lock:
+            if self.journal.size() == 0:
+                return False
+            self.journal.detach()
+            tables = self.load()
+            self.write_tables(tables, self.cache.peek(self.data_file, self.loaded_version), compacting=True)
+            return True
+    
+    # Table-level writes reload the workbook under the lock and apply only their own changes,
+    # so concurrent edits to other rows are merged instead of overwritten.
+    
+    def replace_table(self, sheet_name, frame, expected_version=None):
+        with self.lock:
+            self.journal.detach()
+            self.check_version(expected_version)
+            tables = dict(zip(SHEET_NAMES, self.load()))
+            tables[sheet_name] = typed_workflow_status(frame) if sheet_name == 'Workflow_Status' else frame
+            self.write_tables(tuple(tables[name] for name in SHEET_NAMES))
+    
+    # Step updates and new rows are only journaled. Each is cached under the version its own
+    # append makes, even if a rewrite renames a new workbook into place meanwhile: that one
+    # is stamped differently.
+    
+    def update_status(self, updates):
+        check_status_updates(updates)
+        with self.journal.lock:
+            stamp, journal_size = self.version()
+            cached = self.cache.peek(self.data_file, (stamp, journal_size))
+            journal_size += self.journal.append(updates)
+            if cached is not None:
+                frames = self.updated_tables(cached, updates)
+                self.cache.install(self.data_file, (stamp, journal_size), frames,
+                                   self.carried_forward(cached, frames, 'on_steps_updated', updates))
+        get_journal_compactor(os.path.abspath(self.data_file)).notify()
+    
+    def append_rows(self, new_records, new_status):
+        with self.journal.lock:
+            stamp, journal_size = self.version()
+            cached = self.cache.peek(self.data_file, (stamp, journal_size))
+            journal_size += self.journal.append_rows(new_records, new_status)
+            if cached is not None:
+                records, users, steps, workflow_status = cached[0]
+                if len(new_records):
+                    records = pd.concat([records, new_records], ignore_index=True)
+                frames = (records, users, steps, append_status_rows(workflow_status, new_status))
+                self.cache.install(self.data_file, (stamp, journal_size), frames,
+                                   self.carried_forward(cached, frames, 'on_records_added', new_records, new_status))
+        get_journal_compactor(os.path.abspath(self.data_file)).notify()
+    
+    def import_rows(self, chunks):
+        """Append (new records, new status rows) chunks to the workbook in one rewrite
+        
+        Bulk imports bypass the journal, which would replay every imported row on each load
+        until compacted. The caller holds the write lock and then the update lock, so nothing
+        is journaled while the workbook is rewritten.
+        """
+        self.journal.detach()
+        records, users, steps, workflow_status = tables = self.load()
+        cached = self.cache.peek(self.data_file, self.loaded_version)
+        new_records, new_status = concat_row_chunks(list(chunks))
+        if new_records.empty and new_status.empty:
+            return
+        tables = (pd.concat([records, new_records], ignore_index=True) if len(new_records) else records,
+                  users, steps, append_status_rows(workflow_status, new_status))
+        self.write_tables(tables, cached, 'on_records_added', new_records, new_status)
+
+class SQLiteStorage(StorageBackend):
+    """Storage backend keeping the four tables in an indexed SQLite database
+    
+    Step updates and new records are row-level UPDATE/INSERT statements; the Excel workbook
+    remains the import/export format. A version counter in the meta table is bumped by every
+    write and keys the shared table cache.
+    """
+    
+    TABLES = {'Records': 'records', 'Users': 'users', 'Steps': 'steps', 'Workflow_Status': 'workflow_status'}
+    COLUMNS = {
+        'Records': RECORD_COLUMNS,
+        'Users': ['Username', 'Role', 'Email'],
+        'Steps': ['Step_ID', 'Header', 'Step_Name', 'Required_Role', 'Attachment_Required', 'Optional'],
+        'Workflow_Status': STATUS_COLUMNS,
+    }
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (version INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS records (
+            Unique_ID INTEGER PRIMARY KEY, Client_Group TEXT, Legal_Entity TEXT,
+            Solution TEXT, Created_Date TEXT, Created_By TEXT
+        );
+        CREATE TABLE IF NOT EXISTS users (Username TEXT, Role TEXT, Email TEXT);
+        CREATE TABLE IF NOT EXISTS steps (
+            Step_ID INTEGER, Header TEXT, Step_Name TEXT, Required_Role TEXT,
+            Attachment_Required INTEGER, Optional INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS workflow_status (
+            Unique_ID INTEGER NOT NULL, Step_ID INTEGER NOT NULL, Status TEXT, Assigned_To TEXT,
+            Completed_By TEXT, Completed_Date TEXT, Comments TEXT, Attachment_Path TEXT,
+            PRIMARY KEY (Unique_ID, Step_ID)
+        );
+        CREATE INDEX IF NOT EXISTS workflow_status_assigned_to ON workflow_status (Assigned_To);
+        INSERT INTO meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM meta);
+    """
+    # Database files this process has already applied SCHEMA to; a storage is created per rerun
+    schema_applied = set()
+    
+    def __init__(self, db_file, cache, workbook=None):
+        self.db_file = self.cache_path = db_file
+        self.cache = cache
+        self.lock = FileLock(db_file + '.lock')
+        is_new = not os.path.exists(self.db_file)
+        if is_new or os.path.abspath(self.db_file) not in self.schema_applied:
+            with closing(self.connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(self.SCHEMA)
+            self.schema_applied.add(os.path.abspath(self.db_file))
+        if is_new:
+            # One-shot migration of an existing workbook, otherwise start from the defaults
+            if workbook and os.path.exists(workbook):
+                self.import_workbook(workbook)
+            else:
+                self.save_all(*default_tables(load_workflow_config(workflow_config_path(self.db_file))))
+    
+    def connect(self):
+        return sqlite3.connect(self.db_file, timeout=30)
+    
+    @contextmanager
+    def transaction(self):
+        """Yield a connection whose statements commit atomically together with a version bump"""
+        start = time.perf_counter()
+        with self.lock, closing(self.connect()) as conn:
+            with conn:
+                yield conn
+                # SQLite I/O is counted in rows changed, not bytes
+                changes = conn.total_changes
+                conn.execute("UPDATE meta SET version = version + 1")
+        record_io('database write', rows=changes, seconds=time.perf_counter() - start)
+    
+    @staticmethod
+    def to_sql_value(value):
+        if value is None or (not isinstance(value, str) and pd.isna(value)) or value == '':
+            return None
+        if isinstance(value, datetime):
+            return value.isoformat(sep=' ')
+        # Unwrap numpy scalars into plain Python values
+        return value.item() if hasattr(value, 'item') else value
+    
+    @classmethod
+    def sql_values(cls, values):
+        """A column as SQLite parameters, converted as to_sql_value would but a column at a time"""
+        if values.dtype.kind == 'M':
+            return values.dt.strftime('%Y-%m-%d %H:%M:%S.%f').where(values.notna(), None).tolist()
+        values = values.astype(object)
+        if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'integer', 'floating', 'boolean', 'empty'):
+            return [cls.to_sql_value(value) for value in values]
+        return values.where(values.notna() & (values != ''), None).tolist()
+    
+    def insert_rows(self, conn, sheet_name, frame):
+        columns = self.COLUMNS[sheet_name]
+        frame = frame.reindex(columns=columns)
+        rows = list(zip(*(self.sql_values(frame[column]) for column in columns)))
+        conn.executemany(
+            f"INSERT INTO {self.TABLES[sheet_name]} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})", rows)
+    
+    def import_workbook(self, path):
+        """Replace the database contents with the four sheets of an Excel workbook and its journal"""
+        entries, _ = StepJournal(path + '.journal').read()
+        self.save_all(*replay_journal(read_workbook_file(path), entries)[0])
+    
+    @staticmethod
+    def typed_table(sheet_name, frame):
+        """A table as read from SQLite, converted to the in-memory column types"""
+        if sheet_name == 'Records':
+            # An empty result set has no integer column to infer
+            frame['Unique_ID'] = frame['Unique_ID'].astype('int64')
+            # Stored as ISO text whose precision varies (no microseconds at exactly midnight)
+            frame['Created_Date'] = pd.to_datetime(frame['Created_Date'], format='ISO8601')
+        elif sheet_name == 'Steps':
+            for column in ['Attachment_Required', 'Optional']:
+                frame[column] = frame[column].fillna(0).astype(bool)
+        elif sheet_name == 'Workflow_Status':
+            frame = typed_workflow_status(frame)
+        return frame
+    
+    def read_tables(self):
+        start = time.perf_counter()
+        with closing(self.connect()) as conn:
+            tables = tuple(self.typed_table(name, pd.read_sql_query(f"SELECT * FROM {self.TABLES[name]} ORDER BY rowid", conn))
+                           for name in SHEET_NAMES)
+        record_io('database read', rows=sum(len(table) for table in tables), seconds=time.perf_counter() - start)
+        return tables
+    
+    def iter_tables(self, chunk_rows):
+        with closing(self.connect()) as conn:
+            # One read transaction, so every table comes from the same snapshot
+            conn.execute("BEGIN")
+            for sheet_name in SHEET_NAMES:
+                empty = True
+                for chunk in pd.read_sql_query(f"SELECT * FROM {self.TABLES[sheet_name]} ORDER BY rowid", conn,
+                                               chunksize=chunk_rows):
+                    empty = False
+                    yield sheet_name, self.typed_table(sheet_name, chunk)
+                if empty:
+                    yield sheet_name, self.typed_table(sheet_name, pd.DataFrame(columns=self.COLUMNS[sheet_name]))
+    
+    def step_states(self, keys):
+        # Selects only the keyed rows through the primary key, whatever the cache holds
+        states = {}
+        with closing(self.connect()) as conn:
+            for start in range(0, len(keys), 400):
+                batch = keys[start:start + 400]
+                rows = conn.execute(
+                    "SELECT Unique_ID, Step_ID, Status, Assigned_To FROM workflow_status "
+                    f"WHERE (Unique_ID, Step_ID) IN (VALUES {', '.join(['(?, ?)'] * len(batch))})",
+                    [self.to_sql_value(value) for key in batch for value in key])
+                for unique_id, step_id, status, assigned_to in rows:
+                    states[unique_id, step_id] = (status or None, assigned_to or None)
+        return states
+    
+    def next_unique_id(self):
+        with closing(self.connect()) as conn:
+            largest = conn.execute("SELECT MAX(Unique_ID) FROM records").fetchone()[0]
+        return 1000 if largest is None else largest + 1
+    
+    def version(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT version FROM meta").fetchone()[0]
+    
+    def load(self):
+        self.loaded_version = self.loaded_data_version = self.version()
+        return self.cache.get(self.db_file, self.loaded_version, self.read_tables)
+    
+    def save_all(self, records, users, steps, workflow_status, expected_version=None):
+        with self.transaction() as conn:
+            self.check_version(expected_version)
+            for sheet_name, frame in zip(SHEET_NAMES, (records, users, steps, workflow_status)):
+                conn.execute(f"DELETE FROM {self.TABLES[sheet_name]}")
+                self.insert_rows(conn, sheet_name, frame)
+    
+    def replace_table(self, sheet_name, frame, expected_version=None):
+        with self.transaction() as conn:
+            self.check_version(expected_version)
+            conn.execute(f"DELETE FROM {self.TABLES[sheet_name]}")
+            self.insert_rows(conn, sheet_name, frame)
+    
+    def update_status(self, updates):
+        check_status_updates(updates)
+        with self.lock:
+            cached = self.cached_tables()
+            # Consecutive updates setting the same columns share one prepared statement
+            batches = []
+            for update in updates:
+                columns = tuple(column for column in update if column not in STATUS_KEY)
+                if not batches or batches[-1][0] != columns:
+                    batches.append((columns, []))
+                batches[-1][1].append([self.to_sql_value(update[column]) for column in columns]
+                                      + [int(update['Unique_ID']), int(update['Step_ID'])])
+            with self.transaction() as conn:
+                for columns, rows in batches:
+                    conn.executemany(
+                        f"UPDATE workflow_status SET {', '.join(f'{column} = ?' for column in columns)} "
+                        "WHERE Unique_ID = ? AND Step_ID = ?", rows)
+            if cached is not None:
+                self.advance_cache(cached, self.updated_tables(cached, updates), 'on_steps_updated', updates)
+    
+    def append_rows(self, new_records, new_status):
+        with self.lock:
+            self.import_rows([(new_records, new_status)])
+    
+    def import_rows(self, chunks):
+        """Insert (new records, new status rows) chunks in one transaction; the caller holds the lock"""
+        cached = self.cached_tables()
+        added = []
+        with self.transaction() as conn:
+            for new_records, new_status in chunks:
+                self.insert_rows(conn, 'Records', new_records)
+                self.insert_rows(conn, 'Workflow_Status', new_status)
+                if cached is not None:
+                    added.append((new_records, new_status))
+        if cached is not None and added:
+            records, users, steps, workflow_status = cached[0]
+            new_records, new_status = concat_row_chunks(added)
+            if len(new_records):
+                # Typed as a reload would read them, so the cached frame keeps its dtypes
+                new_records = self.typed_table('Records', new_records.reindex(columns=RECORD_COLUMNS))
+                records = pd.concat([records, new_records], ignore_index=True)
+            self.advance_cache(cached, (records, users, steps, append_status_rows(workflow_status, new_status)),
+                               'on_records_added', new_records, new_status)
+
+# Uploads move through memory at most this many bytes at a time
+ATTACHMENT_CHUNK_SIZE = 1024 * 1024
+# st.download_button cannot stream: even deferred, its media file storage keeps the whole file
+# in memory as bytes. Larger attachments are not offered for download in the app.
+ATTACHMENT_DOWNLOAD_LIMIT = 200 * 1024 * 1024
+
+class AttachmentStore:
+    """Content-addressed attachment files kept beside the data file
+    
+    Files are stored as attachments/<sha256[:2]>/<sha256><extension>, so identical uploads
+    share one file. Paths handed out are relative to the data file's directory.
+    """
+    
+    def __init__(self, base_dir, folder="attachments"):
+        self.base_dir = base_dir
+        self.folder = folder
+    
+    def full_path(self, relative_path):
+        return os.path.join(self.base_dir, relative_path)
+    
+    def save(self, source, filename):
+        """Copy a readable binary file object to the store in chunks and return its relative path"""
+        root = self.full_path(self.folder)
+        os.makedirs(root, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=root)
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                for chunk in iter(lambda: source.read(ATTACHMENT_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    handle.write(chunk)
+                record_io('attachment write', handle.tell())
+            name = digest.hexdigest()
+            relative_path = os.path.join(self.folder, name[:2], name + os.path.splitext(filename)[1].lower())
+            if os.path.exists(self.full_path(relative_path)):
+                # Same content already stored
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(self.full_path(relative_path)), exist_ok=True)
+                os.replace(temp_path, self.full_path(relative_path))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return relative_path
+    
+    def exists(self, relative_path):
+        return isinstance(relative_path, str) and bool(relative_path) and os.path.isfile(self.full_path(relative_path))
+    
+    def size(self, relative_path):
+        return os.path.getsize(self.full_path(relative_path))
+    
+    def read(self, relative_path):
+        """Return the stored file in one read, so only a single copy of it is in memory"""
+        with open(self.full_path(relative_path), 'rb') as handle:
+            data = handle.read()
+        record_io('attachment read', len(data))
+        return data
+
+# Event log queries parse partitions at most this many rows at a time
+EVENT_CHUNK_ROWS = 100_000
+# How far before a time_in_step range the events of the steps it measures are read
+EVENT_LOOKBACK = pd.Timedelta(days=180)
+
+class StepEventLog:
+    """Append-only log of workflow step transitions, one CSV partition per calendar month
+    
+    Each row is the state a step moved into: Timestamp, Unique_ID, Step_ID, Status, Assigned_To
+    and Changed_By. Partitions (events/YYYY-MM.csv beside the data file) are only ever appended
+    to; queries open just the months they cover and parse them a chunk at a time, keeping only
+    the columns and rows they need.
+    """
+    
+    COLUMNS = ['Timestamp', 'Unique_ID', 'Step_ID', 'Status', 'Assigned_To', 'Changed_By']
+    CATEGORY_COLUMNS = ['Status', 'Assigned_To', 'Changed_By']
+    
+    def __init__(self, base_dir, folder="events"):
+        self.root = os.path.join(base_dir, folder)
+    
+    def partition_path(self, month):
+        return os.path.join(self.root, f"{month}.csv")
+    
+    def append(self, events):
+        """Durably append events, dicts or a frame keyed on COLUMNS; the caller holds the storage update lock"""
+        if not len(events):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        frame = pd.DataFrame(events, columns=self.COLUMNS)
+        timestamps = pd.to_datetime(frame['Timestamp'])
+        # Events written together mostly share a timestamp, so each distinct one is formatted once
+        codes, distinct = pd.factorize(timestamps)
+        frame['Timestamp'] = distinct.strftime('%Y-%m-%dT%H:%M:%S.%f').to_numpy()[codes]
+        for month, rows in frame.groupby(timestamps.dt.to_period('M')):
+            path = self.partition_path(month)
+            write_header = not os.path.exists(path)
+            with open(path, 'a', encoding='utf-8', newline='') as handle:
+                offset = handle.tell()
+                rows.to_csv(handle, header=write_header, index=False)
+                handle.flush()
+                os.fsync(handle.fileno())
+                record_io('event log write', handle.tell() - offset, len(rows))
+    
+    def partitions(self, start=None, end=None):
+        """Paths of the partitions that can hold events in [start, end), oldest first"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        months = []
+        for name in names:
+            stem, extension = os.path.splitext(name)
+            if extension == '.csv':
+                try:
+                    months.append(pd.Period(stem, freq='M'))
+                except ValueError:
+                    continue
+        first = pd.Timestamp(start).to_period('M') if start is not None else None
+        last = (pd.Timestamp(end) - pd.Timedelta(microseconds=1)).to_period('M') if end is not None else None
+        return [self.partition_path(month) for month in sorted(months)
+                if (first is None or month >= first) and (last is None or month <= last)]
+    
+    def read(self, start=None, end=None, columns=None, keys=None):
+        """Yield chunks of the events in [start, end), oldest partition first
+        
+        Only Timestamp and the given columns are parsed. With keys, a collection of
+        (Unique_ID, Step_ID), only the events of those steps are kept.
+        """
+        columns = self.COLUMNS if columns is None else list(dict.fromkeys(
+            ['Timestamp'] + list(columns) + (STATUS_KEY if keys is not None else [])))
+        keys = pd.MultiIndex.from_tuples(list(keys), names=STATUS_KEY) if keys is not None else None
+        dtypes = {column: 'category' for column in self.CATEGORY_COLUMNS if column in columns}
+        for path in self.partitions(start, end):
+            record_io('event log read', os.path.getsize(path))
+            for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=EVENT_CHUNK_ROWS):
+                chunk['Timestamp'] = pd.to_datetime(chunk['Timestamp'], format='ISO8601')
+                keep = np.ones(len(chunk), dtype=bool)
+                if start is not None:
+                    keep &= (chunk['Timestamp'] >= pd.Timestamp(start)).to_numpy()
+                if end is not None:
+                    keep &= (chunk['Timestamp'] < pd.Timestamp(end)).to_numpy()
+                if keys is not None:
+                    keep &= pd.MultiIndex.from_frame(chunk[STATUS_KEY]).isin(keys)
+                yield chunk[keep]
+    
+    def weekly_throughput(self, start=None, end=None, by=None):
+        """Steps completed per week (starting Monday) in [start, end)
+        
+        With by, an event column such as 'Step_ID', the counts are split into one column per value.
+        """
+        counts = []
+        for chunk in self.read(start, end, columns=['Status'] + ([by] if by else [])):
+            completed = chunk[chunk['Status'] == 'Completed']
+            groups = [completed['Timestamp'].dt.to_period('W-SUN').dt.start_time.rename('Week')]
+            if by:
+                groups.append(completed[by])
+            counts.append(completed.groupby(groups, observed=True).size())
+        if not counts:
+            return pd.DataFrame(columns=['Completed'], index=pd.DatetimeIndex([], name='Week'))
+        counts = pd.concat(counts)
+        counts = counts.groupby(level=list(range(counts.index.nlevels))).sum()
+        return counts.unstack(fill_value=0) if by else counts.to_frame('Completed')
+    
+    def time_in_step(self, start=None, end=None, lookback=EVENT_LOOKBACK):
+        """Mean hours per Step_ID that steps completed in [start, end) spent in each status
+        
+        A step's time runs from its first event after its previous completion (normally the
+        creation of its record) to the completion, split by the status it was in. Only events of
+        the steps completed in the range are read, from lookback before start, so a step open
+        for longer is measured from its first event in that window.
+        """
+        completions = []
+        for chunk in self.read(start, end, columns=STATUS_KEY + ['Status']):
+            completions.append(chunk.loc[chunk['Status'] == 'Completed', STATUS_KEY])
+        keys = pd.concat(completions).drop_duplicates() if completions else pd.DataFrame()
+        if keys.empty:
+            return pd.DataFrame(columns=['Completed', 'Not Started', 'In Progress', 'Total'],
+                                index=pd.Index([], name='Step_ID'))
+        history_start = pd.Timestamp(start) - lookback if start is not None else None
+        events = pd.concat(self.read(history_start, end, columns=STATUS_KEY + ['Status'],
+                                     keys=keys.itertuples(index=False, name=None)), ignore_index=True)
+        events = events.sort_values(STATUS_KEY + ['Timestamp'], kind='stable', ignore_index=True)
+        
+        events['Done'] = (events['Status'] == 'Completed').astype(int)
+        step = events.groupby(STATUS_KEY, sort=False)
+        # Events up to and including a completion form one episode of the step
+        events['Episode'] = step['Done'].cumsum() - events['Done']
+        events['Hours'] = (step['Timestamp'].shift(-1) - events['Timestamp']).dt.total_seconds() / 3600
+        
+        episodes = STATUS_KEY + ['Episode']
+        ends = events.loc[events['Done'] == 1, episodes + ['Timestamp']]
+        if start is not None:
+            ends = ends[ends['Timestamp'] >= pd.Timestamp(start)]
+        spans = events[events['Done'] == 0].merge(ends[episodes], on=episodes)
+        hours = spans.pivot_table(index=episodes, columns='Status', values='Hours', aggfunc='sum',
+                                  fill_value=0, observed=True)
+        hours = hours.reindex(columns=['Not Started', 'In Progress'], fill_value=0)
+        hours['Total'] = hours.sum(axis=1)
+        by_step = hours.groupby(level='Step_ID')
+        result = by_step.mean().round(2)
+        result.columns = list(result.columns)
+        result.insert(0, 'Completed', by_step.size())
+        return result
+
+def step_transitions(states, updates, changed_by, timestamp=None):
+    """StepEventLog rows for the updates that change a step's Status or Assigned_To
+    
+    states is StorageBackend.step_states of the updated keys; updates of other keys are skipped.
+    """
+    timestamp = timestamp or datetime.now()
+    columns = ['Status', 'Assigned_To']
+    blank = lambda value: None if pd.isna(value) or value == '' else value
+    events = []
+    for update in updates:
+        if not any(column in update for column in columns):
+            continue
+        if (update['Unique_ID'], update['Step_ID']) not in states:
+            continue
+        previous = list(states[update['Unique_ID'], update['Step_ID']])
+        current = [blank(update[column]) if column in update else value for column, value in zip(columns, previous)]
+        if current != previous:
+            events.append({'Timestamp': timestamp, 'Unique_ID': update['Unique_ID'], 'Step_ID': update['Step_ID'],
+                           'Status': current[0], 'Assigned_To': current[1], 'Changed_By': changed_by})
+    return events
+
+# Import and export stream Records and Workflow_Status through memory this many rows at a time
+TRANSFER_CHUNK_ROWS = 10_000
+TRANSFER_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.xlsx': 'xlsx'}
+TRANSFER_SHEETS = ['Records', 'Workflow_Status']
+IMPORT_REQUIRED_COLUMNS = {'Records': ['Client_Group', 'Legal_Entity', 'Solution'], 'Workflow_Status': STATUS_KEY}
+# Rejected import rows reported one by one; any beyond this are only counted
+IMPORT_REJECTION_LIMIT = 100
+# Imported (Unique_ID, Step_ID) pairs are checked for duplicates as Unique_ID * IMPORT_STEP_SPACE + Step_ID
+IMPORT_STEP_SPACE = 1 << 20
+
+def pyarrow_modules():
+    """(pyarrow, pyarrow.parquet); Parquet files need the optional pyarrow package"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet import and export need the pyarrow package (pip install pyarrow)") from None
+    return pyarrow, pyarrow.parquet
 
-# Initialize session state
-if 'current_user' not in st.session_state:
-    st.session_state.current_user = None
-if 'selected_record' not in st.session_state:
-    st.session_state.selected_record = None
+def transfer_format(path, format=None):
+    """'csv', 'parquet' or 'xlsx': format if given, otherwise the one named by the extension of path"""
+    format = format or TRANSFER_FORMATS.get(os.path.splitext(path)[1].lower())
+    if format not in TRANSFER_FORMATS.values():
+        raise ValueError(f"Cannot tell the format of {path}; use an .xlsx, .csv or .parquet extension or give the format")
+    return format
 
+def transfer_frame(frame):
+    """frame with the same column types in every chunk, so that chunks stream into one table
+    
+    IDs become Int64, dates datetime64 and every other column that is not numeric or boolean
+    text, with categoricals decoded.
+    """
+    frame = frame.copy(deep=False)
+    for column in frame.columns:
+        values = frame[column]
+        if column in STATUS_KEY:
+            if values.dtype != 'Int64':
+                frame[column] = pd.to_numeric(blank_to_na(values.astype(object))).astype('Int64')
+        elif column in ('Created_Date', 'Completed_Date'):
+            if values.dtype != 'datetime64[us]':
+                frame[column] = pd.to_datetime(values, errors='coerce', format='ISO8601').dt.as_unit('us')
+        elif values.dtype.kind not in 'biuf':
+            values = values.astype(object)
+            frame[column] = values.where(values.notna(), None).astype('string')
+    return frame
+
+def write_sheet_file(path, format, frames):
+    """Write frames, chunks of one table, to a CSV or Parquet file one at a time; returns the row count"""
+    rows = 0
+    if format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            for number, frame in enumerate(frames):
+                frame = transfer_frame(frame)
+                frame.to_csv(handle, header=number == 0, index=False, date_format='%Y-%m-%dT%H:%M:%S.%f')
+                rows += len(frame)
+        return rows
+    pyarrow, parquet = pyarrow_modules()
+    writer = None
+    try:
+        for frame in frames:
+            table = pyarrow.Table.from_pandas(transfer_frame(frame), preserve_index=False,
+                                              schema=writer.schema if writer is not None else None)
+            if writer is None:
+                writer = parquet.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def write_table_chunks(path, format, chunks):
+    """Write (sheet name, frame) chunks, grouped by sheet, to an .xlsx workbook or a directory of CSV or Parquet files
+    
+    The workbook is streamed with openpyxl's write-only mode; each file or workbook replaces its
+    target only once complete. Returns {sheet name: rows written}.
+    """
+    counts = {}
+    sheets = itertools.groupby(chunks, key=lambda chunk: chunk[0])
+    if format != 'xlsx':
+        os.makedirs(path, exist_ok=True)
+        for sheet_name, sheet_chunks in sheets:
+            with replacing_file(os.path.join(path, f"{sheet_name}.{format}")) as temp_path:
+                counts[sheet_name] = write_sheet_file(temp_path, format, (frame for _, frame in sheet_chunks))
+        return counts
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_name, sheet_chunks in sheets:
+        worksheet = workbook.create_sheet(sheet_name)
+        counts[sheet_name] = 0
+        for number, (_, frame) in enumerate(sheet_chunks):
+            frame = transfer_frame(frame)
+            if number == 0:
+                worksheet.append(list(frame.columns))
+            values = frame.astype(object)
+            for row in values.where(values.notna(), None).itertuples(index=False, name=None):
+                worksheet.append(row)
+            counts[sheet_name] += len(frame)
+    with replacing_file(path) as temp_path:
+        workbook.save(temp_path)
+    return counts
+
+def sheet_chunks(worksheet, chunk_rows):
+    """Frames of at most chunk_rows rows of an openpyxl worksheet whose first row is the header
+    
+    Frames are indexed by spreadsheet row number (the header is row 1); blank rows are skipped.
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(name) for name in header]
+    width = len(columns)
+    chunk, numbers = [], []
+    for number, row in enumerate(rows, start=2):
+        if all(value is None for value in row):
+            continue
+        chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+        numbers.append(number)
+        if len(chunk) == chunk_rows:
+            yield pd.DataFrame(chunk, columns=columns, index=numbers)
+            chunk, numbers = [], []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=columns, index=numbers)
+
+def import_sources(source):
+    """{sheet name: (path, format)} of the Records and, if present, Workflow_Status tables in source
+    
+    source is an .xlsx workbook, a CSV or Parquet file of records, or a directory of
+    <sheet name>.csv or .parquet files as written by WorkflowManager.export_data.
+    """
+    if os.path.isdir(source):
+        found = {}
+        for sheet_name in TRANSFER_SHEETS:
+            for format in ['csv', 'parquet']:
+                path = os.path.join(source, f"{sheet_name}.{format}")
+                if os.path.exists(path):
+                    found[sheet_name] = (path, format)
+                    break
+    elif transfer_format(source) == 'xlsx':
+        workbook = openpyxl.load_workbook(source, read_only=True)
+        names = workbook.sheetnames
+        workbook.close()
+        found = {sheet_name: (source, 'xlsx') for sheet_name in TRANSFER_SHEETS if sheet_name in names}
+    else:
+        found = {'Records': (source, transfer_format(source))}
+    if 'Records' not in found:
+        raise ValueError(f"No Records table found in {source}")
+    return found
+
+def read_table_chunks(path, format, sheet_name, chunk_rows):
+    """Frames of at most chunk_rows rows of one imported table, indexed by spreadsheet row number"""
+    if format == 'xlsx':
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from sheet_chunks(workbook[sheet_name], chunk_rows)
+        finally:
+            workbook.close()
+    elif format == 'csv':
+        with pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                chunk.index += 2
+                yield chunk
+    else:
+        _, parquet = pyarrow_modules()
+        first_row = 2
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            chunk = batch.to_pandas()
+            chunk.index = range(first_row, first_row + len(chunk))
+            first_row += len(chunk)
+            yield chunk
+
+def import_text(chunk, column):
+    """Cells of an imported column as stripped strings; blank and missing cells (or column) are ''"""
+    if column not in chunk:
+        return pd.Series('', index=chunk.index, dtype=object)
+    values = chunk[column].astype(object)
+    return values.where(values.notna(), '').astype(str).str.strip()
+
+def import_integers(chunk, column):
+    """(int64 values, whole-number mask) of an imported column; cells that are not whole numbers read as 0"""
+    numbers = pd.to_numeric(import_text(chunk, column), errors='coerce')
+    valid = numbers.notna() & (numbers % 1 == 0)
+    return numbers.where(valid, 0).astype('int64').to_numpy(), valid.to_numpy()
+
+def import_dates(chunk, column):
+    """(datetime64 values, invalid mask) of an imported column; blank cells are NaT and valid"""
+    text = import_text(chunk, column)
+    dates = pd.to_datetime(text.where(text != ''), errors='coerce', format='ISO8601')
+    return dates, ((text != '') & dates.isna()).to_numpy()
+
+def sorted_lookup(sorted_values, values):
+    """(positions, found mask) of values in the sorted array sorted_values"""
+    positions = np.searchsorted(sorted_values, values)
+    found = positions < len(sorted_values)
+    found[found] = sorted_values[positions[found]] == values[found]
+    return positions, found
+
+def repeated_keys(valid, keys, known_keys):
+    """Mask of the valid rows whose key repeats that of an earlier valid row or is in the sorted known_keys"""
+    repeated = np.zeros(len(keys), dtype=bool)
+    valid_keys = keys[valid]
+    repeated[np.flatnonzero(valid)] = pd.Series(valid_keys).duplicated().to_numpy() | sorted_lookup(known_keys, valid_keys)[1]
+    return repeated
+
+def first_failures(index, checks):
+    """[(row, reason)] of the rows failing any of checks, a list of (failed mask, reason), with the first reason that applies"""
+    reasons = np.full(len(index), None, dtype=object)
+    for failed, reason in reversed(checks):
+        reasons[failed] = reason
+    failed = pd.notna(reasons)
+    return failed, list(zip(index[failed].tolist(), reasons[failed].tolist()))
+
+def create_storage(data_file):
+    """Build the storage backend selected by the WORKFLOW_STORAGE environment variable (excel or sqlite)"""
+    backend = os.environ.get('WORKFLOW_STORAGE', 'excel').lower()
+    if backend == 'excel':
+        return ExcelStorage(data_file, get_workbook_cache())
+    if backend == 'sqlite':
+        return SQLiteStorage(os.path.splitext(data_file)[0] + '.db', get_workbook_cache(), workbook=data_file)
+    raise ValueError(f"Unknown WORKFLOW_STORAGE backend '{backend}', expected 'excel' or 'sqlite'")
+
+@instrument_calls
 class WorkflowManager:
-    def __init__(self):
-        self.data_file = "workflow_data.xlsx"
-        self.ensure_excel_file_exists()
-        
-    def ensure_excel_file_exists(self):
-        """Create Excel file with required sheets if it doesn't exist or is missing sheets"""
-        create_new_file = False
-        
-        if not os.path.exists(self.data_file):
-            create_new_file = True
-        else:
-            # Check if all required sheets exist
-            try:
-                with pd.ExcelFile(self.data_file) as xls:
-                    required_sheets = ['Records', 'Users', 'Steps']
-                    existing_sheets = xls.sheet_names
-                    missing_sheets = [sheet for sheet in required_sheets if sheet not in existing_sheets]
-                    
-                    if missing_sheets:
-                        st.warning(f"Missing sheets in Excel file: {missing_sheets}. Recreating file...")
-                        create_new_file = True
-            except Exception as e:
-                st.error(f"Error reading Excel file: {e}. Recreating file...")
-                create_new_file = True
-        
-        if create_new_file:
-            # Create default data structure
-            workflow_data = pd.DataFrame(columns=[
-                'Unique_ID', 'Client_Group', 'Legal_Entity', 'Solution', 'Created_Date', 'Created_By'
-            ])
-            
-            users_data = pd.DataFrame({
-                'Username': ['admin', 'john.doe', 'jane.smith', 'bob.wilson'],
-                'Role': ['Lead', 'Developer', 'Manager', 'Business'],
-                'Email': ['admin@company.com', 'john@company.com', 'jane@company.com', 'bob@company.com']
-            })
-            
-            # Default workflow steps
-            workflow_steps = pd.DataFrame({
-                'Step_ID': list(range(1, 14)),
-                'Header': ['Initiation', 'Kickoff', 'Development', 'Development', 'Development', 
-                          'Review', 'Testing', 'Testing', 'Documentation', 'Documentation', 
-                          'Delivery', 'Methodology', 'Presentation'],
-                'Step_Name': [
-                    'Identification call with ET along with impact and savings on the engagement, project code',
-                    'Data received and communication of objectives to be built',
-                    'Development of analytical solution',
-                    'Draft output shared with ET',
-                    'Output confirmed by ET',
-                    'Workflow walkthrough with Lead',
-                    'Testing of the workflow',
-                    'Review and approval of testing document',
-                    'Preparation of know your analytical solution documentation',
-                    'Review of the documentation',
-                    'Rolling out the email of Analytics and documentation',
-                    'Methodology Approval',
-                    'Visualization of results and presentation'
-                ],
-                'Required_Role': ['Any', 'Any', 'Any', 'Any', 'Any', 'Lead', 'Any', 'Any', 'Any', 
-                                 'Manager', 'Manager', 'Lead', 'Any'],
-                'Attachment_Required': [False, False, False, False, True, False, False, False, False, 
-                                      False, False, True, False],
-                'Optional': [False, False, False, False, False, False, False, False, False, 
-                           False, False, False, True]
-            })
-            
-            # Create empty workflow status sheet
-            workflow_status = pd.DataFrame(columns=[
-                'Unique_ID', 'Step_ID', 'Status', 'Assigned_To', 'Completed_By', 
-                'Completed_Date', 'Comments', 'Attachment_Path'
-            ])
-            
-            try:
-                with pd.ExcelWriter(self.data_file, engine='openpyxl') as writer:
-                    workflow_data.to_excel(writer, sheet_name='Records', index=False)
-                    users_data.to_excel(writer, sheet_name='Users', index=False)
-                    workflow_steps.to_excel(writer, sheet_name='Steps', index=False)
-                    workflow_status.to_excel(writer, sheet_name='Workflow_Status', index=False)
-                st.success(f"Excel file '{self.data_file}' created successfully with all required sheets!")
-            except Exception as e:
-                st.error(f"Failed to create Excel file: {e}")
-                raise
+    """Data layer of the app: reads and writes the workflow tables through a StorageBackend
+    
+    It makes no Streamlit calls, so it also runs headless (the CLI, benchmarks). Problems the
+    user should see are passed to notify(level, message), with level one of error, warning,
+    info or success; the default logs them and the app passes show_notice.
+    """
+    
+    def __init__(self, data_file="workflow_data.xlsx", storage=None, notify=log_notice):
+        self.data_file = data_file
+        self.notify = notify
+        self.storage = storage if storage is not None else create_storage(data_file)
+        self.attachments = AttachmentStore(os.path.dirname(os.path.abspath(data_file)))
+        self.events = StepEventLog(os.path.dirname(os.path.abspath(data_file)))
+        self.config_file = workflow_config_path(data_file)
+        self.tables = None
+        # Version of the data this manager last loaded; whole-table saves are rejected once it is stale
+        self.data_version = None
     
     def load_data(self):
-        """Load data from Excel file"""
+        """Load data from the storage backend, reusing the loaded tables until the data changes"""
         try:
-            # Ensure file exists with all required sheets
-            self.ensure_excel_file_exists()
-            
-            records = pd.read_excel(self.data_file, sheet_name='Records')
-            users = pd.read_excel(self.data_file, sheet_name='Users')
-            steps = pd.read_excel(self.data_file, sheet_name='Steps')
-            
-            # Load workflow status if exists
-            try:
-                workflow_status = pd.read_excel(self.data_file, sheet_name='Workflow_Status')
-            except:
-                # Create empty workflow status DataFrame if sheet doesn't exist
-                workflow_status = pd.DataFrame(columns=[
-                    'Unique_ID', 'Step_ID', 'Status', 'Assigned_To', 'Completed_By', 
-                    'Completed_Date', 'Comments', 'Attachment_Path'
-                ])
-                # Save the empty sheet
-                self.save_workflow_status_sheet(workflow_status)
-            
-            return records, users, steps, workflow_status
+            self.tables = self.storage.load()
+            self.data_version = self.storage.loaded_data_version
+            metrics = active_metrics()
+            if metrics is not None:
+                metrics.add_frames(SHEET_NAMES, self.tables)
+            return self.tables
         except Exception as e:
-            st.error(f"Error loading data: {e}")
-            st.info("Please try refreshing the page. If the error persists, delete the workflow_data.xlsx file and restart the application.")
+            self.notify('error', f"Error loading data: {e}")
+            self.notify('info', "Please try refreshing the page. If the error persists, delete the workflow_data.xlsx file and restart the application.")
             return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     
+    def workflow(self):
+        """Compiled WorkflowDefinition
+        
+        Read from workflow_config.json beside the data file and compiled once per version of
+        that file; without a config file (or if it is invalid) it is compiled from the Steps sheet.
+        """
+        try:
+            workflow = load_workflow_config(self.config_file)
+            if workflow is not None:
+                return workflow
+        except Exception as e:
+            self.notify('error', f"Error loading {self.config_file}: {e}. Using the Steps sheet instead.")
+        if self.tables is None:
+            self.load_data()
+        return self.storage.derived('workflow', build_workflow_from_steps, self.tables)
+    
+    def actionable_steps(self, role, action='update', open_only=True):
+        """Workflow status rows of every record whose step role may take action on
+        
+        One vectorized lookup of the permission matrix over the whole workflow status; with
+        open_only, completed steps are left out.
+        """
+        if self.tables is None:
+            self.load_data()
+        workflow_status = self.tables[3]
+        mask = self.workflow().permissions.step_mask(role, workflow_status['Step_ID'].to_numpy(), action)
+        if open_only:
+            mask &= (workflow_status['Status'] != 'Completed').to_numpy()
+        return workflow_status[mask]
+    
+    def status_index(self):
+        """(Unique_ID, Step_ID) index of the loaded workflow status, built once per data version"""
+        if self.tables is None:
+            self.load_data()
+        return self.storage.derived('status_index', build_status_index, self.tables)
+    
+    def record_facets(self):
+        """Client_Group/Legal_Entity/Solution facet index of the loaded records, built once per data version"""
+        if self.tables is None:
+            self.load_data()
+        return self.storage.derived('record_facets', build_facet_index, self.tables)
+    
+    def search_index(self):
+        """Full-text SearchIndex of records and step comments, built once per data version and updated in place by writes"""
+        if self.tables is None:
+            self.load_data()
+        index = self.status_index()
+        return self.storage.derived('search_index',
+                                    lambda frames: SearchIndex(frames[0], frames[3], index), self.tables)
+    
+    def status_summary(self):
+        """Per-record StatusSummary, built once per data version and updated in place by writes"""
+        index = self.status_index()
+        return self.storage.derived('status_summary',
+                                    lambda frames: StatusSummary(frames[3], index), self.tables)
+    
+    def assignee_index(self):
+        """AssigneeIndex of the open steps, built once per data version and updated in place by writes"""
+        index = self.status_index()
+        return self.storage.derived('assignee_index',
+                                    lambda frames: AssigneeIndex(frames[3], index), self.tables)
+    
+    def my_tasks(self, username):
+        """Open steps assigned to username with their record and step details, in O(number of tasks)"""
+        positions = self.assignee_index().get(username)
+        workflow = self.workflow()
+        record_positions = self.record_facets().positions
+        records, _, _, workflow_status = self.tables
+        tasks = workflow_status.iloc[positions][STATUS_KEY + ['Status']].astype({'Status': object})
+        tasks = tasks.reset_index(drop=True)
+        step_names = {step_id: step['Step_Name'] for step_id, step in workflow.step_by_id.items()}
+        tasks.insert(2, 'Step_Name', [step_names.get(step_id, "") for step_id in tasks['Step_ID'].tolist()])
+        # One facet lookup for all tasks: once another session has written, derived structures
+        # of this session's version are rebuilt on every call rather than cached
+        rows = np.array([record_positions.get(unique_id, -1) for unique_id in tasks['Unique_ID'].tolist()],
+                        dtype='int64')
+        found = (rows >= 0) & (rows < len(records))
+        for column in ['Client_Group', 'Legal_Entity', 'Solution']:
+            values = np.full(len(tasks), "", dtype=object)
+            values[found] = records[column].to_numpy(dtype=object)[rows[found]]
+            tasks[column] = values
+        return tasks
+    
+    def check_status_summary(self, rebuild=True):
+        """Compare the status summary with a full rebuild from the loaded workflow status
+        
+        Returns the Unique_IDs that disagreed; with rebuild they are corrected in place.
+        """
+        summary = self.status_summary()
+        mismatches = summary.mismatches(self.tables[3])
+        if mismatches and rebuild:
+            summary.rebuild(self.tables[3])
+        return mismatches
+    
+    def dashboard(self):
+        """Portfolio progress tables for the loaded data, computed once per data version"""
+        if self.tables is None:
+            self.load_data()
+        return self.storage.derived('dashboard', build_dashboard, self.tables)
+    
+    def get_record(self, unique_id, records):
+        """Return the row of records for unique_id, or None if there is no such record"""
+        position = self.record_facets().positions.get(unique_id)
+        if position is None or position >= len(records):
+            return None
+        return records.iloc[position]
+    
+    def get_step_statuses(self, unique_id, workflow_status):
+        """Return {Step_ID: status row as a dict} for one record using the status index"""
+        return self.status_index().step_rows(workflow_status, unique_id)
+    
+    def get_step_status(self, unique_id, step_id):
+        """Return the latest status row of one step as a dict, or None if it has none
+        
+        Reloads through the shared cache, so after this process's own writes it is a version
+        check and an index lookup rather than a reread of the data.
+        """
+        workflow_status = self.load_data()[3]
+        position = self.status_index().position(unique_id, step_id)
+        if position is None or position >= len(workflow_status):
+            return None
+        return workflow_status.iloc[position].to_dict()
+    
+    def save_table(self, sheet_name, frame, check_version=False, expected_table_version=None):
+        """Save a single table (Records, Users, Steps or Workflow_Status)
+        
+        The other tables are re-read under the write lock, so concurrent changes to them are kept.
+        With check_version the save is rejected if the data changed since load_data; with
+        expected_table_version, if the stored table no longer has that table_version.
+        """
+        try:
+            with self.storage.lock:
+                if expected_table_version is not None:
+                    stored = dict(zip(SHEET_NAMES, self.storage.load()))[sheet_name]
+                    if table_version(stored) != expected_table_version:
+                        raise StaleDataError(f"{sheet_name} was changed by another user since it was loaded")
+                self.storage.replace_table(sheet_name, frame,
+                                           expected_version=self.data_version if check_version else None)
+            return True
+        except StaleDataError:
+            self.notify('error', f"{sheet_name} was changed by another user since this page was loaded. "
+                                  "Your changes were not saved; please review and try again.")
+            return False
+        except Exception as e:
+            self.notify('error', f"Error saving {sheet_name}: {e}")
+            return False
+    
     def save_workflow_status_sheet(self, workflow_status):
         """Save only the workflow status sheet"""
+        return self.save_table('Workflow_Status', workflow_status, check_version=True)
+    
+    def save_data(self, records, users, steps, workflow_status):
+        """Save all four tables, rejecting the write if the data changed since load_data"""
         try:
-            # Load existing data
-            with pd.ExcelFile(self.data_file) as xls:
-                records = pd.read_excel(xls, sheet_name='Records')
-                users = pd.read_excel(xls, sheet_name='Users')
-                steps = pd.read_excel(xls, sheet_name='Steps')
-            
-            # Save all sheets including the new workflow status
-            with pd.ExcelWriter(self.data_file, engine='openpyxl') as writer:
-                records.to_excel(writer, sheet_name='Records', index=False)
-                users.to_excel(writer, sheet_name='Users', index=False)
-                steps.to_excel(writer, sheet_name='Steps', index=False)
-                workflow_status.to_excel(writer, sheet_name='Workflow_Status', index=False)
+            self.storage.save_all(records, users, steps, workflow_status, expected_version=self.data_version)
+            return True
+        except StaleDataError:
+            self.notify('error', "The data was changed by another user since this page was loaded. "
+                                  "Your changes were not saved; please review and try again.")
+            return False
         except Exception as e:
-            st.error(f"Error saving workflow status: {e}")
+            self.notify('error', f"Error saving data: {e}")
+            return False
     
-    def save_data(self, records, users, steps, workflow_status):
-        """Save data to Excel file"""
+    def save_step_updates(self, updates, changed_by=None):
+        """Persist step updates and append the Status/Assigned_To transitions they make to the event log
+        
+        Both happen under one hold of the storage's update lock, against the latest stored rows
+        of just the updated steps rather than this session's possibly older copy. Updates of steps that do not exist are
+        dropped; returns the updates that were saved.
+        """
+        with self.storage.update_lock:
+            states = self.storage.step_states([(update['Unique_ID'], update['Step_ID']) for update in updates])
+            updates = [update for update in updates if (update['Unique_ID'], update['Step_ID']) in states]
+            if updates:
+                events = step_transitions(states, updates, changed_by)
+                self.storage.update_status(updates)
+                self.events.append(events)
+        return updates
+    
+    def update_step(self, unique_id, step_id, changed_by=None, **changes):
+        """Save changed columns of one workflow step
+        
+        Only the given columns are applied to the latest stored row, so concurrent updates to
+        other steps or columns are merged rather than lost. The Excel backend journals the
+        change and returns once it is on disk; SQLite updates just that row.
+        """
         try:
-            with pd.ExcelWriter(self.data_file, engine='openpyxl') as writer:
-                records.to_excel(writer, sheet_name='Records', index=False)
-                users.to_excel(writer, sheet_name='Users', index=False)
-                steps.to_excel(writer, sheet_name='Steps', index=False)
-                workflow_status.to_excel(writer, sheet_name='Workflow_Status', index=False)
+            self.save_step_updates([dict(changes, Unique_ID=unique_id, Step_ID=step_id)], changed_by)
             return True
         except Exception as e:
-            st.error(f"Error saving data: {e}")
+            self.notify('error', f"Error saving data: {e}")
             return False
     
-    def get_next_unique_id(self, records):
-        """Generate next unique ID starting from 1000"""
-        if records.empty:
-            return 1000
-        return records['Unique_ID'].max() + 1
+    def update_steps(self, keys, role, changed_by=None, **changes):
+        """Apply the same column changes to many (Unique_ID, Step_ID) steps in one write
+        
+        Each step is validated against the permission matrix for every action its columns
+        need (see COLUMN_ACTIONS), in one vectorized lookup; unknown steps and steps role may
+        not change are skipped. The rest are saved as a single batch: one journal append for
+        Excel, one transaction for SQLite. Returns (updated keys, {rejected key: reason}).
+        """
+        keys = list(dict.fromkeys((int(unique_id), int(step_id)) for unique_id, step_id in keys))
+        unknown = set(changes) - set(COLUMN_ACTIONS)
+        if unknown:
+            raise ValueError(f"Unknown workflow status columns: {sorted(unknown)}")
+        permissions = self.workflow().permissions
+        step_ids = np.array([step_id for _, step_id in keys], dtype='int64')
+        allowed = np.ones(len(keys), dtype=bool)
+        for action in {COLUMN_ACTIONS[column] for column in changes}:
+            allowed &= permissions.step_mask(role, step_ids, action)
+        
+        permitted = [key for key, granted in zip(keys, allowed.tolist()) if granted]
+        rejected = {key: f"not permitted for role {role}" for key, granted in zip(keys, allowed.tolist())
+                    if not granted}
+        if not permitted or not changes:
+            return [], rejected
+        try:
+            saved = self.save_step_updates([dict(changes, Unique_ID=unique_id, Step_ID=step_id)
+                                            for unique_id, step_id in permitted], changed_by)
+        except Exception as e:
+            self.notify('error', f"Error saving data: {e}")
+            return [], rejected
+        updated = [(update['Unique_ID'], update['Step_ID']) for update in saved]
+        rejected.update((key, "step not found") for key in set(permitted) - set(updated))
+        return updated, rejected
     
-    def create_record(self, client_group, legal_entity, solution, created_by):
-        """Create a new workflow record"""
-        records, users, steps, workflow_status = self.load_data()
-        
-        new_id = self.get_next_unique_id(records)
-        new_record = pd.DataFrame({
-            'Unique_ID': [new_id],
-            'Client_Group': [client_group],
-            'Legal_Entity': [legal_entity],
-            'Solution': [solution],
-            'Created_Date': [datetime.now()],
-            'Created_By': [created_by]
+    def export_data(self, path, format=None, chunk_rows=TRANSFER_CHUNK_ROWS):
+        """Stream the four tables to an .xlsx workbook or a directory of CSV or Parquet files
+        
+        format ('xlsx', 'csv' or 'parquet') defaults to the one named by the extension of path.
+        Tables are read from storage and written chunk_rows rows at a time, so memory use does
+        not grow with the size of the portfolio. Returns {sheet name: rows written}.
+        """
+        return write_table_chunks(path, transfer_format(path, format), self.storage.iter_tables(chunk_rows))
+    
+    def import_data(self, source, created_by, chunk_rows=TRANSFER_CHUNK_ROWS):
+        """Add the records in source as new records, streaming chunk_rows rows at a time
+        
+        source is an .xlsx workbook with a Records and optionally a Workflow_Status sheet, a CSV
+        or Parquet file of records, or a directory as written by export_data. The whole source
+        is validated in a first pass that writes nothing; a second pass then hands the valid
+        rows to storage.import_rows chunk by chunk, each record chunk together with its
+        template steps, in one atomic write (one workbook rewrite for Excel, one transaction
+        for SQLite). Workflow_Status rows are matched to their records through the source
+        Unique_IDs and validated against the record's workflow template; template steps left
+        without a row start as Not Started. Between the passes only the valid-row masks, the
+        source-to-new ID mapping and the imported step keys are kept, a few bytes per row.
+        
+        Returns {'records': imported, 'steps': imported, 'rejected': rejected row count,
+        'rejections': [(sheet, row number, reason)] for the first IMPORT_REJECTION_LIMIT}.
+        """
+        workflow = self.workflow()
+        template_names = list(workflow.templates)
+        template_steps = [np.asarray(workflow.templates[name], dtype='int64') for name in template_names]
+        sources = import_sources(source)
+        def table_chunks(sheet_name):
+            return read_table_chunks(*sources[sheet_name], sheet_name, chunk_rows)
+        
+        # Check each table's columns before reading any further
+        with_steps = False
+        if 'Workflow_Status' in sources:
+            first_chunk = next(table_chunks('Workflow_Status'), None)
+            with_steps = first_chunk is not None
+            missing = [column for column in STATUS_KEY if with_steps and column not in first_chunk]
+            if missing:
+                raise ValueError(f"Workflow_Status in {source} is missing the columns {missing}")
+        first_chunk = next(table_chunks('Records'), None)
+        required = IMPORT_REQUIRED_COLUMNS['Records'] + (['Unique_ID'] if with_steps else [])
+        missing = [column for column in required if first_chunk is not None and column not in first_chunk]
+        if missing:
+            raise ValueError(f"Records in {source} is missing the columns {missing}")
+        
+        result = {'records': 0, 'steps': 0, 'rejected': 0, 'rejections': []}
+        def reject(sheet_name, failures):
+            result['rejected'] += len(failures)
+            room = IMPORT_REJECTION_LIMIT - len(result['rejections'])
+            result['rejections'].extend((sheet_name, row, reason) for row, reason in failures[:max(room, 0)])
+        def template_codes_of(solutions):
+            return solutions.map({solution: template_names.index(workflow.templates_for(solution)[0])
+                                  for solution in solutions.unique().tolist()}).to_numpy(dtype='int64')
+        
+        # First pass: validate everything. Records are numbered in import order; source
+        # Unique_ID -> that number and the template code are kept sorted on the source ID.
+        valid_records = []
+        source_ids = np.empty(0, dtype='int64')
+        numbers = np.empty(0, dtype='int64')
+        template_codes = np.empty(0, dtype='int64')
+        for chunk in table_chunks('Records'):
+            text = {column: import_text(chunk, column) for column in IMPORT_REQUIRED_COLUMNS['Records']}
+            _, bad_dates = import_dates(chunk, 'Created_Date')
+            checks = [((text[column] == '').to_numpy(), f"missing {column}")
+                      for column in IMPORT_REQUIRED_COLUMNS['Records']] + [(bad_dates, "invalid Created_Date")]
+            chunk_ids, is_id = import_integers(chunk, 'Unique_ID')
+            if with_steps:
+                checks.append((~is_id, "missing or invalid Unique_ID"))
+                # Only rows that are otherwise valid (and so get imported) count as duplicates
+                failed, _ = first_failures(chunk.index, checks)
+                checks.append((repeated_keys(~failed, chunk_ids, source_ids), "duplicate Unique_ID"))
+            failed, failures = first_failures(chunk.index, checks)
+            reject('Records', failures)
+            valid = ~failed
+            valid_records.append(valid)
+            if with_steps and valid.any():
+                order = np.argsort(chunk_ids[valid], kind='stable')
+                at = np.searchsorted(source_ids, chunk_ids[valid][order])
+                source_ids = np.insert(source_ids, at, chunk_ids[valid][order])
+                numbers = np.insert(numbers, at, np.arange(result['records'], result['records'] + valid.sum())[order])
+                template_codes = np.insert(template_codes, at, template_codes_of(text['Solution'][valid])[order])
+            result['records'] += int(valid.sum())
+        
+        def status_records(chunk):
+            """(record numbers, template codes, known mask) of the rows of a Workflow_Status chunk"""
+            chunk_ids, is_id = import_integers(chunk, 'Unique_ID')
+            at, known = sorted_lookup(source_ids, chunk_ids)
+            known &= is_id
+            if not len(source_ids):
+                return np.zeros(len(chunk), dtype='int64'), np.zeros(len(chunk), dtype='int64'), known
+            at = np.where(known, at, 0)
+            return np.where(known, numbers[at], 0), template_codes[at], known
+        
+        valid_status = []
+        step_keys = np.empty(0, dtype='int64')
+        for chunk in (table_chunks('Workflow_Status') if with_steps else ()):
+            _, is_id = import_integers(chunk, 'Unique_ID')
+            step_ids, is_step = import_integers(chunk, 'Step_ID')
+            row_numbers, row_codes, known = status_records(chunk)
+            in_template = np.zeros(len(chunk), dtype=bool)
+            for code, steps in enumerate(template_steps):
+                rows = known & (row_codes == code)
+                in_template[rows] = np.isin(step_ids[rows], steps)
+            keys = row_numbers * IMPORT_STEP_SPACE + step_ids
+            statuses = import_text(chunk, 'Status').replace('', 'Not Started')
+            _, bad_dates = import_dates(chunk, 'Completed_Date')
+            checks = [(~is_id, "missing or invalid Unique_ID"),
+                      (~known, "Unique_ID not among the imported Records"),
+                      (~is_step, "missing or invalid Step_ID"),
+                      (~in_template, "Step_ID not in the record's workflow template"),
+                      (~statuses.isin(STATUS_VALUES).to_numpy(), "unknown Status"),
+                      (bad_dates, "invalid Completed_Date")]
+            failed, _ = first_failures(chunk.index, checks)
+            checks.append((repeated_keys(~failed, keys, step_keys), "duplicate step"))
+            failed, failures = first_failures(chunk.index, checks)
+            reject('Workflow_Status', failures)
+            valid = ~failed
+            valid_status.append(valid)
+            added_keys = np.sort(keys[valid])
+            step_keys = np.insert(step_keys, np.searchsorted(step_keys, added_keys), added_keys)
+        if not result['records']:
+            return result
+        
+        # Second pass: build the valid rows again and write them all in one go
+        now = datetime.now()
+        events = []
+        def new_rows(first_id):
+            imported = 0
+            for chunk, valid in zip(table_chunks('Records'), valid_records):
+                if not valid.any():
+                    continue
+                text = {column: import_text(chunk, column)[valid].to_numpy()
+                        for column in ['Client_Group', 'Legal_Entity', 'Solution', 'Created_By']}
+                row_numbers = np.arange(imported, imported + valid.sum(), dtype='int64')
+                imported += len(row_numbers)
+                new_records = pd.DataFrame({'Unique_ID': first_id + row_numbers, 'Client_Group': text['Client_Group'],
+                                            'Legal_Entity': text['Legal_Entity'], 'Solution': text['Solution'],
+                                            'Created_Date': import_dates(chunk, 'Created_Date')[0][valid].fillna(now).to_numpy(),
+                                            'Created_By': np.where(text['Created_By'] == '', created_by, text['Created_By'])})
+                # Template steps the Workflow_Status table had no row for start as Not Started
+                new_status = self.template_status_rows(row_numbers, template_codes_of(new_records['Solution']),
+                                                       template_names)
+                keys = (new_status['Unique_ID'].to_numpy(dtype='int64') * IMPORT_STEP_SPACE
+                        + new_status['Step_ID'].to_numpy(dtype='int64'))
+                new_status = new_status[~sorted_lookup(step_keys, keys)[1]].reset_index(drop=True)
+                new_status['Unique_ID'] += first_id
+                result['steps'] += len(new_status)
+                events.append(self.imported_step_events(new_status, created_by, now))
+                yield new_records, new_status
+            for chunk, valid in zip(table_chunks('Workflow_Status') if with_steps else (), valid_status):
+                if not valid.any():
+                    continue
+                row_numbers = status_records(chunk)[0]
+                step_ids, _ = import_integers(chunk, 'Step_ID')
+                new_status = pd.DataFrame({'Unique_ID': first_id + row_numbers[valid], 'Step_ID': step_ids[valid],
+                                           'Status': import_text(chunk, 'Status').replace('', 'Not Started')[valid].to_numpy()})
+                for column in ['Assigned_To', 'Completed_By']:
+                    new_status[column] = import_text(chunk, column)[valid].to_numpy()
+                new_status['Completed_Date'] = import_dates(chunk, 'Completed_Date')[0][valid].to_numpy()
+                for column in ['Comments', 'Attachment_Path']:
+                    new_status[column] = import_text(chunk, column)[valid].to_numpy()
+                new_status = typed_workflow_status(new_status)
+                result['steps'] += len(new_status)
+                events.append(self.imported_step_events(new_status, created_by, now))
+                yield pd.DataFrame(columns=RECORD_COLUMNS), new_status
+        
+        # The write lock before the update lock, the order every rewrite takes them in; IDs
+        # are handed out under the update lock, so no session creates records meanwhile
+        with self.storage.lock, self.storage.update_lock:
+            self.storage.import_rows(new_rows(self.storage.next_unique_id()))
+            self.events.append(pd.concat(events, ignore_index=True))
+        return result
+    
+    def template_status_rows(self, unique_ids, template_codes, template_names):
+        """Not Started status rows for records given as Unique_IDs and the code of their template in template_names"""
+        templates = self.workflow().templates
+        return pd.concat([self.build_status_rows(unique_ids[template_codes == code], templates[template_names[code]])
+                          for code in np.unique(template_codes).tolist()], ignore_index=True)
+    
+    def imported_step_events(self, new_status, created_by, timestamp):
+        """Event log rows recording the starting Status and Assigned_To of imported steps
+        
+        Steps imported as Completed are logged at their Completed_Date, so historical completions
+        count in the weeks they happened; those without a date are not logged, as no week is known.
+        """
+        completed = (new_status['Status'] == 'Completed').to_numpy()
+        dated = new_status['Completed_Date'].notna().to_numpy()
+        new_status = new_status[~completed | dated]
+        events = new_status[['Unique_ID', 'Step_ID', 'Status', 'Assigned_To']].copy()
+        events.insert(0, 'Timestamp', new_status['Completed_Date'].where(new_status['Status'] == 'Completed',
+                                                                          pd.Timestamp(timestamp)))
+        events['Changed_By'] = created_by
+        return events
+    
+    def build_status_rows(self, unique_ids, step_ids):
+        """Build the 'Not Started' status rows for every step of each new record in one vectorized pass"""
+        step_ids = np.asarray(step_ids, dtype='int64')
+        new_statuses = pd.DataFrame({
+            'Unique_ID': np.repeat(np.asarray(unique_ids, dtype='int64'), len(step_ids)),
+            'Step_ID': np.tile(step_ids, len(unique_ids)),
         })
+        new_statuses['Status'] = 'Not Started'
+        for column in ['Assigned_To', 'Completed_By', 'Completed_Date', 'Comments', 'Attachment_Path']:
+            new_statuses[column] = ''
+        return typed_workflow_status(new_statuses)
+    
+    def create_records(self, entries, created_by, template=None):
+        """Create a workflow record for each (client_group, legal_entity, solution) tuple in a single write
         
-        records = pd.concat([records, new_record], ignore_index=True)
-        
-        # Initialize workflow status for all steps
-        for _, step in steps.iterrows():
-            new_status = pd.DataFrame({
-                'Unique_ID': [new_id],
-                'Step_ID': [step['Step_ID']],
-                'Status': ['Not Started'],
-                'Assigned_To': [''],
-                'Completed_By': [''],
-                'Completed_Date': [''],
-                'Comments': [''],
-                'Attachment_Path': ['']
-            })
-            workflow_status = pd.concat([workflow_status, new_status], ignore_index=True)
-        
-        if self.save_data(records, users, steps, workflow_status):
-            return new_id
-        return None
+        Each record gets the steps of the named workflow template, by default the preferred
+        template for its Solution. Returns the list of new Unique_IDs, or None if saving failed.
+        """
+        new_records = pd.DataFrame(list(entries), columns=['Client_Group', 'Legal_Entity', 'Solution'])
+        if new_records.empty:
+            return []
+        now = datetime.now()
+        new_records['Created_Date'] = now
+        new_records['Created_By'] = created_by
+        
+        try:
+            workflow = self.workflow()
+            templates = [template or workflow.templates_for(solution)[0] for solution in new_records['Solution']]
+            unknown = set(templates) - set(workflow.templates)
+            if unknown:
+                raise ValueError(f"Unknown workflow templates: {sorted(unknown)}")
+            
+            # IDs are assigned from the latest records while holding the update lock,
+            # so two sessions can never hand out the same Unique_ID
+            with self.storage.update_lock:
+                first_id = self.storage.next_unique_id()
+                new_ids = list(range(first_id, first_id + len(new_records)))
+                new_records.insert(0, 'Unique_ID', new_ids)
+                new_status = pd.concat(
+                    [self.build_status_rows([unique_id for unique_id, name in zip(new_ids, templates) if name == template_name],
+                                            workflow.templates[template_name])
+                     for template_name in dict.fromkeys(templates)], ignore_index=True)
+                self.storage.append_rows(new_records[RECORD_COLUMNS], new_status)
+                self.events.append([{'Timestamp': now, 'Unique_ID': unique_id, 'Step_ID': step_id,
+                                     'Status': 'Not Started', 'Assigned_To': None, 'Changed_By': created_by}
+                                    for unique_id, step_id in zip(new_status['Unique_ID'].tolist(),
+                                                                  new_status['Step_ID'].tolist())])
+            return new_ids
+        except Exception as e:
+            self.notify('error', f"Error saving data: {e}")
+            return None
+    
+    def create_record(self, client_group, legal_entity, solution, created_by, template=None):
+        """Create a new workflow record"""
+        new_ids = self.create_records([(client_group, legal_entity, solution)], created_by, template)
+        return new_ids[0] if new_ids else None
+
+def show_notice(level, message):
+    """WorkflowManager notify for the app: show the notice with st.error, st.warning, st.info or st.success"""
+    getattr(st, level)(message)
 
 def user_authentication():
     """Simple user authentication"""
     st.sidebar.header("👤 User Authentication")
     
-    wm = WorkflowManager()
+    wm = WorkflowManager(notify=show_notice)
     _, users, _, _ = wm.load_data()
     
     if users.empty:
@@ -290,7 +3165,7 @@ def record_management_page():
     st.markdown('<div class="main-header"><h1>📋 Workflow Management System</h1></div>', 
                 unsafe_allow_html=True)
     
-    wm = WorkflowManager()
+    wm = WorkflowManager(notify=show_notice)
     records, users, steps, workflow_status = wm.load_data()
     
     tab1, tab2 = st.tabs(["Create New Record", "Select Existing Record"])
@@ -306,11 +3181,12 @@ def record_management_page():
         
         with col2:
             legal_entity = st.text_input("Legal Entity*")
+            template = st.selectbox("Workflow Template", wm.workflow().templates_for(solution))
         
         if st.button("Create Record", type="primary"):
             if client_group and legal_entity and solution and st.session_state.current_user is not None:
                 new_id = wm.create_record(client_group, legal_entity, solution, 
-                                        st.session_state.current_user['Username'])
+                                        st.session_state.current_user['Username'], template)
                 if new_id:
                     st.success(f"Record created successfully! Unique ID: {new_id}")
                     st.rerun()
@@ -323,75 +3199,271 @@ def record_management_page():
         st.header("Select Workflow Record")
         
         if not records.empty:
+            facets = wm.record_facets()
+            query = st.text_input("Search", placeholder="Words or word beginnings from the client group, "
+                                  "legal entity, solution, ID or step comments").strip()
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                unique_ids = [""] + records['Unique_ID'].astype(str).tolist()
-                selected_id = st.selectbox("Unique ID", unique_ids)
+                # A free-text ID avoids shipping one selectbox option per record to the browser
+                selected_id = st.text_input("Unique ID").strip()
             
             with col2:
-                client_groups = [""] + sorted(records['Client_Group'].unique().tolist())
-                selected_client = st.selectbox("Client Group", client_groups)
+                selected_client = st.selectbox("Client Group", [""] + facets.clients)
             
             # Filter legal entities based on client group
             if selected_client:
-                filtered_entities = records[records['Client_Group'] == selected_client]['Legal_Entity'].unique()
-                legal_entities = [""] + sorted(filtered_entities.tolist())
+                legal_entities = [""] + facets.entities_by_client.get(selected_client, [])
             else:
-                legal_entities = [""] + sorted(records['Legal_Entity'].unique().tolist())
+                legal_entities = [""] + facets.entities
             
             with col3:
                 selected_entity = st.selectbox("Legal Entity", legal_entities)
             
             # Filter solutions based on client group and legal entity
-            filtered_records = records.copy()
-            if selected_client:
-                filtered_records = filtered_records[filtered_records['Client_Group'] == selected_client]
-            if selected_entity:
-                filtered_records = filtered_records[filtered_records['Legal_Entity'] == selected_entity]
-            
-            solutions = [""] + sorted(filtered_records['Solution'].unique().tolist())
+            if selected_client and selected_entity:
+                solutions = facets.solutions_by_client_entity.get((selected_client, selected_entity), [])
+            elif selected_client:
+                solutions = facets.solutions_by_client.get(selected_client, [])
+            elif selected_entity:
+                solutions = facets.solutions_by_entity.get(selected_entity, [])
+            else:
+                solutions = facets.solutions
             
             with col4:
-                selected_solution = st.selectbox("Solution", solutions)
+                selected_solution = st.selectbox("Solution", [""] + solutions)
             
-            # Find matching records
-            search_records = records.copy()
-            
-            if selected_id:
-                search_records = search_records[search_records['Unique_ID'].astype(str) == selected_id]
-            if selected_client:
-                search_records = search_records[search_records['Client_Group'] == selected_client]
-            if selected_entity:
-                search_records = search_records[search_records['Legal_Entity'] == selected_entity]
-            if selected_solution:
-                search_records = search_records[search_records['Solution'] == selected_solution]
+            # Find matching records through the facet index rather than scanning the records
+            filtered = selected_client or selected_entity or selected_solution
+            if filtered or selected_id or query:
+                matching_ids = facets.match(selected_client, selected_entity, selected_solution) if filtered else None
+                if selected_id:
+                    unique_id = int(selected_id) if selected_id.isdigit() else None
+                    candidates = set(matching_ids) if matching_ids is not None else facets.positions
+                    matching_ids = [unique_id] if unique_id in candidates else []
+                if query:
+                    # Search results keep their ranking; the other filters only narrow them
+                    ranked = wm.search_index().search(query)
+                    if matching_ids is not None:
+                        candidates = set(matching_ids)
+                        ranked = [unique_id for unique_id in ranked if unique_id in candidates]
+                    positions = [facets.positions[unique_id] for unique_id in ranked]
+                else:
+                    positions = sorted(facets.positions[unique_id] for unique_id in matching_ids)
+                matches = [position for position in positions if position < len(records)]
+            else:
+                matches = range(len(records))
             
-            if not search_records.empty:
+            if len(matches):
                 st.subheader("Matching Records")
-                for _, record in search_records.iterrows():
+                
+                page_col, size_col = st.columns([3, 1])
+                with size_col:
+                    page_size = st.selectbox("Records per page", RECORD_PAGE_SIZES,
+                                             index=RECORD_PAGE_SIZES.index(DEFAULT_RECORD_PAGE_SIZE))
+                page_count = (len(matches) + page_size - 1) // page_size
+                with page_col:
+                    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count,
+                                           value=1, step=1)
+                
+                first = (page - 1) * page_size
+                st.caption(f"Showing {first + 1}-{min(first + page_size, len(matches))} of {len(matches)} records")
+                
+                # Only the current page is materialized and rendered as widgets
+                summary = wm.status_summary()
+                for record in records.iloc[matches[first:first + page_size]].to_dict('records'):
+                    counts = summary.get(record['Unique_ID'])
+                    progress = f" | Completed: {counts['Completed']}/{sum(counts[status] for status in STATUS_VALUES)} steps" if counts else ""
                     col_a, col_b = st.columns([3, 1])
                     with col_a:
-                        st.info(f"ID: {record['Unique_ID']} | Client: {record['Client_Group']} | Entity: {record['Legal_Entity']} | Solution: {record['Solution']}")
+                        st.info(f"ID: {record['Unique_ID']} | Client: {record['Client_Group']} | Entity: {record['Legal_Entity']} | Solution: {record['Solution']}{progress}")
                     with col_b:
                         if st.button(f"Select {record['Unique_ID']}", key=f"select_{record['Unique_ID']}"):
                             st.session_state.selected_record = record['Unique_ID']
                             st.success(f"Selected record {record['Unique_ID']}")
                             st.rerun()
+            else:
+                st.info("No records match the selected filters.")
         else:
             st.info("No records found. Create a new record to get started.")
 
+def step_card_html(step, step_status):
+    """Read-only HTML card for one workflow step"""
+    status = step_status['Status']
+    assigned_to = step_status['Assigned_To']
+    completed_by = step_status['Completed_By']
+    completed_date = step_status['Completed_Date']
+    
+    # Determine step styling
+    if status == 'Completed':
+        step_class = "step-completed"
+        status_icon = "✅"
+    elif status == 'In Progress':
+        step_class = "workflow-step"
+        status_icon = "🔄"
+    else:
+        step_class = "step-not-started"
+        status_icon = "⏳"
+    
+    return f'''
+    <div class="{step_class}">
+        <div class="step-header">{status_icon} Step {step['Step_ID']}: {html.escape(str(step['Step_Name']))}</div>
+        <div style="font-size: 0.9em; font-color: #000000; margin: 5px 0;">
+            <strong>Status:</strong> {status} | 
+            <strong>Required Role:</strong> <span class="role-badge role-{step['Required_Role'].lower()}">{step['Required_Role']}</span>
+            {f" | <strong>Assigned to:</strong> {html.escape(str(assigned_to))}" if pd.notna(assigned_to) and assigned_to else ""}
+            {f" | <strong>Completed by:</strong> {html.escape(str(completed_by))} on {completed_date}" if pd.notna(completed_by) and completed_by else ""}
+        </div>
+    </div>
+    '''
+
+# Step widget callbacks run before the rerun their click triggers, which inside step_section
+# is a rerun of that fragment only, so the step is redrawn from the saved data without st.rerun
+
+def current_role():
+    return st.session_state.current_user['Role'] if st.session_state.current_user is not None else None
+
+def current_username():
+    return st.session_state.current_user['Username'] if st.session_state.current_user is not None else None
+
+def update_step_from_widgets(wm, step_id):
+    """Save the Assign to / Status selection of one step"""
+    if not wm.workflow().permissions.allows(current_role(), step_id, 'update'):
+        return
+    changes = {'Status': st.session_state[f"status_{step_id}"],
+               'Assigned_To': st.session_state[f"assign_{step_id}"]}
+    
+    if changes['Status'] == 'Completed' and st.session_state.current_user is not None:
+        changes['Completed_By'] = st.session_state.current_user['Username']
+        changes['Completed_Date'] = datetime.now()
+    
+    if wm.update_step(st.session_state.selected_record, step_id,
+                      changed_by=current_username(), **changes):
+        st.session_state[f"step_notice_{step_id}"] = f"Step {step_id} updated!"
+
+def toggle_step_comments(step_id):
+    st.session_state[f"show_comments_{step_id}"] = not st.session_state.get(f"show_comments_{step_id}", False)
+
+def save_step_comment(wm, step_id):
+    if not wm.workflow().permissions.allows(current_role(), step_id, 'comment'):
+        return
+    if wm.update_step(st.session_state.selected_record, step_id,
+                      Comments=st.session_state[f"comment_text_{step_id}"]):
+        st.session_state[f"step_notice_{step_id}"] = "Comment saved!"
+
+def save_step_attachment(wm, step_id):
+    uploaded_file = st.session_state.get(f"upload_{step_id}")
+    if uploaded_file is None or not wm.workflow().permissions.allows(current_role(), step_id, 'attach'):
+        return
+    new_path = wm.attachments.save(uploaded_file, uploaded_file.name)
+    if wm.update_step(st.session_state.selected_record, step_id, Attachment_Path=new_path):
+        st.session_state[f"step_notice_{step_id}"] = "Attachment saved!"
+
+def step_controls(wm, record, step, step_status, usernames):
+    """Edit widgets for one workflow step: assignment, status, comments and attachments"""
+    status = step_status['Status']
+    assigned_to = step_status['Assigned_To']
+    comments = step_status['Comments']
+    permissions = wm.workflow().permissions
+    role = current_role()
+    
+    notice = st.session_state.pop(f"step_notice_{step['Step_ID']}", None)
+    if notice:
+        st.success(notice)
+    
+    # Step management controls
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+    
+    with col1:
+        st.selectbox(f"Assign to", 
+                     [""] + usernames,
+                     key=f"assign_{step['Step_ID']}",
+                     index=usernames.index(assigned_to) + 1 if assigned_to in usernames else 0)
+    
+    with col2:
+        st.selectbox(f"Status", 
+                     STATUS_VALUES,
+                     key=f"status_{step['Step_ID']}",
+                     index=STATUS_VALUES.index(status) if status in STATUS_VALUES else 0)
+    
+    with col3:
+        # Check if current user can complete this step
+        if permissions.allows(role, step['Step_ID'], 'update'):
+            st.button(f"Update", key=f"update_{step['Step_ID']}", use_container_width=True,
+                      on_click=update_step_from_widgets, args=(wm, step['Step_ID']))
+        else:
+            st.warning(f"Only {' or '.join(sorted(step['Allowed_Roles']))} can complete")
+    
+    with col4:
+        # Comments button
+        st.button(f"💬", key=f"comment_{step['Step_ID']}", help="Comments", use_container_width=True,
+                  on_click=toggle_step_comments, args=(step['Step_ID'],),
+                  disabled=not permissions.allows(role, step['Step_ID'], 'comment'))
+    
+    # Comments section
+    if st.session_state.get(f"show_comments_{step['Step_ID']}", False) and permissions.allows(role, step['Step_ID'], 'comment'):
+        with st.expander(f"Comments for Step {step['Step_ID']}", expanded=True):
+            st.text_area(f"Add your comments:", 
+                         value=comments if pd.notna(comments) else "",
+                         key=f"comment_text_{step['Step_ID']}",
+                         height=100)
+            
+            st.button(f"Save Comment", key=f"save_comment_{step['Step_ID']}", type="primary",
+                      on_click=save_step_comment, args=(wm, step['Step_ID']))
+    
+    # File upload for steps requiring attachments
+    if step['Attachment_Required']:
+        with st.expander(f"📎 Attachment Required for Step {step['Step_ID']}", expanded=False):
+            attachment_path = step_status['Attachment_Path']
+            if wm.attachments.exists(attachment_path) and wm.attachments.size(attachment_path) > ATTACHMENT_DOWNLOAD_LIMIT:
+                st.info(f"The attachment ({megabytes(wm.attachments.size(attachment_path))}) is too large to download "
+                        f"here; it is stored at {attachment_path}.")
+            elif wm.attachments.exists(attachment_path):
+                # Deferred: the file is only read from disk when the button is clicked
+                st.download_button("Download attachment",
+                                   data=lambda path=attachment_path: wm.attachments.read(path),
+                                   file_name=f"{record['Unique_ID']}_step{step['Step_ID']}"
+                                             f"{os.path.splitext(attachment_path)[1]}",
+                                   key=f"download_{step['Step_ID']}")
+            elif isinstance(attachment_path, str) and attachment_path:
+                st.warning(f"Attachment file {attachment_path} is missing.")
+            
+            if permissions.allows(role, step['Step_ID'], 'attach'):
+                uploaded_file = st.file_uploader(f"Upload attachment", 
+                                               key=f"upload_{step['Step_ID']}")
+                if uploaded_file:
+                    st.button("Save attachment", key=f"save_attachment_{step['Step_ID']}",
+                              on_click=save_step_attachment, args=(wm, step['Step_ID']))
+
+@st.fragment
+def step_section(wm, record, step, usernames):
+    """Card and edit widgets of one step
+    
+    Runs as a fragment: clicking one of its widgets re-executes only this function, which
+    rereads just this step's row from the cached tables instead of rerunning the whole page
+    and rebuilding every other step.
+    """
+    step_status = wm.get_step_status(st.session_state.selected_record, step['Step_ID'])
+    if step_status is None:
+        st.warning(f"Step {step['Step_ID']} no longer exists for this record.")
+        return
+    st.markdown(step_card_html(step, step_status), unsafe_allow_html=True)
+    step_controls(wm, record, step, step_status, usernames)
+
 def workflow_page():
     """Page for managing workflow steps"""
     if not st.session_state.selected_record:
         st.warning("Please select a record first from the Record Management page.")
         return
     
-    wm = WorkflowManager()
+    wm = WorkflowManager(notify=show_notice)
     records, users, steps, workflow_status = wm.load_data()
     
     # Get record details
-    record = records[records['Unique_ID'] == st.session_state.selected_record].iloc[0]
+    record = wm.get_record(st.session_state.selected_record, records)
+    if record is None:
+        st.warning("The selected record no longer exists. Please select another record.")
+        return
     
     st.markdown('<div class="main-header"><h1>🔄 Workflow Management</h1></div>', 
                 unsafe_allow_html=True)
@@ -414,174 +3486,481 @@ def workflow_page():
     # Workflow steps
     st.subheader("Workflow Steps")
     
-    current_workflow = workflow_status[workflow_status['Unique_ID'] == st.session_state.selected_record]
+    step_statuses = wm.get_step_statuses(st.session_state.selected_record, workflow_status)
+    usernames = users['Username'].tolist()
     
-    # Group steps by header
-    grouped_steps = {}
-    for _, step in steps.iterrows():
-        header = step['Header']
-        if header not in grouped_steps:
-            grouped_steps[header] = []
-        grouped_steps[header].append(step)
+    # Header grouping is precomputed by the workflow definition
+    grouped_steps = dict(wm.workflow().grouped_steps(step_statuses))
     
-    for header, header_steps in grouped_steps.items():
-        st.markdown(f"### {header}")
+    # Defaulted through session state so my_tasks_page can switch it on before navigating here
+    st.session_state.setdefault('compact_steps', True)
+    compact = st.toggle("Compact view", key="compact_steps",
+                        help="Show the step cards as one block and edit one step at a time")
+    
+    if compact:
+        # All read-only cards go out in as few markdown elements as possible; only the step
+        # being edited gets widgets, rendered with its card in a step_section fragment
+        editable = [step for header_steps in grouped_steps.values() for step in header_steps]
+        names = {step['Step_ID']: f"Step {step['Step_ID']}: {step['Step_Name']}" for step in editable}
+        editing = st.selectbox("Edit step", [None] + list(names), key="edit_step",
+                               format_func=lambda step_id: "None" if step_id is None else names[step_id])
         
-        for step in header_steps:
-            step_status = current_workflow[current_workflow['Step_ID'] == step['Step_ID']]
-            
-            if not step_status.empty:
-                status = step_status.iloc[0]['Status']
-                assigned_to = step_status.iloc[0]['Assigned_To']
-                completed_by = step_status.iloc[0]['Completed_By']
-                completed_date = step_status.iloc[0]['Completed_Date']
-                comments = step_status.iloc[0]['Comments']
-                
-                # Determine step styling
-                if status == 'Completed':
-                    step_class = "step-completed"
-                    status_icon = "✅"
-                elif status == 'In Progress':
-                    step_class = "workflow-step"
-                    status_icon = "🔄"
+        cards = []
+        for header, header_steps in grouped_steps.items():
+            cards.append(f"<h3>{html.escape(str(header))}</h3>")
+            for step in header_steps:
+                if step['Step_ID'] == editing:
+                    st.markdown("".join(cards), unsafe_allow_html=True)
+                    cards = []
+                    step_section(wm, record, step, usernames)
                 else:
-                    step_class = "step-not-started"
-                    status_icon = "⏳"
-                
-                st.markdown(f'''
-                <div class="{step_class}">
-                    <div class="step-header">{status_icon} Step {step['Step_ID']}: {step['Step_Name']}</div>
-                    <div style="font-size: 0.9em; font-color: #000000; margin: 5px 0;">
-                        <strong>Status:</strong> {status} | 
-                        <strong>Required Role:</strong> <span class="role-badge role-{step['Required_Role'].lower()}">{step['Required_Role']}</span>
-                        {f" | <strong>Assigned to:</strong> {assigned_to}" if assigned_to else ""}
-                        {f" | <strong>Completed by:</strong> {completed_by} on {completed_date}" if completed_by else ""}
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                # Step management controls
-                col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-                
-                with col1:
-                    new_assigned = st.selectbox(f"Assign to", 
-                                              [""] + users['Username'].tolist(),
-                                              key=f"assign_{step['Step_ID']}",
-                                              index=users['Username'].tolist().index(assigned_to) + 1 if assigned_to in users['Username'].tolist() else 0)
-                
-                with col2:
-                    new_status = st.selectbox(f"Status", 
-                                            ["Not Started", "In Progress", "Completed"],
-                                            key=f"status_{step['Step_ID']}",
-                                            index=["Not Started", "In Progress", "Completed"].index(status))
-                
-                with col3:
-                    # Check if current user can complete this step
-                    can_complete = True
-                    if step['Required_Role'] != 'Any' and st.session_state.current_user is not None:
-                        user_role = st.session_state.current_user['Role']
-                        required_role = step['Required_Role']
-                        
-                        if required_role == 'Manager' and user_role not in ['Manager', 'Lead']:
-                            can_complete = False
-                        elif required_role == 'Lead' and user_role != 'Lead':
-                            can_complete = False
-                    
-                    if can_complete:
-                        if st.button(f"Update", key=f"update_{step['Step_ID']}", use_container_width=True):
-                            # Update workflow status
-                            mask = (workflow_status['Unique_ID'] == st.session_state.selected_record) & \
-                                   (workflow_status['Step_ID'] == step['Step_ID'])
-                            
-                            workflow_status.loc[mask, 'Status'] = new_status
-                            workflow_status.loc[mask, 'Assigned_To'] = new_assigned
-                            
-                            if new_status == 'Completed' and st.session_state.current_user is not None:
-                                workflow_status.loc[mask, 'Completed_By'] = st.session_state.current_user['Username']
-                                workflow_status.loc[mask, 'Completed_Date'] = datetime.now()
-                            
-                            if wm.save_data(records, users, steps, workflow_status):
-                                st.success(f"Step {step['Step_ID']} updated!")
-                                st.rerun()
-                    else:
-                        st.warning(f"Only {step['Required_Role']} can complete")
-                
-                with col4:
-                    # Comments button
-                    if st.button(f"💬", key=f"comment_{step['Step_ID']}", help="Comments", use_container_width=True):
-                        st.session_state[f"show_comments_{step['Step_ID']}"] = not st.session_state.get(f"show_comments_{step['Step_ID']}", False)
-                
-                # Comments section
-                if st.session_state.get(f"show_comments_{step['Step_ID']}", False):
-                    with st.expander(f"Comments for Step {step['Step_ID']}", expanded=True):
-                        new_comment = st.text_area(f"Add your comments:", 
-                                                 value=comments if pd.notna(comments) else "",
-                                                 key=f"comment_text_{step['Step_ID']}",
-                                                 height=100)
-                        
-                        if st.button(f"Save Comment", key=f"save_comment_{step['Step_ID']}", type="primary"):
-                            mask = (workflow_status['Unique_ID'] == st.session_state.selected_record) & \
-                                   (workflow_status['Step_ID'] == step['Step_ID'])
-                            workflow_status.loc[mask, 'Comments'] = new_comment
-                            
-                            if wm.save_data(records, users, steps, workflow_status):
-                                st.success("Comment saved!")
-                                st.rerun()
-                
-                # File upload for steps requiring attachments
-                if step['Attachment_Required']:
-                    with st.expander(f"📎 Attachment Required for Step {step['Step_ID']}", expanded=False):
-                        uploaded_file = st.file_uploader(f"Upload attachment", 
-                                                       key=f"upload_{step['Step_ID']}")
-                        if uploaded_file:
-                            # In a real implementation, you'd save the file and store the path
-                            st.info("File upload functionality would be implemented here")
+                    cards.append(step_card_html(step, step_statuses[step['Step_ID']]))
+        if cards:
+            st.markdown("".join(cards), unsafe_allow_html=True)
+    else:
+        for header, header_steps in grouped_steps.items():
+            st.markdown(f"### {header}")
+            
+            for step in header_steps:
+                step_section(wm, record, step, usernames)
                 
                 # Add some spacing between steps
                 st.markdown("---")
 
+def open_task(unique_id, step_id):
+    """Open a task from the inbox: select its record and step and switch to the Workflow page"""
+    st.session_state.selected_record = unique_id
+    st.session_state.compact_steps = True
+    st.session_state.edit_step = step_id
+    st.session_state.page = "Workflow"
+
+def my_tasks_page():
+    """Inbox of the open steps assigned to the logged-in user"""
+    st.markdown('<div class="main-header"><h1>📥 My Tasks</h1></div>', 
+                unsafe_allow_html=True)
+    
+    wm = WorkflowManager(notify=show_notice)
+    wm.load_data()
+    tasks = wm.my_tasks(st.session_state.current_user['Username'])
+    
+    if tasks.empty:
+        st.info("No open steps are assigned to you.")
+        return
+    
+    st.caption(f"{len(tasks)} open steps assigned to you")
+    st.dataframe(tasks, use_container_width=True, hide_index=True)
+    
+    labels = {(task['Unique_ID'], task['Step_ID']): f"{task['Unique_ID']} | Step {task['Step_ID']}: {task['Step_Name']}"
+              for task in tasks.to_dict('records')}
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        task = st.selectbox("Task", list(labels), format_func=labels.get)
+    with col2:
+        st.button("Open in Workflow", type="primary", use_container_width=True,
+                  on_click=open_task, args=task)
+
+# Most step rows the bulk update table shows for selection
+BULK_ROW_LIMIT = 1000
+UNCHANGED = "(unchanged)"
+UNASSIGNED = "(unassigned)"
+
+def apply_bulk_update(wm, shown_keys, matching_keys):
+    """Apply the bulk update form to the selected (or all matching) steps in one write"""
+    if st.session_state.bulk_scope == "All matching steps":
+        keys = matching_keys
+    else:
+        keys = [shown_keys[row] for row in st.session_state[f"bulk_table_{st.session_state.bulk_table_version}"].selection.rows]
+    
+    changes = {}
+    if st.session_state.bulk_action == "Comment":
+        if st.session_state.bulk_comment:
+            changes['Comments'] = st.session_state.bulk_comment
+    else:
+        if st.session_state.bulk_status != UNCHANGED:
+            changes['Status'] = st.session_state.bulk_status
+            if changes['Status'] == 'Completed':
+                changes['Completed_By'] = st.session_state.current_user['Username']
+                changes['Completed_Date'] = datetime.now()
+        if st.session_state.bulk_assign != UNCHANGED:
+            changes['Assigned_To'] = "" if st.session_state.bulk_assign == UNASSIGNED else st.session_state.bulk_assign
+    
+    if not keys or not changes:
+        st.session_state.bulk_notices = [("warning", "Select at least one step and a change to apply.")]
+        return
+    updated, rejected = wm.update_steps(keys, current_role(),
+                                        changed_by=current_username(), **changes)
+    notices = []
+    if updated:
+        notices.append(("success", f"Updated {len(updated)} steps."))
+    if rejected:
+        examples = ", ".join(f"{unique_id}/{step_id} ({reason})"
+                             for (unique_id, step_id), reason in list(rejected.items())[:5])
+        notices.append(("warning", f"Skipped {len(rejected)} steps: {examples}"))
+    st.session_state.bulk_notices = notices
+    # A fresh table key clears the row selection
+    st.session_state.bulk_table_version += 1
+
+def bulk_update_page():
+    """Apply one status, assignee or comment change to many workflow steps at once"""
+    st.markdown('<div class="main-header"><h1>🗂️ Bulk Update</h1></div>', 
+                unsafe_allow_html=True)
+    
+    wm = WorkflowManager(notify=show_notice)
+    records, users, _, _ = wm.load_data()
+    workflow = wm.workflow()
+    st.session_state.setdefault('bulk_table_version', 0)
+    
+    for kind, message in st.session_state.pop('bulk_notices', []):
+        getattr(st, kind)(message)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        action = st.radio("Change", ["Status / assignee", "Comment"], horizontal=True, key="bulk_action")
+    with col2:
+        open_only = st.checkbox("Only open steps", value=True, key="bulk_open_only")
+    
+    candidates = wm.actionable_steps(current_role(), 'comment' if action == "Comment" else 'update', open_only)
+    if candidates.empty:
+        st.info("There are no steps you can change.")
+        return
+    
+    def step_label(step_id):
+        step = workflow.step_by_id.get(step_id)
+        return f"{step_id}: {step['Step_Name']}" if step is not None else str(step_id)
+    
+    facets = wm.record_facets()
+    col1, col2 = st.columns(2)
+    with col1:
+        step_ids = st.multiselect("Steps", sorted(candidates['Step_ID'].unique().tolist()),
+                                  format_func=step_label, key="bulk_steps")
+    with col2:
+        client = st.selectbox("Client Group", ["All"] + facets.clients, key="bulk_client")
+    
+    if not step_ids:
+        st.info("Select one or more steps.")
+        return
+    
+    rows = candidates[candidates['Step_ID'].isin(step_ids)]
+    if client != "All":
+        rows = rows[rows['Unique_ID'].isin(facets.match(client=client))]
+    if rows.empty:
+        st.info("No matching steps.")
+        return
+    
+    matching_keys = list(zip(rows['Unique_ID'].tolist(), rows['Step_ID'].tolist()))
+    shown = rows.head(BULK_ROW_LIMIT)[STATUS_KEY + ['Status', 'Assigned_To', 'Comments']].merge(
+        records[['Unique_ID', 'Client_Group', 'Legal_Entity', 'Solution']], on='Unique_ID', how='left')
+    
+    st.caption(f"{len(rows)} matching steps" +
+               (f"; the first {BULK_ROW_LIMIT} are shown" if len(rows) > BULK_ROW_LIMIT else ""))
+    st.dataframe(shown, use_container_width=True, hide_index=True, on_select="rerun",
+                 selection_mode="multi-row", key=f"bulk_table_{st.session_state.bulk_table_version}")
+    
+    col1, col2, col3 = st.columns(3)
+    if action == "Comment":
+        with col1:
+            st.text_area("Comment", key="bulk_comment", height=100)
+    else:
+        usernames = users['Username'].tolist()
+        with col1:
+            st.selectbox("Set status", [UNCHANGED] + STATUS_VALUES, key="bulk_status")
+        with col2:
+            st.selectbox("Assign to", [UNCHANGED, UNASSIGNED] + usernames, key="bulk_assign")
+    with col3:
+        st.radio("Apply to", ["Selected rows", "All matching steps"], key="bulk_scope")
+    
+    st.button("Apply", type="primary", on_click=apply_bulk_update,
+              args=(wm, list(zip(shown['Unique_ID'].tolist(), shown['Step_ID'].tolist())), matching_keys))
+
+# Most per-record rows the dashboard sends to the browser on one rerun
+DASHBOARD_RECORD_LIMIT = 1000
+
+def dashboard_page():
+    """Portfolio progress across all records"""
+    st.markdown('<div class="main-header"><h1>📊 Portfolio Dashboard</h1></div>', 
+                unsafe_allow_html=True)
+    
+    wm = WorkflowManager(notify=show_notice)
+    records, users, steps, workflow_status = wm.load_data()
+    if records.empty:
+        st.info("No records found. Create one on the Record Management page.")
+        return
+    dashboard = wm.dashboard()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Records", dashboard.total_records)
+    col2.metric("Completed Records", dashboard.completed_records)
+    col3.metric("Open Steps", dashboard.open_steps)
+    col4.metric("Steps Completed", f"{dashboard.completion}%")
+    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Step Bottlenecks", "Open Work by Assignee", "Client Groups", "Records",
+                                            "Step History"])
+    
+    with tab1:
+        st.bar_chart(dashboard.bottlenecks.set_index('Step_Name')[['Not Started', 'In Progress']])
+        st.dataframe(dashboard.bottlenecks, use_container_width=True)
+    
+    with tab2:
+        st.dataframe(dashboard.assignees, use_container_width=True)
+    
+    with tab3:
+        st.dataframe(dashboard.client_groups, use_container_width=True)
+    
+    with tab4:
+        least_complete = dashboard.records.nsmallest(DASHBOARD_RECORD_LIMIT, 'Completion %')
+        if dashboard.total_records > DASHBOARD_RECORD_LIMIT:
+            st.caption(f"Showing the {DASHBOARD_RECORD_LIMIT} least complete of {dashboard.total_records} records")
+        st.dataframe(least_complete, use_container_width=True)
+    
+    with tab5:
+        weeks = st.selectbox("Period", [4, 12, 26, 52], index=1, format_func=lambda weeks: f"Last {weeks} weeks",
+                             key="history_weeks")
+        # The event log is only read on request; it grows with every step transition
+        if st.toggle("Load step history", key="load_history"):
+            start = pd.Timestamp.now().normalize() - pd.Timedelta(weeks=weeks)
+            throughput = wm.events.weekly_throughput(start)
+            time_in_step = wm.events.time_in_step(start)
+            if throughput.empty:
+                st.info("No step completions were logged in this period.")
+            else:
+                st.subheader("Steps Completed per Week")
+                st.bar_chart(throughput)
+                st.subheader("Mean Hours in Step, Completed Steps")
+                st.caption("Steps with no logged event before their completion (e.g. created before the "
+                           "event log existed) are not measured.")
+                step_names = {step_id: step['Step_Name'] for step_id, step in wm.workflow().step_by_id.items()}
+                time_in_step.insert(0, 'Step_Name', time_in_step.index.map(step_names))
+                st.dataframe(time_in_step, use_container_width=True)
+
+def metrics_forced():
+    """Whether the environment turns instrumentation on for every session"""
+    return os.environ.get(METRICS_ENV, '').lower() in ('1', 'true', 'yes') or bool(os.environ.get(METRICS_LOG_ENV))
+
+def metrics_enabled():
+    """Whether reruns of this session are instrumented, by the environment or by an admin for their own session"""
+    return metrics_forced() or st.session_state.get('metrics_enabled', False)
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_log(path):
+    """Logger appending one JSON line per instrumented rerun to path, rotated at METRICS_LOG_BYTES"""
+    metrics_log = logging.getLogger(f"{__name__}.metrics")
+    metrics_log.setLevel(logging.INFO)
+    metrics_log.propagate = False
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=METRICS_LOG_BYTES,
+                                                   backupCount=METRICS_LOG_BACKUPS, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    metrics_log.addHandler(handler)
+    return metrics_log
+
+@contextmanager
+def instrument_rerun():
+    """Collect RerunMetrics for the body if instrumentation is enabled, else run it untouched
+    
+    The finished metrics go to the session's history shown in the Admin Console and, with
+    WORKFLOW_METRICS_LOG, to the metrics log. Fragment reruns are not instrumented.
+    """
+    if not metrics_enabled():
+        yield None
+        return
+    count_elements()
+    metrics = RerunMetrics()
+    _active_metrics.rerun = metrics
+    start = time.perf_counter()
+    metrics.outcome = 'completed'
+    try:
+        yield metrics
+    except BaseException as e:
+        # st.rerun and st.stop end a rerun by raising too
+        metrics.outcome = type(e).__name__
+        raise
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        _active_metrics.rerun = None
+        metrics.page = st.session_state.get('page')
+        metrics.user = current_username()
+        summary = metrics.as_dict()
+        history = st.session_state.get('rerun_metrics', [])
+        st.session_state['rerun_metrics'] = history[-(METRICS_HISTORY - 1):] + [summary]
+        log_path = os.environ.get(METRICS_LOG_ENV)
+        if log_path:
+            get_metrics_log(os.path.abspath(log_path)).info(json.dumps(summary, default=str))
+
+def toggle_metrics():
+    # Kept outside the widget key, whose state is dropped on pages that do not show the toggle
+    st.session_state.metrics_enabled = st.session_state.metrics_toggle
+
+def megabytes(nbytes):
+    return f"{nbytes / 2 ** 20:.2f} MB"
+
+def metrics_panel():
+    """Admin Console view of the instrumented reruns of this session"""
+    if metrics_forced():
+        st.info(f"Every session is instrumented ({METRICS_ENV} / {METRICS_LOG_ENV} is set).")
+    else:
+        st.toggle("Instrument my reruns", value=st.session_state.get('metrics_enabled', False),
+                  key="metrics_toggle", on_change=toggle_metrics,
+                  help="Times WorkflowManager calls and counts storage I/O and elements of each rerun of this "
+                       "session. Set WORKFLOW_METRICS=1 to instrument every session.")
+    if os.environ.get(METRICS_LOG_ENV):
+        st.caption(f"Each instrumented rerun is also appended to {os.environ[METRICS_LOG_ENV]}, rotated at "
+                   f"{METRICS_LOG_BYTES // 2 ** 20} MB with {METRICS_LOG_BACKUPS} backups.")
+    
+    history = st.session_state.get('rerun_metrics', [])
+    if not history:
+        st.info("No instrumented reruns yet. A rerun is listed here once it has finished.")
+        return
+    
+    reruns = list(reversed(history))
+    shown = st.selectbox("Rerun", range(len(reruns)),
+                         format_func=lambda i: f"{reruns[i]['started']} | {reruns[i]['page']} | "
+                                               f"{reruns[i]['seconds'] * 1000:.0f} ms | {reruns[i]['outcome']}")
+    rerun = reruns[shown]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Rerun", f"{rerun['seconds'] * 1000:.0f} ms")
+    col2.metric("WorkflowManager calls", f"{rerun['manager_seconds'] * 1000:.0f} ms")
+    col3.metric("Page code and elements", f"{(rerun['seconds'] - rerun['manager_seconds']) * 1000:.0f} ms")
+    col4.metric("Elements", rerun['elements'])
+    col1, col2, col3, col4 = st.columns(4)
+    file_bytes = ("Workbook, journal, event log and attachment files only; SQLite reads and writes count "
+                  "rows, listed under Storage I/O.")
+    col1.metric("Reads", rerun['reads'])
+    col2.metric("File bytes read", megabytes(rerun['bytes_read']), help=file_bytes)
+    col3.metric("Writes", rerun['writes'])
+    col4.metric("File bytes written", megabytes(rerun['bytes_written']), help=file_bytes)
+    st.caption("Call times include the calls they make, so nested calls are counted in both. "
+               "Background journal compaction is not part of any rerun.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("WorkflowManager Calls")
+        calls = pd.DataFrame([{'Call': name, 'Count': call['count'], 'ms': call['seconds'] * 1000}
+                              for name, call in rerun['calls'].items()], columns=['Call', 'Count', 'ms'])
+        st.dataframe(calls.sort_values('ms', ascending=False), use_container_width=True, hide_index=True)
+    with col2:
+        st.subheader("Storage I/O")
+        io = pd.DataFrame([{'Kind': kind, 'Count': entry['count'], 'Bytes': entry['bytes'], 'Rows': entry['rows'],
+                            'ms': entry['seconds'] * 1000} for kind, entry in rerun['io'].items()],
+                          columns=['Kind', 'Count', 'Bytes', 'Rows', 'ms'])
+        st.dataframe(io, use_container_width=True, hide_index=True)
+        st.subheader("Loaded Tables")
+        tables = pd.DataFrame([{'Table': name, 'Rows': size['rows'], 'Columns': size['columns'], 'Bytes': size['bytes']}
+                               for name, size in rerun['frames'].items()], columns=['Table', 'Rows', 'Columns', 'Bytes'])
+        st.dataframe(tables, use_container_width=True, hide_index=True)
+    
+    st.subheader("Recent Reruns")
+    recent = pd.DataFrame(reruns)[['started', 'page', 'user', 'outcome', 'seconds', 'manager_seconds', 'elements',
+                                   'reads', 'bytes_read', 'writes', 'bytes_written']]
+    recent.columns = ['Started', 'Page', 'User', 'Outcome', 'Seconds', 'WorkflowManager Seconds', 'Elements',
+                      'Reads', 'File Bytes Read', 'Writes', 'File Bytes Written']
+    st.dataframe(recent, use_container_width=True, hide_index=True)
+
+def table_editor(wm, sheet_name, frame, key, button_label, success_message):
+    """Editable table with a save button; the save is rejected if another user changed the table meanwhile
+    
+    Edits are checked against the table_version the editor started from, recorded while it had
+    no pending edits, rather than the data reloaded for the rerun that saves them. After a save,
+    accepted or not, the editor restarts from the stored table.
+    """
+    editor_key = f"{key}_{st.session_state.setdefault(f'{key}_generation', 0)}"
+    edits = st.session_state.get(editor_key) or {}
+    if not any(edits.get(part) for part in ('edited_rows', 'added_rows', 'deleted_rows')):
+        st.session_state[f"{key}_version"] = table_version(frame)
+    edited = st.data_editor(frame, use_container_width=True, key=editor_key)
+    
+    if st.button(button_label):
+        saved = wm.save_table(sheet_name, edited, expected_table_version=st.session_state[f"{key}_version"])
+        st.session_state[f"{key}_generation"] += 1
+        if saved:
+            st.success(success_message)
+            st.rerun()
+
 def admin_page():
     """Admin page for user and workflow management"""
-    if st.session_state.current_user is None or st.session_state.current_user['Role'] not in ['Lead', 'Manager']:
-        st.error("Access denied. Only Lead and Manager roles can access admin functions.")
+    wm = WorkflowManager(notify=show_notice)
+    permissions = wm.workflow().permissions
+    if not permissions.is_admin(current_role()):
+        st.error(f"Access denied. Only {' and '.join(sorted(permissions.admin_roles))} roles can access admin functions.")
         return
     
     st.markdown('<div class="main-header"><h1>⚙️ Admin Console</h1></div>', 
                 unsafe_allow_html=True)
     
-    wm = WorkflowManager()
     records, users, steps, workflow_status = wm.load_data()
     
-    tab1, tab2 = st.tabs(["User Management", "Workflow Configuration"])
+    tab1, tab2, tab3, tab4 = st.tabs(["User Management", "Workflow Configuration", "Data Checks", "Performance"])
     
     with tab1:
         st.header("User Management")
         
         # Display current users
         st.subheader("Current Users")
-        edited_users = st.data_editor(users, use_container_width=True)
-        
-        if st.button("Save User Changes"):
-            if wm.save_data(records, edited_users, steps, workflow_status):
-                st.success("User data saved successfully!")
-                st.rerun()
+        table_editor(wm, 'Users', users, "users_editor", "Save User Changes", "User data saved successfully!")
     
     with tab2:
         st.header("Workflow Step Configuration")
         
-        st.info("Changes to workflow steps will only apply to new records created after the changes.")
+        if os.path.exists(wm.config_file):
+            workflow = wm.workflow()
+            st.info(f"Workflow steps and templates are defined in {WORKFLOW_CONFIG_FILE}. "
+                    "Changes to the file apply to new records created after the changes.")
+            st.dataframe(workflow.steps_table(), use_container_width=True)
+            
+            st.subheader("Workflow Templates")
+            st.dataframe(pd.DataFrame({
+                'Template': list(workflow.templates),
+                'Steps': [", ".join(str(step_id) for step_id in step_ids) for step_ids in workflow.templates.values()],
+                'Solutions': [", ".join(solution for solution, names in workflow.solution_templates.items() if name in names)
+                              or "All others" for name in workflow.templates],
+            }), use_container_width=True, hide_index=True)
+        else:
+            st.info("Changes to workflow steps will only apply to new records created after the changes.")
+            
+            # Display current workflow steps
+            table_editor(wm, 'Steps', steps, "steps_editor", "Save Workflow Changes",
+                         "Workflow configuration saved successfully!")
+    
+    with tab3:
+        st.header("Status Summaries")
         
-        # Display current workflow steps
-        edited_steps = st.data_editor(steps, use_container_width=True)
+        st.info("Per-record step counts are maintained incrementally. "
+                "Checking rebuilds them from the workflow status and corrects any that disagree.")
         
-        if st.button("Save Workflow Changes"):
-            if wm.save_data(records, users, edited_steps, workflow_status):
-                st.success("Workflow configuration saved successfully!")
-                st.rerun()
+        if st.button("Check Status Summaries"):
+            mismatches = wm.check_status_summary()
+            if mismatches:
+                st.warning(f"Rebuilt status summaries; {len(mismatches)} records were out of date: "
+                           f"{', '.join(str(unique_id) for unique_id in mismatches[:20])}")
+            else:
+                st.success("All status summaries are consistent.")
+    
+    with tab4:
+        st.header("Rerun Instrumentation")
+        metrics_panel()
+
+def configure_page():
+    """Page configuration, styling and session state defaults; the first Streamlit calls of every run"""
+    st.set_page_config(
+        page_title="Workflow Management System",
+        page_icon="📋",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(APP_CSS, unsafe_allow_html=True)
+    
+    st.session_state.setdefault('current_user', None)
+    st.session_state.setdefault('selected_record', None)
 
 def main():
     """Main application function"""
     
+    configure_page()
+    with instrument_rerun():
+        run_app()
+
+def run_app():
+    """Log the user in and run the page selected in the sidebar"""
+    
     # User authentication
     user_info = user_authentication()
     if user_info is not None:
@@ -597,6 +3976,9 @@ def main():
     pages = {
         "Record Management": record_management_page,
         "Workflow": workflow_page,
+        "My Tasks": my_tasks_page,
+        "Bulk Update": bulk_update_page,
+        "Dashboard": dashboard_page,
         "Admin Console": admin_page
     }
     
@@ -607,10 +3989,65 @@ def main():
             st.session_state.selected_record = None
             st.rerun()
     
-    selected_page = st.sidebar.radio("Select Page", list(pages.keys()))
+    selected_page = st.sidebar.radio("Select Page", list(pages.keys()), key="page")
     
     # Run selected page
     pages[selected_page]()
 
+def cli():
+    """Storage maintenance commands for running outside Streamlit"""
+    parser = argparse.ArgumentParser(
+        description="Workflow Management System storage tools. "
+                    "Start the app itself with: streamlit run Workflow_Stream.py")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    migrate = commands.add_parser('migrate', help="Copy an Excel workbook into the SQLite database")
+    migrate.add_argument('--workbook', default="workflow_data.xlsx")
+    migrate.add_argument('--database', default=None, help="Defaults to the workbook path with a .db suffix")
+    
+    export = commands.add_parser('export', help="Write the data of the WORKFLOW_STORAGE backend to an .xlsx "
+                                                "workbook or a directory of CSV or Parquet files")
+    export.add_argument('output')
+    export.add_argument('--format', choices=sorted(TRANSFER_FORMATS.values()),
+                        help="Defaults to the extension of the output path")
+    export.add_argument('--data-file', default="workflow_data.xlsx")
+    export.add_argument('--chunk-rows', type=int, default=TRANSFER_CHUNK_ROWS)
+    
+    import_ = commands.add_parser('import', help="Add the records of an .xlsx workbook, a CSV or Parquet file or an "
+                                                 "exported directory to the WORKFLOW_STORAGE backend")
+    import_.add_argument('source')
+    import_.add_argument('--created-by', default="import", help="Created_By of records that have none")
+    import_.add_argument('--data-file', default="workflow_data.xlsx")
+    import_.add_argument('--chunk-rows', type=int, default=TRANSFER_CHUNK_ROWS)
+    
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        database = args.database or os.path.splitext(args.workbook)[0] + '.db'
+        storage = SQLiteStorage(database, get_workbook_cache())
+        storage.import_workbook(args.workbook)
+        records, _, _, workflow_status = storage.load()
+        print(f"Migrated {len(records)} records and {len(workflow_status)} workflow status rows into {database}")
+    elif args.command == 'export':
+        try:
+            counts = WorkflowManager(args.data_file).export_data(args.output, args.format, args.chunk_rows)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Exported {counts['Records']} records and {counts['Workflow_Status']} workflow status rows to {args.output}")
+    elif args.command == 'import':
+        try:
+            result = WorkflowManager(args.data_file).import_data(args.source, args.created_by, args.chunk_rows)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Imported {result['records']} records and {result['steps']} workflow status rows from {args.source}")
+        if result['rejected']:
+            print(f"Rejected {result['rejected']} rows:")
+            for sheet_name, row, reason in result['rejections']:
+                print(f"  {sheet_name} row {row}: {reason}")
+            if result['rejected'] > len(result['rejections']):
+                print(f"  ... and {result['rejected'] - len(result['rejections'])} more")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if st.runtime.exists():
+        main()
+    else:
+        cli()
\ No newline at end of file
@@ -0,0 +1,748 @@
+"""Benchmarks for the WorkflowManager data layer.
+
+Run with ``python benchmark_workflow.py``. Every scenario works on a synthetic
+workbook in a temporary directory, so ``workflow_data.xlsx`` is never touched.
+WorkflowManager makes no Streamlit calls, so everything runs headless.
+
+``manager`` times the main WorkflowManager calls on workbooks of 1k rows up to
+``--status-rows`` (e.g. ``--status-rows 1000000``); ``sessions`` runs concurrent
+sessions of mixed reads and writes. ``--json report.json`` writes every
+measurement in machine-readable form for tracking regressions between runs.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+
+from Workflow_Stream import (STATUS_COLUMNS, AssigneeIndex, ExcelStorage, SearchIndex, SQLiteStorage, StatusIndex,
+                             StatusSummary, StepEventLog, WorkbookCache, WorkflowDefinition, WorkflowManager,
+                             apply_status_updates, build_dashboard, default_tables, typed_workflow_status)
+
+# st.cache_resource warns when used outside a Streamlit server; silence the bare-mode warnings
+streamlit.logger.set_log_level("error")
+
+STEP_COUNT = 13
+# Measurements of this run; main adds the scenario name and writes them with --json
+RESULTS = []
+RUN_STARTED = datetime.now().isoformat(timespec='seconds')
+# Workflow_Status row counts the manager scenario steps through on its way to --status-rows
+MANAGER_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+# Relative frequency of each operation a simulated session issues
+SESSION_MIX = {"view record": 40, "search": 20, "my tasks": 15, "update step": 20, "create record": 5}
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Workflow_Stream.py")
+STATUSES = ["Not Started", "In Progress", "Completed"]
+
+
+def build_status_frame(status_rows, usernames):
+    """Return (records, workflow_status) frames with ``status_rows`` Workflow_Status rows"""
+    record_count = max(1, status_rows // STEP_COUNT)
+    ids = list(range(1000, 1000 + record_count))
+    records = pd.DataFrame({
+        'Unique_ID': ids,
+        'Client_Group': [f"Client {i % 50}" for i in ids],
+        'Legal_Entity': [f"Client {i % 50} Entity {i % 7}" for i in ids],
+        'Solution': [f"Solution {i % 11}" for i in ids],
+        'Created_Date': datetime.now(),
+        'Created_By': 'admin',
+    })
+    workflow_status = pd.DataFrame({
+        'Unique_ID': [uid for uid in ids for _ in range(STEP_COUNT)],
+        'Step_ID': list(range(1, STEP_COUNT + 1)) * record_count,
+    })
+    workflow_status['Status'] = [STATUSES[i % 3] for i in range(len(workflow_status))]
+    workflow_status['Assigned_To'] = [usernames[i % len(usernames)] for i in range(len(workflow_status))]
+    workflow_status['Completed_By'] = ''
+    workflow_status['Completed_Date'] = ''
+    workflow_status['Comments'] = ''
+    workflow_status['Attachment_Path'] = ''
+    return records, workflow_status[STATUS_COLUMNS]
+
+
+def build_workbook(path, status_rows, storage=None):
+    """Write a workbook with enough records to produce ``status_rows`` Workflow_Status rows"""
+    manager = WorkflowManager(path, storage)
+    _, users, steps, _ = manager.load_data()
+    records, workflow_status = build_status_frame(status_rows, users['Username'].tolist())
+    manager.save_data(records, users, steps, workflow_status)
+    return manager
+
+
+@contextmanager
+def count_parses():
+    """Count calls to openpyxl.load_workbook, i.e. full workbook parses"""
+    counter = {'parses': 0}
+    original = openpyxl.load_workbook
+
+    def counting_load_workbook(*args, **kwargs):
+        counter['parses'] += 1
+        return original(*args, **kwargs)
+
+    openpyxl.load_workbook = counting_load_workbook
+    try:
+        yield counter
+    finally:
+        openpyxl.load_workbook = original
+
+
+def legacy_load_data(data_file):
+    """The pre-single-parse load path: one validation open plus one read_excel per sheet"""
+    with pd.ExcelFile(data_file) as xls:
+        xls.sheet_names
+    return tuple(pd.read_excel(data_file, sheet_name=name)
+                 for name in ['Records', 'Users', 'Steps', 'Workflow_Status'])
+
+
+def record(label, **metrics):
+    """Keep one measurement of the running scenario for the --json report"""
+    RESULTS.append(dict(label=label, **metrics))
+
+
+def time_call(func, repeat, setup=None):
+    """Return (best wall time, parses per call) over ``repeat`` runs of ``func``
+
+    With ``setup``, it is called untimed before every run and ``func`` gets its result.
+    """
+    timings = []
+    parses = 0
+    with count_parses() as counter:
+        for _ in range(repeat):
+            args = [] if setup is None else [setup()]
+            before = counter['parses']
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+            parses += counter['parses'] - before
+    return min(timings), parses / repeat
+
+
+def bench_load(status_rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workflow_data.xlsx")
+        manager = build_workbook(path, status_rows, ExcelStorage(path, WorkbookCache()))
+        print(f"Excel load_data with {status_rows} Workflow_Status rows (best of {repeat})")
+        manager.load_data()
+        timings = {}
+        for label, func in [("legacy (5 parses)", lambda: legacy_load_data(manager.data_file)),
+                            ("single parse", manager.storage.read_workbook),
+                            ("load_data (cached)", manager.load_data)]:
+            seconds, parses = time_call(func, repeat)
+            timings[label] = seconds
+            print(f"  {label:<20} parses/call={parses:<4g} wall={seconds:.3f}s")
+            record(label, status_rows=status_rows, wall_ms=seconds * 1000, parses=parses)
+        # Parsing the Workflow_Status sheet dominates both uncached paths, and the ratio between
+        # them moves with run-to-run noise; only the cache removes the parse
+        speedup = timings["legacy (5 parses)"] / timings["single parse"]
+        print(f"  single parse vs legacy {speedup:.2f}x: fewer parses, no measurable speedup at this size")
+        record('single parse speedup', status_rows=status_rows, speedup=speedup)
+
+
+def mask_step_lookup(workflow_status, unique_id):
+    """The pre-index workflow_page pattern: a record mask, then a step mask and five iloc[0] per step"""
+    current_workflow = workflow_status[workflow_status['Unique_ID'] == unique_id]
+    for step_id in range(1, STEP_COUNT + 1):
+        step_status = current_workflow[current_workflow['Step_ID'] == step_id]
+        for column in ['Status', 'Assigned_To', 'Completed_By', 'Completed_Date', 'Comments']:
+            step_status.iloc[0][column]
+
+
+def bench_lookup(status_rows, repeat):
+    _, workflow_status = build_status_frame(status_rows, ['admin', 'john.doe'])
+    unique_id = int(workflow_status['Unique_ID'].iloc[len(workflow_status) // 2])
+    updates = [{'Unique_ID': unique_id, 'Step_ID': 7, 'Status': 'Completed'}]
+
+    start = time.perf_counter()
+    index = StatusIndex(workflow_status)
+    build_seconds = time.perf_counter() - start
+
+    print(f"Step lookups and updates with {len(workflow_status)} Workflow_Status rows (best of {repeat})")
+    print(f"  {'index build (once per data version)':<40} wall={build_seconds * 1000:.2f}ms")
+    record('index build', status_rows=len(workflow_status), wall_ms=build_seconds * 1000)
+    for label, func in [
+            ("render lookups, masks", lambda: mask_step_lookup(workflow_status, unique_id)),
+            ("render lookups, index", lambda: index.step_rows(workflow_status, unique_id)),
+            ("step update, mask", lambda: apply_status_updates(workflow_status, updates)),
+            ("step update, index", lambda: apply_status_updates(workflow_status, updates, index))]:
+        seconds, _ = time_call(func, repeat)
+        print(f"  {label:<40} wall={seconds * 1000:.2f}ms")
+        record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def bench_dashboard(status_rows, repeat):
+    _, _, steps, _ = default_tables()
+    records, workflow_status = build_status_frame(status_rows, ['admin', 'john.doe', ''])
+    frames = (records, pd.DataFrame(), steps, workflow_status)
+    cache = WorkbookCache()
+    cache.install("dashboard", 1, frames)
+    cache.derived("dashboard", 1, 'dashboard', build_dashboard, frames)
+
+    print(f"Dashboard with {len(records)} records x {STEP_COUNT} steps (best of {repeat})")
+    for label, func in [
+            ("build (once per data version)", lambda: build_dashboard(frames)),
+            ("cached, same data version", lambda: cache.derived("dashboard", 1, 'dashboard', build_dashboard, frames))]:
+        seconds, _ = time_call(func, repeat)
+        print(f"  {label:<40} wall={seconds * 1000:.2f}ms")
+        record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def bench_summary(status_rows, repeat):
+    _, workflow_status = build_status_frame(status_rows, ['admin', 'john.doe'])
+    unique_id = int(workflow_status['Unique_ID'].iloc[len(workflow_status) // 2])
+    updates = [{'Unique_ID': unique_id, 'Step_ID': 7, 'Status': 'Completed', 'Completed_Date': datetime.now()}]
+    index = StatusIndex(workflow_status)
+    summary = StatusSummary(workflow_status, index)
+    frames = (None, None, None, apply_status_updates(workflow_status.copy(deep=False), updates, index))
+
+    print(f"Status summaries with {len(workflow_status)} Workflow_Status rows (best of {repeat})")
+    for label, func in [
+            ("full rebuild", lambda: summary.rebuild(frames[3])),
+            ("incremental step update", lambda: summary.on_steps_updated(frames, updates)),
+            ("read one record", lambda: summary.get(unique_id))]:
+        seconds, _ = time_call(func, repeat)
+        print(f"  {label:<40} wall={seconds * 1000:.2f}ms")
+        record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def bench_inbox(status_rows, repeat, users=1000):
+    usernames = [f"user{i}" for i in range(users)]
+    _, workflow_status = build_status_frame(status_rows, usernames)
+    index = StatusIndex(workflow_status)
+    unique_id, step_id = (int(value) for value in workflow_status[['Unique_ID', 'Step_ID']].iloc[0])
+    updates = [{'Unique_ID': unique_id, 'Step_ID': step_id, 'Assigned_To': 'user1', 'Status': 'In Progress'}]
+    frames = (None, None, None, apply_status_updates(workflow_status.copy(deep=False), updates, index))
+
+    start = time.perf_counter()
+    assignees = AssigneeIndex(workflow_status, index)
+    build_seconds = time.perf_counter() - start
+
+    print(f"My tasks of one of {users} users, {len(workflow_status)} Workflow_Status rows (best of {repeat})")
+    print(f"  {'index build (once per data version)':<40} wall={build_seconds * 1000:.2f}ms")
+    record('index build', status_rows=len(workflow_status), wall_ms=build_seconds * 1000)
+    for label, func in [
+            ("scan for open assigned steps", lambda: workflow_status[(workflow_status['Assigned_To'] == 'user1')
+                                                                     & (workflow_status['Status'] != 'Completed')]),
+            ("assignee index", lambda: assignees.get('user1')),
+            ("index maintenance, one update", lambda: assignees.on_steps_updated(frames, updates))]:
+        seconds, _ = time_call(func, repeat)
+        print(f"  {label:<40} wall={seconds * 1000:.3f}ms")
+        record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def bench_search(status_rows, repeat, commented=0.15):
+    """Full-text search of records and step comments: scanning every text vs the inverted index"""
+    records, workflow_status = build_status_frame(status_rows, ['admin'])
+    rng = np.random.default_rng(0)
+    words = np.array(['approved', 'approval', 'pending', 'kyc', 'review', 'missing', 'documents', 'signed',
+                      'tax', 'form', 'w8', 'escalated', 'client', 'call', 'chased', 'received'])
+    has_comment = rng.random(len(workflow_status)) < commented
+    comments = np.full(len(workflow_status), '', dtype=object)
+    comments[has_comment] = [' '.join(choice) for choice in rng.choice(words, (int(has_comment.sum()), 5))]
+    workflow_status['Comments'] = comments
+    index = StatusIndex(workflow_status)
+    unique_id = int(workflow_status['Unique_ID'].iloc[0])
+    updates = [{'Unique_ID': unique_id, 'Step_ID': 1, 'Comments': "Escalated to the tax review board"}]
+
+    start = time.perf_counter()
+    search = SearchIndex(records, workflow_status, index)
+    build_seconds = time.perf_counter() - start
+
+    def scan(query):
+        """Records with every term as a substring of their fields or step comments"""
+        text = records['Client_Group'] + ' ' + records['Legal_Entity'] + ' ' + records['Solution']
+        matched = pd.Series(True, index=records['Unique_ID'])
+        for term in query.lower().split():
+            in_comments = workflow_status.loc[workflow_status['Comments'].str.lower().str.contains(term, regex=False),
+                                              'Unique_ID'].unique()
+            matched &= text.str.lower().str.contains(term, regex=False).to_numpy() | matched.index.isin(in_comments)
+        return matched.index[matched].tolist()
+
+    print(f"Search of {len(records)} records, {int(has_comment.sum())} step comments (best of {repeat})")
+    print(f"  {'index build (once per data version)':<40} wall={build_seconds * 1000:.1f}ms")
+    record('index build', status_rows=len(workflow_status), wall_ms=build_seconds * 1000)
+    for label, func in [
+            ("scan, 'client 7 kyc'", lambda: scan('client 7 kyc')),
+            ("index, 'client 7 kyc'", lambda: search.search('client 7 kyc')),
+            ("index, prefix 'appro'", lambda: search.search('appro')),
+            ("index, 'solution 3 escalated w8'", lambda: search.search('solution 3 escalated w8')),
+            ("index, Unique_ID prefix '104'", lambda: search.search('104')),
+            ("index maintenance, one comment", lambda: search.on_steps_updated(None, updates))]:
+        seconds, _ = time_call(func, repeat)
+        print(f"  {label:<40} wall={seconds * 1000:.3f}ms")
+        record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def peak_memory(func):
+    """Peak memory in MB traced during one call of func"""
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return peak
+
+
+def bench_transfer(status_rows, repeat):
+    """Exporting and importing the portfolio in chunks vs through fully loaded tables, at two sizes
+
+    Exports and SQLite imports stream, so their peak memory should not grow with size. Imports into
+    Excel rewrite the workbook once, holding it in memory; their wall time and that of the first
+    load after them should grow linearly with size, not quadratically.
+    """
+    print("CSV export and import with storage=sqlite and excel (wall time untraced, then peak traced memory)")
+    for rows in [status_rows // 4, status_rows]:
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(os.path.join(os.path.dirname(APP_FILE), "workflow_config.json"), tmp)
+            database = os.path.join(tmp, "workflow_data.db")
+            build_workbook(database, rows, SQLiteStorage(database, WorkbookCache()))
+            # A fresh cache per manager, as in a CLI run: nothing is loaded unless the path needs it
+            fresh = lambda path: WorkflowManager(path, SQLiteStorage(path, WorkbookCache()))
+            fresh_excel = lambda path: WorkflowManager(path, ExcelStorage(path, WorkbookCache()))
+            export_dir = os.path.join(tmp, "export")
+            imports = iter(range(2))
+            excel_imports = iter(range(2))
+
+            def load_and_write():
+                for sheet_name, frame in zip(['Records', 'Users', 'Steps', 'Workflow_Status'], fresh(database).load_data()):
+                    frame.to_csv(os.path.join(tmp, f"full_{sheet_name}.csv"), index=False)
+
+            print(f"  {rows} Workflow_Status rows")
+            for label, func in [
+                    ("export, load_data + to_csv", load_and_write),
+                    ("export_data, chunked", lambda: fresh(database).export_data(export_dir, 'csv')),
+                    ("import_data, chunked", lambda: fresh(os.path.join(tmp, f"imported{next(imports)}.db"))
+                                                     .import_data(export_dir, 'admin')),
+                    ("import_data into excel, chunked",
+                     lambda: fresh_excel(os.path.join(tmp, f"imported{next(excel_imports)}.xlsx"))
+                     .import_data(export_dir, 'admin')),
+                    ("excel load_data after import", lambda: fresh_excel(os.path.join(tmp, "imported0.xlsx"))
+                                                             .load_data())]:
+                start = time.perf_counter()
+                func()
+                seconds = time.perf_counter() - start
+                peak = peak_memory(func)
+                print(f"    {label:<36} wall={seconds:6.2f}s peak memory={peak:7.1f}MB")
+                record(label, status_rows=rows, wall_ms=seconds * 1000, peak_mb=peak)
+
+
+def bench_bulk(status_rows, repeat, steps=200):
+    """Signing off one step on many records: one write per step vs a single bulk write"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = build_workbook(os.path.join(tmp, "workflow_data.xlsx"), status_rows)
+        records, _, _, workflow_status = manager.load_data()
+        keys = [(int(unique_id), 7) for unique_id in records['Unique_ID'].iloc[:steps]]
+        changes = {'Status': 'Completed', 'Completed_By': 'admin', 'Completed_Date': datetime.now()}
+        updates = [dict(changes, Unique_ID=unique_id, Step_ID=step_id) for unique_id, step_id in keys]
+        index = manager.status_index()
+
+        print(f"Bulk sign-off of {len(keys)} steps, {len(workflow_status)} Workflow_Status rows "
+              f"with storage={os.environ.get('WORKFLOW_STORAGE', 'excel')} (best of {repeat})")
+        for label, func in [
+                ("apply, one update at a time", lambda: [apply_status_updates(workflow_status, [update], index)
+                                                         for update in updates]),
+                ("apply, one batch", lambda: apply_status_updates(workflow_status, updates, index)),
+                ("persist, update_step per step", lambda: [manager.update_step(*key, **changes) for key in keys]),
+                ("persist, update_steps", lambda: manager.update_steps(keys, 'Lead', **changes))]:
+            seconds, _ = time_call(func, repeat)
+            print(f"  {label:<40} wall={seconds * 1000:.1f}ms")
+            record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def bench_schema(status_rows, repeat):
+    """Memory and filter speed of the typed Workflow_Status schema against untyped loads"""
+    _, loaded = build_status_frame(status_rows, [f"user{i}" for i in range(50)])
+    completed = loaded['Status'] == 'Completed'
+    # As in the sheet: a date on completed steps, blank cells elsewhere
+    loaded['Completed_Date'] = [datetime(2024, 1, 1) if done else '' for done in completed.tolist()]
+    frames = [("object columns", loaded.astype(object)), ("default inference", loaded)]
+
+    start = time.perf_counter()
+    frames.append(("typed schema", typed_workflow_status(loaded)))
+    typing_seconds = time.perf_counter() - start
+
+    print(f"Workflow_Status representations, {len(loaded)} rows (best of {repeat})")
+    print(f"  {'apply typed schema (once per load)':<40} wall={typing_seconds * 1000:.1f}ms")
+    record('apply typed schema', status_rows=len(loaded), wall_ms=typing_seconds * 1000)
+    for label, frame in frames:
+        memory = frame.memory_usage(deep=True).sum() / 2 ** 20
+        timings = []
+        for func in [lambda: frame[(frame['Assigned_To'] == 'user7') & (frame['Status'] != 'Completed')],
+                     lambda: frame['Status'].value_counts(),
+                     lambda: frame.groupby('Assigned_To', observed=True)['Step_ID'].count()]:
+            seconds, _ = time_call(func, repeat)
+            timings.append(seconds * 1000)
+        print(f"  {label:<20} memory={memory:7.1f}MB open-task filter={timings[0]:6.1f}ms "
+              f"status counts={timings[1]:6.1f}ms per-assignee counts={timings[2]:6.1f}ms")
+        record(label, status_rows=len(loaded), memory_mb=memory, open_task_filter_ms=timings[0],
+               status_counts_ms=timings[1], assignee_counts_ms=timings[2])
+
+
+def bench_events(status_rows, repeat, days=365):
+    """Step history queries over a year of logged transitions: partition reads vs loading it all"""
+    records = max(1, status_rows // STEP_COUNT)
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp.now().normalize() - pd.Timedelta(days=days)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = StepEventLog(tmp)
+        # Each record is created on a random day; each step then starts and completes a few days apart
+        created = start + pd.to_timedelta(rng.uniform(0, days - 30, records), unit='D')
+        for step_id in range(1, STEP_COUNT + 1):
+            started = created + pd.to_timedelta(rng.uniform(0, 10, records), unit='D')
+            completed = started + pd.to_timedelta(rng.uniform(0, 10, records), unit='D')
+            for status, times in [("Not Started", created), ("In Progress", started), ("Completed", completed)]:
+                log.append(pd.DataFrame({'Timestamp': times, 'Unique_ID': np.arange(records), 'Step_ID': step_id,
+                                         'Status': status, 'Assigned_To': 'john.doe',
+                                         'Changed_By': 'admin'}).to_dict('records'))
+        recent = pd.Timestamp.now().normalize() - pd.Timedelta(weeks=4)
+        files = log.partitions()
+
+        print(f"Step history with {records * STEP_COUNT * 3} events in {len(files)} monthly partitions "
+              f"(best of {repeat})")
+        for label, func in [
+                ("load full history", lambda: pd.concat(pd.read_csv(path) for path in files)),
+                ("weekly throughput, last 4 weeks", lambda: log.weekly_throughput(recent)),
+                ("weekly throughput, whole year", lambda: log.weekly_throughput()),
+                ("time in step, last 4 weeks", lambda: log.time_in_step(recent))]:
+            seconds, _ = time_call(func, repeat)
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            print(f"  {label:<40} wall={seconds * 1000:8.1f}ms peak memory={peak:7.1f}MB")
+            record(label, events=records * STEP_COUNT * 3, wall_ms=seconds * 1000, peak_mb=peak)
+
+
+def legacy_can_complete(required_role, user_role):
+    """The pre-matrix workflow_page role check"""
+    if required_role == 'Manager' and user_role not in ['Manager', 'Lead']:
+        return False
+    if required_role == 'Lead' and user_role != 'Lead':
+        return False
+    return True
+
+
+def bench_permissions(status_rows, repeat):
+    _, _, steps, _ = default_tables()
+    _, workflow_status = build_status_frame(status_rows, ['admin'])
+    permissions = WorkflowDefinition.from_steps_table(steps).permissions
+    step_list = steps.to_dict('records')
+    step_ids = workflow_status['Step_ID'].to_numpy()
+
+    print(f"Permission checks, {len(step_list)} steps and {len(workflow_status)} Workflow_Status rows "
+          f"(best of {repeat})")
+    for label, func in [
+            ("one render, string comparisons", lambda: [legacy_can_complete(step['Required_Role'], 'Developer')
+                                                        for step in step_list]),
+            ("one render, permission matrix", lambda: [permissions.allows('Developer', step['Step_ID'], 'update')
+                                                       for step in step_list]),
+            ("all records, per-row comparisons", lambda: [legacy_can_complete(role, 'Developer') for role in
+                                                          steps.set_index('Step_ID')['Required_Role']
+                                                          .reindex(step_ids).tolist()]),
+            ("all records, step_mask", lambda: permissions.step_mask('Developer', step_ids, 'update'))]:
+        seconds, _ = time_call(func, repeat)
+        print(f"  {label:<40} wall={seconds * 1000:.3f}ms")
+        record(label, status_rows=len(workflow_status), wall_ms=seconds * 1000)
+
+
+def count_elements(node):
+    """Number of elements and blocks in an AppTest tree below node"""
+    return sum(1 + count_elements(child) for child in getattr(node, 'children', {}).values())
+
+
+def bench_render(status_rows, repeat):
+    """Element count and rerun time of workflow_page with and without the compact view"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = build_workbook(os.path.join(tmp, "workflow_data.xlsx"), status_rows)
+        unique_id = int(manager.load_data()[0]['Unique_ID'].iloc[0])
+        cwd = os.getcwd()
+        # AppTest runs the app as __main__; keep ours so later scenarios can pickle their workers
+        main_module = sys.modules['__main__']
+        os.chdir(tmp)
+        try:
+            app = AppTest.from_file(APP_FILE, default_timeout=60).run()
+            app.sidebar.selectbox[0].select(app.sidebar.selectbox[0].options[1]).run()
+            app.session_state['selected_record'] = unique_id
+            app.sidebar.radio[0].set_value("Workflow").run()
+
+            print(f"workflow_page render for one record of {STEP_COUNT} steps (best of {repeat})")
+            for label, compact, editing in [("per-step widgets", False, None),
+                                            ("compact, no step edited", True, None),
+                                            ("compact, one step edited", True, 1)]:
+                app.toggle(key="compact_steps").set_value(compact).run()
+                if compact:
+                    app.selectbox(key="edit_step").set_value(editing).run()
+                seconds, _ = time_call(app.run, repeat)
+                print(f"  {label:<40} elements={count_elements(app.main):<5} wall={seconds * 1000:.1f}ms")
+                record(label, steps=STEP_COUNT, elements=count_elements(app.main), wall_ms=seconds * 1000)
+        finally:
+            os.chdir(cwd)
+            sys.modules['__main__'] = main_module
+
+
+def fresh_manager(path):
+    """A WorkflowManager on the WORKFLOW_STORAGE backend with an empty cache, as in a newly started server"""
+    if os.environ.get('WORKFLOW_STORAGE', 'excel').lower() == 'sqlite':
+        return WorkflowManager(path, SQLiteStorage(os.path.splitext(path)[0] + '.db', WorkbookCache()))
+    return WorkflowManager(path, ExcelStorage(path, WorkbookCache()))
+
+
+def bench_manager(status_rows, repeat, query="client 7 solution 3"):
+    """load_data, create_record, update_step, save_data and record search on workbooks of growing size
+
+    Sizes step through MANAGER_SIZES up to ``status_rows``. Cold loads and first searches start
+    from an empty cache, as after a restart; the other calls reuse the cache, as a session does.
+    """
+    backend = os.environ.get('WORKFLOW_STORAGE', 'excel')
+    sizes = [size for size in MANAGER_SIZES if size < status_rows] + [status_rows]
+    print(f"WorkflowManager calls with storage={backend} (best of {repeat})")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "workflow_data.xlsx")
+            start = time.perf_counter()
+            manager = build_workbook(path, rows)
+            build_seconds = time.perf_counter() - start
+            records = manager.load_data()[0]
+            unique_id = int(records['Unique_ID'].iloc[len(records) // 2])
+            updates = iter(range(repeat))
+
+            def cold_load():
+                manager = fresh_manager(path)
+                manager.load_data()
+                return manager
+
+            print(f"  {rows} Workflow_Status rows, {len(records)} records")
+            print(f"    {'generate data':<36} wall={build_seconds * 1000:10.1f}ms")
+            record('generate data', status_rows=rows, wall_ms=build_seconds * 1000)
+            for label, func, setup in [
+                    ("load_data, cold", lambda: fresh_manager(path).load_data(), None),
+                    ("load_data, cached", manager.load_data, None),
+                    ("create_record", lambda: manager.create_record("Bench Client", "Bench Entity",
+                                                                    "Solution 1", "admin"), None),
+                    ("update_step", lambda: manager.update_step(unique_id, 7, "admin",
+                                                                Comments=f"bench {next(updates)}"), None),
+                    ("save_data", lambda tables: manager.save_data(*tables), manager.load_data),
+                    ("search, first query", lambda cold: cold.search_index().search(query), cold_load),
+                    ("search, cached index", lambda tables: manager.search_index().search(query), manager.load_data),
+                    ("facet filter", lambda tables: manager.record_facets().match(client="Client 7"), manager.load_data)]:
+                seconds, parses = time_call(func, repeat, setup)
+                print(f"    {label:<36} wall={seconds * 1000:10.1f}ms parses/call={parses:g}")
+                record(label, status_rows=rows, wall_ms=seconds * 1000, parses=parses)
+
+
+def session_worker(path, session, operations, unique_ids, usernames, seed):
+    """One simulated session: every operation is a rerun that loads the data, then reads or writes
+
+    Returns [(operation, seconds, ok)], the Unique_IDs of the records it created and the error
+    notices it got.
+    """
+    rng = random.Random(seed)
+    names, weights = zip(*SESSION_MIX.items())
+    username = usernames[session % len(usernames)]
+    timings, created, errors = [], [], []
+    for number in range(operations):
+        operation = rng.choices(names, weights)[0]
+        notices = []
+        start = time.perf_counter()
+        manager = WorkflowManager(path, notify=lambda level, message: notices.append((level, message)))
+        manager.load_data()
+        ok = True
+        if operation == "view record":
+            manager.get_step_statuses(rng.choice(unique_ids), manager.tables[3])
+        elif operation == "search":
+            manager.search_index().search(f"client {rng.randrange(50)}")
+        elif operation == "my tasks":
+            manager.my_tasks(username)
+        elif operation == "update step":
+            ok = manager.update_step(rng.choice(unique_ids), rng.randrange(1, STEP_COUNT + 1), username,
+                                     Comments=f"session {session} operation {number}")
+        else:
+            new_id = manager.create_record(f"Session {session}", "Entity", "Solution 1", username)
+            ok = new_id is not None
+            created.append(new_id)
+        timings.append((operation, time.perf_counter() - start, ok))
+        errors.extend(message for level, message in notices if level == 'error')
+    return timings, created, errors
+
+
+def bench_sessions(status_rows, repeat, sessions=8, operations=40):
+    """Concurrent sessions issuing mixed read/write traffic against one server's shared cache
+
+    Sessions are threads of this process sharing the WorkbookCache, like Streamlit sessions
+    of one server; operations are drawn from SESSION_MIX. Reports latency percentiles per
+    operation and overall throughput, and fails on errors or duplicate Unique_IDs.
+    """
+    backend = os.environ.get('WORKFLOW_STORAGE', 'excel')
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = build_workbook(os.path.join(tmp, "workflow_data.xlsx"), status_rows)
+        records, users = manager.load_data()[:2]
+        unique_ids = records['Unique_ID'].astype(int).tolist()
+        usernames = users['Username'].tolist()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(sessions) as pool:
+            results = list(pool.map(lambda session: session_worker(manager.data_file, session, operations,
+                                                                   unique_ids, usernames, seed=session),
+                                    range(sessions)))
+        seconds = time.perf_counter() - start
+        final_records = WorkflowManager(manager.data_file).load_data()[0]
+
+    timings = pd.DataFrame([timing for session_timings, _, _ in results for timing in session_timings],
+                           columns=['operation', 'seconds', 'ok'])
+    created_ids = [unique_id for _, ids, _ in results for unique_id in ids if unique_id is not None]
+    errors = [message for _, _, messages in results for message in messages]
+    failures = {
+        'failed operations': int((~timings['ok']).sum()),
+        'error notices': len(errors),
+        'duplicate Unique_IDs': len(created_ids) - len(set(created_ids)),
+        'missing records': len(unique_ids) + len(created_ids) - len(final_records),
+    }
+
+    print(f"Sessions: {sessions} concurrent sessions x {operations} operations, {status_rows} Workflow_Status rows "
+          f"with storage={backend}")
+    for operation, group in timings.groupby('operation', sort=False):
+        p50, p95 = (np.percentile(group['seconds'], q) * 1000 for q in (50, 95))
+        peak = group['seconds'].max() * 1000
+        print(f"  {operation:<16} count={len(group):<5} p50={p50:8.1f}ms p95={p95:8.1f}ms max={peak:8.1f}ms")
+        record(operation, status_rows=status_rows, sessions=sessions, count=len(group),
+               p50_ms=p50, p95_ms=p95, max_ms=peak)
+    throughput = len(timings) / seconds
+    print(f"  wall={seconds:.2f}s throughput={throughput:.1f} operations/s "
+          + " ".join(f"{name}={count}" for name, count in failures.items()))
+    for message in dict.fromkeys(errors):
+        print(f"  error: {message}")
+    print("  FAIL" if any(failures.values()) else "  PASS")
+    record("all operations", status_rows=status_rows, sessions=sessions, count=len(timings),
+           wall_ms=seconds * 1000, throughput_per_s=throughput, passed=not any(failures.values()),
+           **{name.replace(' ', '_'): count for name, count in failures.items()})
+
+
+def stress_worker(args):
+    """Update this worker's own step on every record, then create records, in a separate process"""
+    data_file, worker, unique_ids, new_records = args
+    manager = WorkflowManager(data_file)
+    for unique_id in unique_ids:
+        manager.update_step(unique_id, worker + 1, Comments=f"worker {worker}")
+    return [manager.create_record(f"Stress {worker}", "Entity", "Solution", f"worker{worker}")
+            for _ in range(new_records)]
+
+
+def bench_stress(status_rows, repeat, workers=4, new_records=3):
+    """Concurrent writers from several processes must not lose updates or reuse Unique_IDs"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = build_workbook(os.path.join(tmp, "workflow_data.xlsx"), status_rows)
+        unique_ids = manager.load_data()[0]['Unique_ID'].astype(int).tolist()
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(workers) as pool:
+            created = pool.map(stress_worker, [(manager.data_file, worker, unique_ids, new_records)
+                                               for worker in range(workers)])
+        seconds = time.perf_counter() - start
+
+        records, _, _, workflow_status = WorkflowManager(manager.data_file).load_data()
+        created_ids = [unique_id for ids in created for unique_id in ids]
+        lost_updates = sum(
+            int((workflow_status[workflow_status['Unique_ID'].isin(unique_ids)
+                                 & (workflow_status['Step_ID'] == worker + 1)]['Comments']
+                 != f"worker {worker}").sum())
+            for worker in range(workers))
+        failures = {
+            'lost step updates': lost_updates,
+            'failed creates': created_ids.count(None),
+            'duplicate Unique_IDs': len(created_ids) - len(set(created_ids)),
+            'missing records': len(unique_ids) + len(created_ids) - len(records),
+        }
+
+    print(f"Stress: {workers} processes x ({len(unique_ids)} step updates + {new_records} creates) "
+          f"with storage={os.environ.get('WORKFLOW_STORAGE', 'excel')}")
+    print(f"  wall={seconds:.2f}s " + " ".join(f"{name}={count}" for name, count in failures.items()))
+    print("  FAIL" if any(failures.values()) else "  PASS")
+    record("concurrent writers", status_rows=status_rows, workers=workers, wall_ms=seconds * 1000,
+           passed=not any(failures.values()), **{name.replace(' ', '_'): count for name, count in failures.items()})
+
+
+SCENARIOS = {
+    'load': (bench_load, 50_000),
+    'lookup': (bench_lookup, 100_000),
+    'dashboard': (bench_dashboard, 100_000 * 13),
+    'summary': (bench_summary, 100_000 * 13),
+    'render': (bench_render, 26 * 13),
+    'permissions': (bench_permissions, 100_000 * 13),
+    'inbox': (bench_inbox, 100_000 * 13),
+    'search': (bench_search, 100_000 * 13),
+    'bulk': (bench_bulk, 10_000 * 13),
+    'transfer': (bench_transfer, 40_000 * 13),
+    'schema': (bench_schema, 100_000 * 13),
+    'events': (bench_events, 50_000 * 13),
+    'stress': (bench_stress, 26 * 13),
+    'manager': (bench_manager, 100_000),
+    'sessions': (bench_sessions, 2_000 * 13),
+}
+
+
+def write_report(path, args):
+    """Write RESULTS with the run settings and versions as JSON, to stdout if path is -"""
+    report = {
+        'started': RUN_STARTED,
+        'storage': os.environ.get('WORKFLOW_STORAGE', 'excel'),
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': RESULTS,
+    }
+    if path == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", choices=sorted(SCENARIOS), default=sorted(SCENARIOS),
+                        help="Scenarios to run (default: all)")
+    parser.add_argument("--status-rows", type=int, default=None,
+                        help="Workflow_Status rows to generate (default: per scenario)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--storage", choices=["excel", "sqlite"], default=None,
+                        help="Storage backend for WorkflowManager (default: WORKFLOW_STORAGE or excel)")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions of the sessions scenario")
+    parser.add_argument("--json", metavar="PATH", default=None,
+                        help="Also write every measurement as JSON to PATH, or to stdout with - "
+                             "(the text report then goes to stderr)")
+    args = parser.parse_args()
+    if args.storage:
+        os.environ['WORKFLOW_STORAGE'] = args.storage
+    if args.json == "-":
+        sys.stdout = sys.stderr
+    for name in args.scenarios:
+        bench, default_rows = SCENARIOS[name]
+        options = {'sessions': args.sessions} if name == 'sessions' else {}
+        first = len(RESULTS)
+        bench(args.status_rows or default_rows, args.repeat, **options)
+        for result in RESULTS[first:]:
+            result['scenario'] = name
+    if args.json:
+        sys.stdout = sys.__stdout__
+        write_report(args.json, args)
+    if any(result.get('passed') is False for result in RESULTS):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
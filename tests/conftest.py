@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Workflow_Stream import ExcelStorage, SQLiteStorage, WorkbookCache, WorkflowManager
+
+
+@pytest.fixture(params=['excel', 'sqlite'])
+def manager(request, tmp_path):
+    """A WorkflowManager on a fresh default data file of each backend, with its own cache"""
+    data_file = str(tmp_path / "workflow_data.xlsx")
+    if request.param == 'sqlite':
+        storage = SQLiteStorage(str(tmp_path / "workflow_data.db"), WorkbookCache())
+    else:
+        storage = ExcelStorage(data_file, WorkbookCache())
+    return WorkflowManager(data_file, storage)
+
+
+@pytest.fixture
+def record_id(manager):
+    """Unique_ID of one record created in manager"""
+    unique_id = manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    assert unique_id is not None
+    return unique_id
@@ -0,0 +1,42 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import Workflow_Stream
+from Workflow_Stream import AttachmentStore
+
+
+def test_identical_uploads_share_one_content_addressed_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(Workflow_Stream, 'ATTACHMENT_CHUNK_SIZE', 4)
+    store = AttachmentStore(str(tmp_path))
+    content = b"signed engagement letter"
+    digest = hashlib.sha256(content).hexdigest()
+
+    first = store.save(io.BytesIO(content), "Letter.PDF")
+    second = store.save(io.BytesIO(content), "copy.pdf")
+    assert first == second == os.path.join("attachments", digest[:2], digest + ".pdf")
+    assert store.read(first) == content
+    assert store.size(first) == len(content)
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == [digest + ".pdf"]
+
+
+def test_failed_upload_leaves_no_partial_file(tmp_path):
+    class BrokenUpload(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell():
+                raise OSError("connection reset")
+            return super().read(size)
+
+    store = AttachmentStore(str(tmp_path))
+    with pytest.raises(OSError):
+        store.save(BrokenUpload(b"x" * (2 * Workflow_Stream.ATTACHMENT_CHUNK_SIZE)), "big.bin")
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == []
+
+
+def test_missing_or_blank_paths_do_not_exist(tmp_path):
+    store = AttachmentStore(str(tmp_path))
+    assert not store.exists(os.path.join("attachments", "ab", "missing.pdf"))
+    assert not store.exists("")
+    assert not store.exists(float('nan'))
@@ -0,0 +1,34 @@
+import pytest
+
+
+def test_bulk_update_saves_permitted_steps_in_one_write(manager, monkeypatch):
+    first = manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    second = manager.create_record("Group B", "Entity B", "Solution B", "admin")
+    writes = []
+    update_status = manager.storage.update_status
+    monkeypatch.setattr(manager.storage, 'update_status', lambda updates: writes.append(updates) or update_status(updates))
+
+    # Step 6 is restricted to Lead in the default steps
+    keys = [(first, 1), (first, 6), (second, 1), (second, 6), (999999, 1), (first, 1)]
+    updated, rejected = manager.update_steps(keys, 'Manager', 'jane.smith', Status="In Progress", Assigned_To="carol")
+    assert updated == [(first, 1), (second, 1)]
+    assert rejected == {(first, 6): "not permitted for role Manager", (second, 6): "not permitted for role Manager",
+                        (999999, 1): "step not found"}
+    assert len(writes) == 1
+
+    workflow_status = manager.load_data()[3]
+    for unique_id in (first, second):
+        steps = manager.get_step_statuses(unique_id, workflow_status)
+        assert (steps[1]['Status'], steps[1]['Assigned_To']) == ("In Progress", "carol")
+        assert steps[6]['Status'] == "Not Started"
+
+
+def test_bulk_update_checks_the_action_of_every_column(manager, record_id):
+    # Comments need only the comment action, which step 6 leaves open to every role
+    updated, rejected = manager.update_steps([(record_id, 6)], 'Developer', Comments="checked")
+    assert (updated, rejected) == ([(record_id, 6)], {})
+    updated, rejected = manager.update_steps([(record_id, 6)], 'Developer', Comments="checked", Status="Completed")
+    assert (updated, list(rejected)) == ([], [(record_id, 6)])
+
+    with pytest.raises(ValueError, match="Unknown workflow status columns"):
+        manager.update_steps([(record_id, 1)], 'Lead', Step_Name="renamed")
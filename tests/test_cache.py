@@ -0,0 +1,86 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import Workflow_Stream
+from Workflow_Stream import WorkbookCache
+
+
+def tables(value):
+    return (pd.DataFrame({'value': [value]}),)
+
+
+def test_a_slow_build_does_not_block_other_lookups():
+    cache = WorkbookCache()
+    cache.install("other.xlsx", 1, tables("other"))
+    started, release = threading.Event(), threading.Event()
+
+    def slow_loader():
+        started.set()
+        assert release.wait(10)
+        return tables("slow")
+
+    loading = threading.Thread(target=cache.get, args=("slow.xlsx", 1, slow_loader))
+    loading.start()
+    try:
+        assert started.wait(10)
+        assert cache.get("other.xlsx", 1, lambda: tables("reloaded"))[0]['value'].tolist() == ["other"]
+        assert cache.derived("other.xlsx", 1, 'size', lambda frames: len(frames[0]), None) == 1
+    finally:
+        release.set()
+        loading.join()
+    assert cache.peek("slow.xlsx", 1) is not None
+
+
+def test_concurrent_requests_share_one_load_and_build():
+    cache = WorkbookCache()
+    calls = {'load': 0, 'build': 0}
+    barrier = threading.Barrier(4)
+
+    def loader():
+        calls['load'] += 1
+        return tables("loaded")
+
+    def builder(frames):
+        calls['build'] += 1
+        return object()
+
+    results = []
+
+    def lookup():
+        barrier.wait()
+        frames = cache.get("data.xlsx", 1, loader)
+        results.append(cache.derived("data.xlsx", 1, 'index', builder, frames))
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == {'load': 1, 'build': 1}
+    assert all(result is results[0] for result in results)
+
+
+def test_a_load_does_not_replace_a_write_installed_meanwhile():
+    cache = WorkbookCache()
+
+    def loader():
+        cache.install("data.xlsx", 2, tables("written"))
+        return tables("stale")
+
+    assert cache.get("data.xlsx", 1, loader)[0]['value'].tolist() == ["stale"]
+    assert cache.peek("data.xlsx", 1) is None
+    assert cache.peek("data.xlsx", 2)[0][0]['value'].tolist() == ["written"]
+
+
+@pytest.mark.parametrize('copy_on_write', [True, False])
+def test_changes_to_returned_tables_do_not_reach_the_cache(monkeypatch, copy_on_write):
+    monkeypatch.setattr(Workflow_Stream, 'COPY_ON_WRITE', copy_on_write)
+    cache = WorkbookCache()
+    cache.install("data.xlsx", 1, tables("stored"))
+    edited, = cache.get("data.xlsx", 1, None)
+    edited.iat[0, 0] = "edited"
+    replaced, = cache.get("data.xlsx", 1, None)
+    replaced['value'] = ["replaced"]
+    assert cache.get("data.xlsx", 1, None)[0]['value'].tolist() == ["stored"]
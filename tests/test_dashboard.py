@@ -0,0 +1,28 @@
+def test_dashboard_tables_count_every_record_step_and_assignee(manager):
+    done = manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    open_record = manager.create_record("Group B", "Entity B", "Solution B", "admin")
+    step_ids = sorted(manager.get_step_statuses(done, manager.load_data()[3]))
+    for step_id in step_ids:
+        assert manager.update_step(done, step_id, 'admin', Status="Completed")
+    assert manager.update_step(open_record, 1, 'admin', Status="In Progress", Assigned_To="alice")
+    manager.load_data()
+
+    dashboard = manager.dashboard()
+    assert (dashboard.total_records, dashboard.completed_records) == (2, 1)
+    assert (dashboard.open_steps, dashboard.completion) == (len(step_ids), 50.0)
+    assert dashboard.records['Completion %'].to_dict() == {done: 100.0, open_record: 0.0}
+    assert dashboard.bottlenecks['Open'].tolist() == [1] * len(step_ids)
+    assert dashboard.assignees.loc['alice'].tolist() == [0, 1, 1]
+    assert dashboard.assignees.loc['Unassigned'].tolist() == [len(step_ids) - 1, 0, len(step_ids) - 1]
+    assert dashboard.client_groups[['Records', 'Completed Records', 'Open Steps']].values.tolist() == [
+        [1, 1, 0], [1, 0, len(step_ids)]]
+
+
+def test_dashboard_follows_writes_after_it_was_built(manager, record_id):
+    manager.load_data()
+    assert manager.dashboard().records.loc[record_id, 'Completed'] == 0
+
+    assert manager.update_step(record_id, 1, 'admin', Status="Completed")
+    manager.load_data()
+    assert manager.dashboard().records.loc[record_id, 'Completed'] == 1
+    assert manager.dashboard() is manager.dashboard()
@@ -0,0 +1,57 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from Workflow_Stream import SQLiteStorage, StepEventLog, WorkbookCache, WorkflowManager
+
+
+def events_of(manager):
+    return pd.concat(manager.events.read(), ignore_index=True)
+
+
+def test_step_updates_log_status_and_assignee_transitions(manager, record_id):
+    assert manager.update_step(record_id, 1, 'admin', Status="In Progress", Assigned_To="alice")
+    assert manager.update_step(record_id, 1, 'admin', Comments="comment only")
+    assert manager.update_step(record_id, 1, 'admin', Status="In Progress")
+    assert manager.update_step(record_id, 1, 'bob', Status="Completed")
+    assert manager.save_step_updates([{'Unique_ID': record_id, 'Step_ID': 99, 'Status': "Completed"}], 'admin') == []
+
+    events = events_of(manager)
+    step = events[(events['Unique_ID'] == record_id) & (events['Step_ID'] == 1)]
+    assert step[['Status', 'Assigned_To', 'Changed_By']].astype(object).fillna('').values.tolist() == [
+        ["Not Started", "", "admin"], ["In Progress", "alice", "admin"], ["Completed", "alice", "bob"]]
+    assert 99 not in events['Step_ID'].tolist()
+
+
+def test_sqlite_step_updates_read_only_the_updated_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "workflow_data.db")
+    manager = WorkflowManager(path, SQLiteStorage(path, WorkbookCache()))
+    other = WorkflowManager(path, SQLiteStorage(path, WorkbookCache()))
+    unique_id = manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    manager.load_data()
+    # Another writer moves the version on, so the cached tables are out of date
+    assert other.update_step(unique_id, 2, 'admin', Assigned_To="carol")
+
+    def no_full_reads():
+        raise AssertionError("read every table")
+
+    monkeypatch.setattr(manager.storage, 'read_tables', no_full_reads)
+    assert manager.update_step(unique_id, 2, 'admin', Status="In Progress")
+    last = events_of(manager).iloc[-1]
+    assert (last['Status'], last['Assigned_To']) == ("In Progress", "carol")
+
+
+def test_time_in_step_spans_monthly_partitions(tmp_path):
+    log = StepEventLog(str(tmp_path))
+    log.append([
+        {'Timestamp': datetime(2026, 1, 31, 12), 'Unique_ID': 1000, 'Step_ID': 1, 'Status': "Not Started"},
+        {'Timestamp': datetime(2026, 2, 1, 0), 'Unique_ID': 1000, 'Step_ID': 1, 'Status': "In Progress"},
+        {'Timestamp': datetime(2026, 2, 1, 6), 'Unique_ID': 1000, 'Step_ID': 1, 'Status': "Completed"},
+        {'Timestamp': datetime(2026, 2, 2, 0), 'Unique_ID': 1001, 'Step_ID': 1, 'Status': "In Progress"},
+    ])
+    assert sorted(os.path.basename(path) for path in log.partitions()) == ["2026-01.csv", "2026-02.csv"]
+
+    result = log.time_in_step(start=datetime(2026, 2, 1), end=datetime(2026, 3, 1))
+    assert result.loc[1].to_dict() == {'Completed': 1, 'Not Started': 12.0, 'In Progress': 6.0, 'Total': 18.0}
+    assert log.weekly_throughput()['Completed'].to_dict() == {pd.Timestamp(2026, 1, 26): 1}
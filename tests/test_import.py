@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from Workflow_Stream import ExcelStorage, WorkbookCache, WorkflowManager, read_workbook_file
+
+
+def write_source(directory, records, workflow_status=None):
+    """A directory of CSV tables as written by export_data"""
+    directory.mkdir()
+    pd.DataFrame(records).to_csv(directory / "Records.csv", index=False)
+    if workflow_status is not None:
+        pd.DataFrame(workflow_status).to_csv(directory / "Workflow_Status.csv", index=False)
+    return str(directory)
+
+
+def test_imported_completions_are_logged_at_their_completed_date(manager, tmp_path):
+    source = write_source(tmp_path / "source",
+                          [{'Unique_ID': 1, 'Client_Group': "G", 'Legal_Entity': "E", 'Solution': "S"}],
+                          [{'Unique_ID': 1, 'Step_ID': 1, 'Status': "Completed", 'Completed_Date': "2024-03-06"},
+                           {'Unique_ID': 1, 'Step_ID': 2, 'Status': "Completed"},
+                           {'Unique_ID': 1, 'Step_ID': 3, 'Status': "In Progress"}])
+    before = datetime.now()
+    result = manager.import_data(source, "importer")
+    assert (result['records'], result['rejected']) == (1, 0)
+
+    throughput = manager.events.weekly_throughput()
+    assert throughput['Completed'].to_dict() == {pd.Timestamp("2024-03-04"): 1}
+    events = pd.concat(manager.events.read(), ignore_index=True)
+    assert 2 not in events['Step_ID'].tolist()
+    assert (events.loc[events['Step_ID'] == 3, 'Timestamp'] >= before).all()
+
+
+def test_import_rejects_invalid_rows_and_keeps_the_rest(manager, tmp_path):
+    source = write_source(tmp_path / "source",
+                          [{'Unique_ID': 1, 'Client_Group': "G", 'Legal_Entity': "E", 'Solution': "S"},
+                           {'Unique_ID': 2, 'Client_Group': "", 'Legal_Entity': "E", 'Solution': "S"},
+                           {'Unique_ID': 3, 'Client_Group': "G", 'Legal_Entity': "E", 'Solution': "S",
+                            'Created_Date': "not a date"},
+                           {'Unique_ID': 1, 'Client_Group': "G", 'Legal_Entity': "E", 'Solution': "S"},
+                           {'Unique_ID': "x", 'Client_Group': "G", 'Legal_Entity': "E", 'Solution': "S"}],
+                          [{'Unique_ID': 1, 'Step_ID': 1, 'Status': "In Progress"},
+                           {'Unique_ID': 2, 'Step_ID': 1, 'Status': "In Progress"},
+                           {'Unique_ID': 1, 'Step_ID': "y", 'Status': "In Progress"},
+                           {'Unique_ID': 1, 'Step_ID': 99, 'Status': "In Progress"},
+                           {'Unique_ID': 1, 'Step_ID': 2, 'Status': "Paused"},
+                           {'Unique_ID': 1, 'Step_ID': 3, 'Status': "Completed", 'Completed_Date': "soon"},
+                           {'Unique_ID': 1, 'Step_ID': 1, 'Status': "Completed"}])
+    result = manager.import_data(source, "importer")
+
+    # Rows are numbered as in a spreadsheet, the header being row 1
+    assert result['rejections'] == [
+        ('Records', 3, "missing Client_Group"),
+        ('Records', 4, "invalid Created_Date"),
+        ('Records', 5, "duplicate Unique_ID"),
+        ('Records', 6, "missing or invalid Unique_ID"),
+        ('Workflow_Status', 3, "Unique_ID not among the imported Records"),
+        ('Workflow_Status', 4, "missing or invalid Step_ID"),
+        ('Workflow_Status', 5, "Step_ID not in the record's workflow template"),
+        ('Workflow_Status', 6, "unknown Status"),
+        ('Workflow_Status', 7, "invalid Completed_Date"),
+        ('Workflow_Status', 8, "duplicate step"),
+    ]
+    assert result['rejected'] == 10
+    records, _, _, workflow_status = manager.load_data()
+    assert len(records) == result['records'] == 1
+    imported = workflow_status[workflow_status['Unique_ID'] == records['Unique_ID'].iloc[0]]
+    assert len(imported) == result['steps']
+    assert imported.set_index('Step_ID').loc[1, 'Status'] == "In Progress"
+    assert (imported.set_index('Step_ID').drop(index=1)['Status'] == "Not Started").all()
+
+
+def test_import_checks_columns_before_writing(manager, tmp_path):
+    source = write_source(tmp_path / "source", [{'Client_Group': "G", 'Legal_Entity': "E"}])
+    version = manager.storage.version()
+    with pytest.raises(ValueError, match="missing the columns"):
+        manager.import_data(source, "importer")
+    assert manager.storage.version() == version
+
+
+def test_import_with_steps_needs_record_ids(manager, tmp_path):
+    source = write_source(tmp_path / "source", [{'Client_Group': "G", 'Legal_Entity': "E", 'Solution': "S"}],
+                          [{'Unique_ID': 1, 'Step_ID': 1}])
+    with pytest.raises(ValueError, match="Unique_ID"):
+        manager.import_data(source, "importer")
+
+
+def multi_chunk_source(directory, count):
+    """Records 1..count, each with its step 2 In Progress, listed in reverse record order"""
+    return write_source(directory,
+                        [{'Unique_ID': n, 'Client_Group': f"G{n}", 'Legal_Entity': "E", 'Solution': "S"}
+                         for n in range(1, count + 1)],
+                        [{'Unique_ID': n, 'Step_ID': 2, 'Status': "In Progress", 'Comments': f"from {n}"}
+                         for n in range(count, 0, -1)])
+
+
+def test_import_maps_steps_to_their_records_across_chunks(manager, tmp_path, record_id):
+    result = manager.import_data(multi_chunk_source(tmp_path / "source", 7), "importer", chunk_rows=3)
+    assert (result['records'], result['rejected']) == (7, 0)
+
+    records, _, _, workflow_status = manager.load_data()
+    imported = records[records['Unique_ID'] != record_id]
+    assert imported['Unique_ID'].tolist() == list(range(record_id + 1, record_id + 8))
+    assert len(set(records['Unique_ID'])) == len(records)
+    for unique_id, client_group in zip(imported['Unique_ID'], imported['Client_Group']):
+        step = manager.get_step_status(unique_id, 2)
+        assert (step['Status'], step['Comments']) == ("In Progress", f"from {client_group[1:]}")
+    assert result['steps'] == (workflow_status['Unique_ID'] != record_id).sum()
+
+
+def test_failed_import_writes_nothing(manager, tmp_path, record_id, monkeypatch):
+    source = multi_chunk_source(tmp_path / "source", 7)
+    version = manager.storage.version()
+    before = [frame.copy() for frame in manager.load_data()]
+    calls = []
+    template_status_rows = manager.template_status_rows
+
+    def failing(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return template_status_rows(*args)
+
+    monkeypatch.setattr(manager, 'template_status_rows', failing)
+    with pytest.raises(OSError):
+        manager.import_data(source, "importer", chunk_rows=3)
+
+    assert manager.storage.version() == version
+    for frame, expected in zip(manager.load_data(), before):
+        assert len(frame) == len(expected)
+    events = pd.concat(manager.events.read(), ignore_index=True)
+    assert set(events['Unique_ID']) == {record_id}
+
+
+def test_excel_import_is_one_workbook_write(tmp_path):
+    data_file = str(tmp_path / "workflow_data.xlsx")
+    manager = WorkflowManager(data_file, ExcelStorage(data_file, WorkbookCache()))
+    manager.import_data(multi_chunk_source(tmp_path / "source", 7), "importer", chunk_rows=3)
+
+    assert manager.storage.journal.size() == 0
+    assert len(read_workbook_file(data_file)[0]) == 7
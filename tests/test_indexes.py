@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import numpy as np
+
+from Workflow_Stream import AssigneeIndex, FacetIndex, SearchIndex, StatusIndex, summarize_status
+
+
+def facet_state(facets):
+    return (facets.tree, facets.clients, facets.entities, facets.solutions, facets.entities_by_client,
+            facets.solutions_by_client, facets.solutions_by_entity, facets.solutions_by_client_entity,
+            facets.positions, facets.size)
+
+
+def test_facet_index_follows_new_records(manager, record_id):
+    manager.load_data()
+    facets = manager.record_facets()
+    manager.create_records([("Group B", "Entity B", "Solution B"), ("Group A", "Entity C", "Solution A")], "admin")
+
+    records = manager.load_data()[0]
+    assert manager.record_facets() is facets
+    assert facet_state(facets) == facet_state(FacetIndex(records))
+    assert len(facets.match(client="Group A")) == 2
+
+
+def test_status_summary_follows_new_records_and_step_updates(manager, record_id):
+    manager.load_data()
+    summary = manager.status_summary()
+    assert summary.get(record_id)['Current_Step'] == 1
+    other_id = manager.create_record("Group B", "Entity B", "Solution B", "admin")
+    assert manager.update_step(record_id, 1, 'admin', Status="Completed", Completed_Date=datetime(2026, 3, 2, 9))
+    assert manager.update_step(record_id, 2, 'admin', Status="In Progress")
+
+    workflow_status = manager.load_data()[3]
+    assert manager.status_summary() is summary
+    assert summary.records == summarize_status(workflow_status)
+    assert manager.check_status_summary() == []
+    first = summary.get(record_id)
+    assert (first['Completed'], first['In Progress'], first['Current_Step']) == (1, 1, 2)
+    assert first['Last_Update'] == datetime(2026, 3, 2, 9)
+    assert summary.get(other_id)['Last_Update'] is None
+
+
+def test_check_status_summary_reports_and_repairs_drift(manager, record_id):
+    manager.load_data()
+    summary = manager.status_summary()
+    summary.records[record_id] = dict(summary.records[record_id], Completed=99)
+
+    assert manager.check_status_summary(rebuild=False) == [record_id]
+    assert manager.check_status_summary() == [record_id]
+    assert manager.check_status_summary() == []
+
+
+def test_assignee_index_follows_assignments_and_completions(manager, record_id):
+    manager.load_data()
+    assignees = manager.assignee_index()
+    other_id = manager.create_record("Group B", "Entity B", "Solution B", "admin")
+    assert manager.update_step(record_id, 2, 'admin', Assigned_To="alice")
+    assert manager.update_step(other_id, 3, 'admin', Assigned_To="alice")
+    assert manager.update_step(record_id, 4, 'admin', Assigned_To="bob")
+    assert manager.update_step(record_id, 4, 'admin', Assigned_To="alice")
+    assert manager.update_step(other_id, 3, 'admin', Status="Completed")
+
+    workflow_status = manager.load_data()[3]
+    assert manager.assignee_index() is assignees
+    rebuilt = AssigneeIndex(workflow_status, StatusIndex(workflow_status))
+    assert (assignees.tasks, assignees.assignee_at) == (rebuilt.tasks, rebuilt.assignee_at)
+    assert assignees.get("bob") == []
+
+    tasks = manager.my_tasks("alice")
+    assert tasks[['Unique_ID', 'Step_ID', 'Client_Group']].values.tolist() == [
+        [record_id, 2, "Group A"], [record_id, 4, "Group A"]]
+    assert manager.my_tasks("nobody").empty
+
+
+def test_search_index_follows_new_records_and_comments(manager, record_id):
+    manager.load_data()
+    search = manager.search_index()
+    other_id = manager.create_record("Northwind", "Entity N", "Forecasting", "admin")
+    assert manager.update_step(record_id, 2, 'admin', Comments="waiting on invoice")
+    assert manager.update_step(record_id, 2, 'admin', Comments="invoice received")
+    assert manager.update_step(other_id, 4, 'admin', Comments="reconciled")
+
+    records, _, _, workflow_status = manager.load_data()
+    assert manager.search_index() is search
+    rebuilt = SearchIndex(records, workflow_status, StatusIndex(workflow_status))
+    assert search.vocabulary == rebuilt.vocabulary
+    for word, (positions, weights) in rebuilt.postings.items():
+        np.testing.assert_array_equal(search.postings[word][0], positions)
+        np.testing.assert_allclose(search.postings[word][1], weights)
+    assert search.search("waiting") == []
+    assert search.search("invoice") == [record_id]
+    assert search.search("north recon") == [other_id]
@@ -0,0 +1,41 @@
+import pytest
+import streamlit as st
+
+import Workflow_Stream
+from Workflow_Stream import RerunMetrics, SQLiteStorage, WorkbookCache, WorkflowManager, count_elements
+
+
+@pytest.fixture
+def metrics():
+    """RerunMetrics of a rerun running on this thread"""
+    metrics = RerunMetrics()
+    Workflow_Stream._active_metrics.rerun = metrics
+    yield metrics
+    Workflow_Stream._active_metrics.rerun = None
+
+
+def test_element_calls_are_counted_once_however_often_counting_is_enabled(metrics):
+    count_elements()
+    count_elements()
+    st.markdown("text")
+    st.sidebar.info("note")
+    left, right = st.columns(2)
+    left.metric("Rows", 1)
+    assert metrics.elements == 4
+
+    Workflow_Stream._active_metrics.rerun = None
+    st.markdown("not instrumented")
+    assert metrics.elements == 4
+
+
+def test_sqlite_writes_count_the_rows_they_change(tmp_path, metrics):
+    path = str(tmp_path / "workflow_data.db")
+    manager = WorkflowManager(path, SQLiteStorage(path, WorkbookCache()))
+    writes = metrics.io['database write']
+    before = writes['count'], writes['rows']
+    unique_id = manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    steps = len(manager.get_step_statuses(unique_id, manager.load_data()[3]))
+    assert (writes['count'] - before[0], writes['rows'] - before[1]) == (1, 1 + steps)
+
+    assert manager.update_step(unique_id, 1, 'admin', Comments="noted")
+    assert (writes['count'] - before[0], writes['rows'] - before[1]) == (2, 2 + steps)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from Workflow_Stream import STEP_ACTIONS, WorkflowDefinition
+
+ROLES = {'Lead': {'inherits': ['Manager'], 'admin': True}, 'Manager': {'inherits': ['Analyst']}, 'Analyst': {}}
+
+
+def definition(roles=ROLES):
+    return WorkflowDefinition([
+        {'Step_ID': 1, 'Header': "Open", 'Allowed_Roles': ()},
+        {'Step_ID': 2, 'Header': "Build", 'Allowed_Roles': ('Manager',)},
+        {'Step_ID': 3, 'Header': "Sign-off", 'Allowed_Roles': (),
+         'Action_Roles': {'update': ['Lead'], 'comment': ['Analyst'], 'attach': ['Reviewer']}},
+    ], roles=roles)
+
+
+def test_permissions_resolve_inheritance_and_per_action_roles():
+    permissions = definition().permissions
+    granted = {role: {(step_id, action) for step_id in (1, 2, 3, 99) for action in STEP_ACTIONS
+                      if permissions.allows(role, step_id, action)}
+               for role in ['Lead', 'Manager', 'Analyst', 'Reviewer', 'Guest']}
+    anyone = {(1, 'update'), (1, 'comment'), (1, 'attach'), (2, 'comment'), (2, 'attach')}
+    assert granted['Guest'] == anyone
+    assert granted['Reviewer'] == anyone | {(3, 'attach')}
+    assert granted['Analyst'] == anyone | {(3, 'comment')}
+    assert granted['Manager'] == anyone | {(2, 'update'), (3, 'comment')}
+    assert granted['Lead'] == anyone | {(2, 'update'), (3, 'update'), (3, 'comment')}
+    assert [role for role in permissions.roles if permissions.is_admin(role)] == ['Lead']
+
+
+def test_step_mask_matches_single_checks():
+    permissions = definition().permissions
+    step_ids = np.array([3, 0, 1, 2, 99, 2, 3])
+    for role in ['Lead', 'Manager', 'Analyst', 'Reviewer', 'Guest']:
+        for action in STEP_ACTIONS:
+            expected = [permissions.allows(role, step_id, action) for step_id in step_ids.tolist()]
+            assert permissions.step_mask(role, step_ids, action).tolist() == expected
+
+
+def test_role_inheritance_cycles_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        definition({'Lead': {'inherits': ['Manager']}, 'Manager': {'inherits': ['Lead']}})
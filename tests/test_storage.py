@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from Workflow_Stream import (ExcelStorage, FileLock, SQLiteStorage, WorkbookCache, WorkflowManager, read_workbook_file,
+                             write_workbook)
+
+
+def reopened(manager):
+    """A manager on the same data with an empty cache, as in another server process"""
+    return WorkflowManager(manager.data_file, type(manager.storage)(manager.storage.cache_path, WorkbookCache()))
+
+
+def test_update_step_rejects_unknown_column(manager, record_id):
+    version = manager.storage.version()
+    assert not manager.update_step(record_id, 3, 'admin', Bogus='x')
+
+    assert manager.storage.version() == version
+    for reader in (manager, reopened(manager)):
+        assert 'Bogus' not in reader.load_data()[3].columns
+    assert manager.update_step(record_id, 3, 'admin', Comments="still writable")
+    assert reopened(manager).get_step_status(record_id, 3)['Comments'] == "still writable"
+
+
+@pytest.mark.parametrize('bad', [{'Bogus': 'x'}, {'Unique_ID': '1000'}, {'Step_ID': None}])
+def test_update_status_validates_before_writing(manager, record_id, bad):
+    version = manager.storage.version()
+    update = dict({'Unique_ID': record_id, 'Step_ID': 1, 'Status': 'Completed'}, **bad)
+    with pytest.raises(ValueError):
+        manager.storage.update_status([update])
+    assert manager.storage.version() == version
+
+
+def test_created_records_keep_the_reloaded_dtypes(manager, record_id):
+    cached = manager.load_data()[0]
+    assert cached['Unique_ID'].dtype == reopened(manager).load_data()[0]['Unique_ID'].dtype
+
+
+def test_sqlite_schema_is_applied_once_per_database(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "workflow.db")
+    SQLiteStorage(db_file, WorkbookCache(), workbook=str(tmp_path / "missing.xlsx"))
+    monkeypatch.setattr(SQLiteStorage, 'SCHEMA', "SELECT no_such_function();")
+    SQLiteStorage(db_file, WorkbookCache())
+
+
+@pytest.fixture
+def workbook_manager(tmp_path):
+    data_file = str(tmp_path / "workflow_data.xlsx")
+    return WorkflowManager(data_file, ExcelStorage(data_file, WorkbookCache()))
+
+
+def step_rows(manager):
+    """(Unique_ID, Step_ID, Status, Comments) of every step, blanks read back from Excel as missing"""
+    workflow_status = manager.load_data()[3].sort_values(['Unique_ID', 'Step_ID'])
+    return list(zip(workflow_status['Unique_ID'], workflow_status['Step_ID'], workflow_status['Status'].astype(str),
+                    workflow_status['Comments'].astype(object).fillna('')))
+
+
+def test_journal_replays_over_the_workbook(workbook_manager):
+    unique_id = workbook_manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    assert workbook_manager.update_step(unique_id, 1, 'admin', Status="Completed", Completed_By="admin",
+                                        Completed_Date=datetime(2026, 1, 5, 9, 30), Comments="done")
+    assert workbook_manager.update_step(unique_id, 1, 'admin', Comments="done twice")
+    storage = workbook_manager.storage
+    assert storage.journal.size() > 0
+
+    reader = reopened(workbook_manager)
+    assert reader.load_data()[0]['Unique_ID'].tolist() == [unique_id]
+    step = reader.get_step_status(unique_id, 1)
+    assert (step['Status'], step['Completed_Date'], step['Comments']) == \
+        ("Completed", pd.Timestamp(2026, 1, 5, 9, 30), "done twice")
+
+    assert storage.compact()
+    assert storage.journal.size() == 0
+    assert reopened(workbook_manager).get_step_status(unique_id, 1)['Comments'] == "done twice"
+
+
+def test_load_reads_only_journal_entries_the_cache_lacks(workbook_manager, monkeypatch):
+    unique_id = workbook_manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    for step_id in (1, 2):
+        assert workbook_manager.update_step(unique_id, step_id, 'admin', Comments=f"note {step_id}")
+    reader = reopened(workbook_manager)
+    reader.load_data()
+    starts = []
+    read = reader.storage.journal.read
+    monkeypatch.setattr(reader.storage.journal, 'read', lambda start=0: starts.append(start) or read(start))
+
+    reader.load_data()
+    assert starts == []
+    size = reader.storage.journal.size()
+    assert workbook_manager.update_step(unique_id, 3, 'admin', Comments="note 3")
+    assert reader.get_step_status(unique_id, 3)['Comments'] == "note 3"
+    assert starts == [size]
+    assert step_rows(reader) == step_rows(reopened(workbook_manager))
+
+
+def test_journal_skips_torn_lines_and_replays_idempotently(workbook_manager):
+    unique_id = workbook_manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    assert workbook_manager.update_step(unique_id, 2, 'admin', Comments="kept")
+    journal = workbook_manager.storage.journal
+    with open(journal.path, 'rb') as handle:
+        entries = handle.read()
+    expected = step_rows(reopened(workbook_manager))
+
+    # A crash after compaction but before the folded entries were discarded
+    assert workbook_manager.storage.compact()
+    with open(journal.detached_path, 'wb') as handle:
+        handle.write(entries)
+    # and an append torn by a crash
+    with open(journal.path, 'w', encoding='utf-8') as handle:
+        handle.write('{"Unique_ID": %d, "Step_ID": 3, "Comm' % unique_id)
+
+    reader = reopened(workbook_manager)
+    assert reader.load_data()[0]['Unique_ID'].tolist() == [unique_id]
+    assert step_rows(reader) == expected
+
+
+def test_step_updates_do_not_wait_for_workbook_rewrites(workbook_manager):
+    unique_id = workbook_manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    storage = workbook_manager.storage
+    with storage.lock:
+        # A rewrite in progress: entries appended after its detach are not in what it writes
+        storage.journal.detach()
+        tables = storage.load()
+        start = time.monotonic()
+        assert workbook_manager.update_step(unique_id, 4, 'admin', Comments="during rewrite")
+        assert time.monotonic() - start < 5
+        storage.write_tables(tables)
+    assert not os.path.exists(storage.journal.detached_path)
+    assert reopened(workbook_manager).get_step_status(unique_id, 4)['Comments'] == "during rewrite"
+    assert workbook_manager.get_step_status(unique_id, 4)['Comments'] == "during rewrite"
+
+
+def test_file_lock_times_out_behind_a_thread_of_the_same_process(tmp_path):
+    lock = FileLock(str(tmp_path / "data.lock"), timeout=0.2)
+    held, release = threading.Event(), threading.Event()
+
+    def writer():
+        with lock:
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    held.wait()
+    try:
+        with pytest.raises(TimeoutError):
+            with lock:
+                pass
+    finally:
+        release.set()
+        thread.join()
+    with lock:
+        pass
+
+
+def test_sessions_with_separate_caches_never_reuse_unique_ids(manager, record_id):
+    other = reopened(manager)
+    created = [record_id]
+    for writer in (other, manager, manager, other):
+        created.extend(writer.create_records([("Group B", "Entity B", "Solution B")] * 2, "admin"))
+    assert created == list(range(record_id, record_id + 9))
+    assert sorted(reopened(manager).load_data()[0]['Unique_ID']) == created
+
+
+def test_compaction_does_not_make_loaded_saves_stale(workbook_manager):
+    unique_id = workbook_manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    other = reopened(workbook_manager)
+    assert other.update_step(unique_id, 1, 'admin', Comments="journaled")
+    tables = workbook_manager.load_data()
+    assert workbook_manager.storage.compact()
+
+    assert workbook_manager.save_data(*tables)
+    assert other.get_step_status(unique_id, 1)['Comments'] == "journaled"
+
+
+def test_writes_after_loading_still_make_saves_stale(workbook_manager):
+    unique_id = workbook_manager.create_record("Group A", "Entity A", "Solution A", "admin")
+    tables = workbook_manager.load_data()
+    other = reopened(workbook_manager)
+    assert other.update_step(unique_id, 1, 'admin', Comments="newer")
+    assert other.storage.compact()
+    assert not workbook_manager.save_data(*tables)
+
+    tables = workbook_manager.load_data()
+    # An edit made outside the app, e.g. in Excel
+    write_workbook(workbook_manager.data_file, *read_workbook_file(workbook_manager.data_file))
+    assert not workbook_manager.save_data(*tables)